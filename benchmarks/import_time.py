@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Import time benchmark of the backtester entry points.
+
+Each target is imported in fresh interpreters (the cost paid by every sweep
+worker process), and the median wall time is compared to a budget. The
+command fails if a target is over budget or loads one of the heavy optional
+packages it should not need.
+
+Usage:
+    python benchmarks/import_time.py --budget 1.0 --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# The registry only, no strategy is imported
+from src.Registry import STRATEGIES  # noqa: E402
+
+# Packages that only the components needing them may import
+HEAVY_MODULES: List[str] = [
+    "yfinance", "sklearn", "matplotlib", "statsmodels", "scipy"
+]
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+import json
+print(json.dumps({{"seconds": elapsed,
+                  "modules": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def measure(code: str, repeat: int) -> Tuple[float, List[str]]:
+    """
+    Runs code in repeat fresh interpreters, returns the median import time
+    and the heavy modules loaded.
+    """
+    times = []
+    modules: List[str] = []
+    for _ in range(repeat):
+        probe = PROBE.format(code=code, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, "-c", probe], cwd=str(ROOT),
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        modules = result["modules"]
+    return statistics.median(times), modules
+
+
+def targets() -> Dict[str, Tuple[str, bool]]:
+    """
+    Returns the code of each target, and whether it must stay within the budget.
+    """
+    code = {
+        "import src": ("import src", True),
+        "import run_backtest": ("import run_backtest", True),
+    }
+    for name in STRATEGIES.names():
+        if not STRATEGIES.missing_requirements(name):
+            # Reported only, a strategy pays for its own dependencies
+            code["strategy %s" % name] = (
+                "from src.Registry import STRATEGIES; STRATEGIES.get(%r)" % name, False
+            )
+    return code
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="Maximum median import time in seconds "
+                             "of the entry points")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of fresh interpreters per target")
+    args = parser.parse_args()
+
+    failed = False
+    print("%-28s %10s  %s" % ("target", "median s", "heavy modules"))
+    for name, (code, budgeted) in targets().items():
+        seconds, modules = measure(code, args.repeat)
+        over = budgeted and (seconds > args.budget or bool(modules))
+        failed = failed or over
+        print("%-28s %10.3f  %s%s" % (name, seconds, ", ".join(modules) or "-",
+                                      "  OVER BUDGET" if over else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
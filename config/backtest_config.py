@@ -3,8 +3,8 @@ Configuration settings for backtesting.
 """
 
 from datetime import datetime
-from typing import List, Dict, Any
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -27,11 +27,31 @@ class BacktestConfig:
     
     # Strategy settings
     strategy_name: str = 'ETF_Forecast'
+    # Overrides of STRATEGY_CONFIGS
+    strategy_params: Dict[str, Any] = field(default_factory=dict)
+
+    # Output settings
+    output_dir: str = '.'
+    result_format: str = 'csv'  # csv, csv.gz, npz or parquet
+    async_results: bool = False  # write results in a background thread
+    # RunArchive also storing the curve, fills and metrics of the run
+    archive_dir: Optional[str] = None
+    html_report: bool = False  # self-contained HTML report of the run in output_dir
     
     # Risk management settings
-    max_position_size: float = 0.1  # 10% of portfolio
-    stop_loss: float = 0.05  # 5% stop loss
-    take_profit: float = 0.15  # 15% take profit
+    risk_checks: bool = False  # pre-trade checks of the orders against the limits below
+    max_position_size: Optional[float] = 0.1  # 10% of portfolio
+    max_gross_exposure: Optional[float] = None  # e.g. 1.0 for no leverage
+    max_net_exposure: Optional[float] = None
+    max_concentration: Optional[float] = None  # share of the gross exposure in a symbol
+    stop_loss: Optional[float] = None  # e.g. 0.05 to exit the positions losing 5%
+    take_profit: Optional[float] = None  # e.g. 0.15 to exit the positions gaining 15%
+
+    # Position sizing of the signals ('kelly' or
+    # 'mean_variance'), None for fixed quantities
+    position_sizer: Optional[str] = None
+    # e.g. {'fraction': 0.5, 'max_weight': 0.1}
+    sizer_params: Dict[str, Any] = field(default_factory=dict)
 
 
 # Default configurations
@@ -61,5 +81,18 @@ STRATEGY_CONFIGS = {
     },
     'Buy_And_Hold': {
         # No specific parameters needed
+    },
+    'Momentum': {
+        'lookback': 126,
+        'skip': 21,
+        'top_fraction': 0.2,
+        'long_short': False,
+        'rebalance_every': 21
+    },
+    'OLS_MR': {
+        'ols_window': 50,
+        'zscore_low': 0.5,
+        'zscore_high': 3.0,
+        'hedge_ratio_mode': 'ols'
     }
 } 
\ No newline at end of file
@@ -4,24 +4,72 @@ Entry point for running backtests.
 
 Usage:
     python run_backtest.py --symbol TQQQ --start-date 2016-01-01 --end-date 2021-01-01
-    python run_backtest.py --config my_config.json
+    python run_backtest.py --config my_config.json --jobs 8
+
+A config file lists the runs of a batch, as BacktestConfig settings (dates as
+YYYY-MM-DD), either as a list or with settings shared by all the runs:
+
+    {"defaults": {"use_yahoo_data": false,
+                  "start_date": "2016-01-01", "end_date": "2021-01-01"},
+     "runs": [{"strategy_name": "MAC_Strat", "symbol_list": ["SPY"],
+               "strategy_params": {"short_window": 50}},
+              {"strategy_name": "Buy_And_Hold", "symbol_list": ["SPY"]}]}
+
+Each run is keyed by its settings and the content of its data files, and its
+results are stored under that key in the cache directory: runs already in the
+cache are skipped, the others are executed in parallel. Yahoo data is only
+downloaded by the runs, so its content is not known to the key: the keys of
+the Yahoo runs include the UTC day instead, and expire daily (Yahoo revises
+its adjusted history after dividends and splits).
+
+With --queue, the runs go through a persistent job queue (a SQLite file):
+the runs of a crashed or interrupted worker are run again by the others, and
+workers on other hosts sharing the filesystem (same paths) can join with
+
+    python run_backtest.py --queue /shared/jobs.db --jobs 8
 """
 
 import argparse
+import json
+import multiprocessing
 import sys
 import os
-from datetime import datetime
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from dataclasses import asdict, fields, replace
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict, List
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from config.backtest_config import BacktestConfig, DEFAULT_CONFIG, STRATEGY_CONFIGS
 from src.BacktesterLoop import Backtest
-from src.DataHandler import YahooDataHandler, HistoricCSVDataHandler
 from src.Execution import SimpleSimulatedExecutionHandler
 from src.Portfolio import Portfolio
-from src.Strategies import ETFDailyForecastStrategy, MovingAverageCrossOverStrat, BuyAndHoldStrat
+from src.JobQueue import JobQueue, Worker
+from src.Registry import DATA_HANDLERS, STRATEGIES
+from src.Report import iter_frame_chunks, write_comparison_report, write_run_report
+from src.RiskManagement import RiskManagement
+from src.ResultWriter import create_result_writer
+from src.RunArchive import RunArchive
+from src.RunCache import ResultCache, run_key
+
+# Settings that do not change the results of a run, left out of its key
+OUTPUT_SETTINGS = (
+    'output_dir',
+    'result_format',
+    'async_results',
+    'heartbeat',
+    'data_dir',
+    'archive_dir',
+    'html_report',
+)
+
+# Bars per year of the data intervals, for the annualized metrics of the archive
+PERIODS_PER_YEAR = {'1d': 252, '1wk': 52, '1mo': 12}
 
 
 def parse_date(date_str: str) -> datetime:
@@ -33,21 +81,38 @@ def parse_date(date_str: str) -> datetime:
 
 
 def get_strategy_class(strategy_name: str):
-    """Get strategy class by name."""
-    strategies = {
-        'ETF_Forecast': ETFDailyForecastStrategy,
-        'MAC_Strat': MovingAverageCrossOverStrat,
-        'Buy_And_Hold': BuyAndHoldStrat
-    }
-    
-    if strategy_name not in strategies:
-        raise ValueError(f"Unknown strategy: {strategy_name}. Available: {list(strategies.keys())}")
-    
-    return strategies[strategy_name]
+    """Get strategy class by name, importing only its module and dependencies."""
+    return STRATEGIES.get(strategy_name)
+
+
+def get_strategy_params(config: BacktestConfig) -> Dict[str, Any]:
+    """Strategy parameters: the STRATEGY_CONFIGS defaults, overridden by the run."""
+    params = dict(STRATEGY_CONFIGS.get(config.strategy_name, {}))
+    for name, value in config.strategy_params.items():
+        # Dates of a JSON config are strings
+        if name.endswith('_date') and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        params[name] = value
+    return params
+
+
+def run_settings(config: BacktestConfig) -> Dict[str, Any]:
+    """Settings changing the results of a run, with its full strategy parameters."""
+    settings = {name: value for name, value in asdict(config).items()
+                if name not in OUTPUT_SETTINGS}
+    settings['strategy_params'] = get_strategy_params(config)
+    return settings
+
 
+def run_backtest(config: BacktestConfig, archive_id: str = None,
+                 run_id: str = None) -> Dict[str, Any]:
+    """Run a backtest with the given configuration, returning its summary.
 
-def run_backtest(config: BacktestConfig) -> None:
-    """Run a backtest with the given configuration."""
+    The equity curve is written to output_dir/run_id.<result_format>, by
+    default <strategy>_<symbols>_<hash of the settings>. With
+    config.archive_dir, the run is also added to that RunArchive under
+    archive_id (a random id by default).
+    """
     
     print(f"Starting backtest for symbols: {config.symbol_list}")
     print(f"Period: {config.start_date.date()} to {config.end_date.date()}")
@@ -59,11 +124,43 @@ def run_backtest(config: BacktestConfig) -> None:
     strategy_class = get_strategy_class(config.strategy_name)
     
     # Choose data handler
-    if config.use_yahoo_data:
-        data_handler_class = YahooDataHandler
-    else:
-        data_handler_class = HistoricCSVDataHandler
+    data_handler_class = DATA_HANDLERS.get('yahoo' if config.use_yahoo_data else 'csv')
     
+    # Each run writes to its own file so that parallel runs do not overwrite each other
+    if len(config.symbol_list) <= 5:
+        symbols = "_".join(config.symbol_list)
+    else:
+        symbols = "%d_symbols" % len(config.symbol_list)
+    if run_id is None:
+        # Runs differing by their dates, interval or parameters get their own files
+        settings_hash = run_key(run_settings(config), '')[:8]
+        run_id = "%s_%s_%s" % (config.strategy_name, symbols, settings_hash)
+    result_writer = create_result_writer(
+        config.output_dir,
+        run_id,
+        config.result_format,
+        asynchronous=config.async_results,
+    )
+
+    # Pre-trade risk gate, without the risk model and VaR measures
+    risk_params = {'risk_model': None, 'var_every': 0, 'max_position_size': None}
+    if config.risk_checks:
+        risk_params.update(
+            max_position_size=config.max_position_size,
+            max_gross_exposure=config.max_gross_exposure,
+            max_net_exposure=config.max_net_exposure,
+            max_concentration=config.max_concentration,
+            stop_loss=config.stop_loss,
+            take_profit=config.take_profit
+        )
+    if config.position_sizer is not None:
+        # The sizer needs the covariance of the universe
+        risk_params.update(
+            risk_model='factor',
+            sizer=config.position_sizer,
+            sizer_params=config.sizer_params,
+        )
+
     # Create backtest instance
     backtest = Backtest(
         data_dir=config.data_dir,
@@ -76,11 +173,273 @@ def run_backtest(config: BacktestConfig) -> None:
         data_handler=data_handler_class,
         execution_handler=SimpleSimulatedExecutionHandler,
         portfolio=Portfolio,
-        strategy=strategy_class
+        strategy=strategy_class,
+        result_writer=result_writer,
+        risk_manager=(
+            RiskManagement if config.risk_checks or config.position_sizer else None
+        ),
+        risk_params=risk_params,
+        strategy_params=get_strategy_params(config),
     )
     
     # Run the backtest
     backtest.simulate_trading()
+    summary = {
+        'stats': dict(backtest.stats),
+        'signals': backtest.signals,
+        'orders': backtest.orders,
+        'fills': backtest.fills,
+        'rejected_orders': (
+            len(backtest.risk_manager.rejections) if backtest.risk_manager else 0
+        ),
+        'results_path': backtest.portfolio.results_path
+    }
+
+    if config.archive_dir is not None:
+        archive_id = archive_id or uuid.uuid4().hex[:20]
+        archive = RunArchive(config.archive_dir)
+        archive.add(
+            archive_id,
+            config.strategy_name,
+            config.symbol_list,
+            config.start_date,
+            config.end_date,
+            get_strategy_params(config),
+            backtest.portfolio.equity_curve,
+            backtest.portfolio.all_fills,
+            config=asdict(config),
+            periods=PERIODS_PER_YEAR.get(config.interval, 252),
+        )
+        archive.close()
+        summary['archive_id'] = archive_id
+
+    if config.html_report:
+        metadata = {
+            'Strategy': config.strategy_name,
+            'Symbols': " ".join(config.symbol_list),
+            'Period': f"{config.start_date.date()} to {config.end_date.date()}",
+            'Parameters': json.dumps(get_strategy_params(config), default=str),
+        }
+        summary['report_path'] = write_run_report(
+            os.path.join(config.output_dir, f"{run_id}.html"),
+            iter_frame_chunks(backtest.portfolio.equity_curve),
+            backtest.portfolio.all_fills,
+            title=f"{config.strategy_name} {symbols}",
+            metadata=metadata,
+            periods=PERIODS_PER_YEAR.get(config.interval, 252),
+        )
+        print(f"Report: {summary['report_path']}")
+
+    # An asynchronous writer completes the results file while the run is archived
+    # and reported
+    result_writer.close()
+    return summary
+
+
+def config_from_settings(settings: Dict[str, Any]) -> BacktestConfig:
+    """Build a BacktestConfig from JSON settings (dates as strings)."""
+    settings = dict(settings)
+    for name in ('start_date', 'end_date'):
+        if isinstance(settings[name], str):
+            settings[name] = datetime.fromisoformat(settings[name])
+    return BacktestConfig(**settings)
+
+
+def load_batch_config(path: str) -> List[BacktestConfig]:
+    """Load the runs of a batch config file, completed by its defaults and
+    DEFAULT_CONFIG."""
+    with open(path) as f:
+        batch = json.load(f)
+    if isinstance(batch, list):
+        batch = {'runs': batch}
+    known = {config_field.name for config_field in fields(BacktestConfig)}
+    configs = []
+    for i, run in enumerate(batch.get('runs', [])):
+        settings = asdict(DEFAULT_CONFIG)
+        settings.update(batch.get('defaults', {}))
+        settings.update(run)
+        unknown = set(settings) - known
+        if unknown:
+            raise ValueError(f"Run {i} of {path}: unknown settings {sorted(unknown)}")
+        configs.append(config_from_settings(settings))
+    return configs
+
+
+def get_run_key(config: BacktestConfig, cache: ResultCache) -> str:
+    """Key of a run: hash of the settings changing its results and of its input data."""
+    settings = run_settings(config)
+    if config.use_yahoo_data:
+        # Downloaded during the run: keyed by the request (symbols, dates and interval,
+        # in the settings) and the day of the download, the cached results expire daily
+        data_hash = 'yahoo:%s' % datetime.now(timezone.utc).date().isoformat()
+    else:
+        data_hash = cache.data_hash(os.path.join(config.data_dir, "%s.csv" % symbol)
+                                    for symbol in config.symbol_list)
+    return run_key(settings, data_hash)
+
+
+def describe_run(config: BacktestConfig) -> str:
+    """Short description of a run for the batch log."""
+    symbols = (
+        " ".join(config.symbol_list)
+        if len(config.symbol_list) <= 3
+        else f"{len(config.symbol_list)} symbols"
+    )
+    dates = f"{config.start_date.date()}..{config.end_date.date()}"
+    return f"{config.strategy_name} {symbols} {dates}"
+
+
+def is_archived(
+    config: BacktestConfig, key: str, archives: Dict[str, RunArchive]
+) -> bool:
+    """Whether a cached run is also in the archive of its config (if any),
+    archives are opened once."""
+    if config.archive_dir is None:
+        return True
+    if config.archive_dir not in archives:
+        archives[config.archive_dir] = RunArchive(config.archive_dir)
+    return key in archives[config.archive_dir]
+
+
+def run_cached(config: BacktestConfig, key: str, cache_dir: str) -> Dict[str, Any]:
+    """Run a backtest of a batch, storing its results and log under its key."""
+    cache = ResultCache(cache_dir)
+    run_dir = cache.run_dir(key)
+    config = replace(config, output_dir=run_dir)
+    with open(os.path.join(run_dir, 'log.txt'), 'w') as log, redirect_stdout(log):
+        # Archived under the same key as in the cache
+        record = run_backtest(config, archive_id=key)
+    record['key'] = key
+    record['config'] = asdict(config)
+    cache.put(key, record)
+    return record
+
+
+def run_batch(
+    configs: List[BacktestConfig],
+    jobs: int = 1,
+    cache_dir: str = '.backtest_cache',
+    force: bool = False,
+) -> int:
+    """Run the runs of a batch missing from the cache, in jobs processes.
+    Returns the number of failures."""
+    cache = ResultCache(cache_dir)
+    archives: Dict[str, RunArchive] = {}
+    todo: Dict[str, BacktestConfig] = {}
+    cached = 0
+    for config in configs:
+        key = get_run_key(config, cache)
+        if key in todo:
+            continue
+        record = None if force else cache.get(key)
+        if record is not None and is_archived(config, key, archives):
+            cached += 1
+            print(f"cached  {key}  {describe_run(config)}  {record['stats']}")
+        else:
+            todo[key] = config
+
+    failed = 0
+    if jobs > 1 and len(todo) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(todo)))
+        futures = {
+            executor.submit(run_cached, config, key, cache_dir): key
+            for key, config in todo.items()
+        }
+        results = ((futures[future], future) for future in as_completed(futures))
+    else:
+        executor = None
+        results = ((key, None) for key in todo)
+    for key, future in results:
+        try:
+            record = (
+                future.result()
+                if future is not None
+                else run_cached(todo[key], key, cache_dir)
+            )
+        except Exception as e:
+            failed += 1
+            print(f"failed  {key}  {describe_run(todo[key])}: {e}")
+        else:
+            print(f"ran     {key}  {describe_run(todo[key])}  {record['stats']}")
+    if executor is not None:
+        executor.shutdown()
+
+    print(f"{len(configs)} runs: {cached} cached, {len(todo) - failed} ran, "
+          f"{failed} failed (cache: {cache_dir})")
+    return failed
+
+
+def submit_batch(
+    configs: List[BacktestConfig],
+    queue_path: str,
+    cache_dir: str = '.backtest_cache',
+    force: bool = False,
+) -> int:
+    """Add the runs of a batch missing from the cache to a job queue.
+    Returns the number of jobs queued."""
+    cache = ResultCache(cache_dir)
+    archives: Dict[str, RunArchive] = {}
+    jobs = []
+    cached = 0
+    for config in configs:
+        key = get_run_key(config, cache)
+        if (
+            not force
+            and cache.get(key) is not None
+            and is_archived(config, key, archives)
+        ):
+            cached += 1
+            continue
+        # The workers of other hosts find the cache at the same absolute path
+        payload = {'config': asdict(config), 'cache_dir': os.path.abspath(cache_dir),
+                   'force': force}
+        jobs.append((key, payload))
+    queued = JobQueue(queue_path).submit(jobs, force)
+    print(f"{len(configs)} runs: {cached} cached, {queued} queued in {queue_path}")
+    return queued
+
+
+def run_queued_job(key: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a batch run leased from the job queue, returning the summary stored
+    in the queue."""
+    config = config_from_settings(payload['config'])
+    # A worker which lost its lease may have stored the results already
+    record = None if payload['force'] else ResultCache(payload['cache_dir']).get(key)
+    if record is None or not is_archived(config, key, {}):
+        record = run_cached(config, key, payload['cache_dir'])
+        print(f"ran     {key}  {describe_run(config)}  {record['stats']}", flush=True)
+    return {'stats': record['stats'], 'results_path': record['results_path']}
+
+
+def work_queue(queue_path: str) -> int:
+    """Worker process: run the jobs of the queue until none is pending or running."""
+    return Worker(queue_path, run_queued_job).run()
+
+
+def run_queue(queue_path: str, jobs: int = 1) -> int:
+    """Run the jobs of a queue in jobs worker processes. Returns the number of
+    failed jobs."""
+    if jobs > 1:
+        # Long-lived workers, the data loaded by a job is reused by the next ones
+        workers = [
+            multiprocessing.Process(target=work_queue, args=(queue_path,))
+            for _ in range(jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        work_queue(queue_path)
+
+    queue = JobQueue(queue_path)
+    for key, payload, error in queue.failures():
+        description = describe_run(config_from_settings(payload['config']))
+        print(f"failed  {key}  {description}: {error}")
+    counts = queue.counts()
+    print(f"queue {queue_path}: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['pending'] + counts['running']} left")
+    return counts['failed']
 
 
 def main():
@@ -95,7 +454,7 @@ def main():
     parser.add_argument('--end-date', type=parse_date,
                        help='End date (YYYY-MM-DD)')
     parser.add_argument('--strategy', type=str, default='ETF_Forecast',
-                       choices=['ETF_Forecast', 'MAC_Strat', 'Buy_And_Hold'],
+                       choices=STRATEGIES.names(),
                        help='Trading strategy to use')
     parser.add_argument('--capital', type=float, default=100000.0,
                        help='Initial capital')
@@ -106,8 +465,78 @@ def main():
                        help='Use CSV data instead of Yahoo Finance')
     parser.add_argument('--data-dir', type=str, default='DataDir',
                        help='Data directory for CSV files')
+    parser.add_argument('--output-dir', type=str, default='.',
+                       help='Directory for the equity curve results')
+    parser.add_argument('--result-format', type=str, default='csv',
+                       choices=['csv', 'csv.gz', 'npz', 'parquet'],
+                       help='File format of the equity curve results')
+    parser.add_argument('--async-results', action='store_true',
+                       help='Write results in a background thread')
+    parser.add_argument('--archive', type=str, default=None,
+                       help='Run archive directory also storing the curves, fills and '
+                            'metrics of the runs')
+    parser.add_argument('--report', action='store_true',
+                       help='Write an HTML report of each run (and of the --archive '
+                            'after a batch)')
+    parser.add_argument('--risk-checks', action='store_true',
+                       help='Check the orders against the position and exposure '
+                            'limits before execution')
+    parser.add_argument('--sizer', type=str, default=None,
+                       choices=['kelly', 'mean_variance'],
+                       help='Size the signals into target weights (half Kelly or '
+                            'mean-variance)')
+
+    # Batch arguments
+    parser.add_argument('--config', type=str, default=None,
+                       help='JSON file listing the runs of a batch')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                       help='Number of runs of a batch executed in parallel')
+    parser.add_argument('--cache-dir', type=str, default='.backtest_cache',
+                       help='Directory of the cached results of the batch runs')
+    parser.add_argument('--force', action='store_true',
+                       help='Execute the runs of a batch even if their results are '
+                            'cached')
+    parser.add_argument('--queue', type=str, default=None,
+                       help='SQLite job queue of the batch: without --config, only '
+                            'run its jobs')
+    parser.add_argument('--submit-only', action='store_true',
+                       help='Add the runs of --config to the --queue without running '
+                            'them')
     
     args = parser.parse_args()
+
+    if args.config is not None:
+        try:
+            configs = load_batch_config(args.config)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error reading {args.config}: {e}")
+            sys.exit(1)
+        if args.archive is not None:
+            configs = [
+                (
+                    config
+                    if config.archive_dir
+                    else replace(config, archive_dir=args.archive)
+                )
+                for config in configs
+            ]
+        if args.report:
+            configs = [replace(config, html_report=True) for config in configs]
+        if args.queue is None:
+            failed = run_batch(configs, args.jobs, args.cache_dir, args.force)
+        else:
+            submit_batch(configs, args.queue, args.cache_dir, args.force)
+            if args.submit_only:
+                sys.exit(0)
+            failed = run_queue(args.queue, args.jobs)
+        if args.report and args.archive is not None:
+            report_path = write_comparison_report(
+                os.path.join(args.archive, 'comparison.html'), RunArchive(args.archive)
+            )
+            print(f"Report: {report_path}")
+        sys.exit(1 if failed else 0)
+    if args.queue is not None:
+        sys.exit(1 if run_queue(args.queue, args.jobs) else 0)
     
     # Create configuration
     config = BacktestConfig(
@@ -118,7 +547,14 @@ def main():
         initial_capital=args.capital,
         use_yahoo_data=not args.use_csv,
         data_dir=args.data_dir,
-        strategy_name=args.strategy
+        strategy_name=args.strategy,
+        output_dir=args.output_dir,
+        result_format=args.result_format,
+        async_results=args.async_results,
+        archive_dir=args.archive,
+        html_report=args.report,
+        risk_checks=args.risk_checks,
+        position_sizer=args.sizer
     )
     
     try:
@@ -0,0 +1,313 @@
+"""
+Batched performance analytics for many runs at once. Every function takes a
+returns matrix of shape (time x runs), e.g. the "returns" columns of many
+equity curves of a parameter sweep, and computes each metric for all runs
+with NumPy reductions. Wide matrices are processed in blocks of columns so
+that the memory used by the intermediate arrays stays bounded.
+
+NaN returns (e.g. the first bar of an equity curve) are treated as flat periods.
+"""
+
+from __future__ import print_function
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .Performance import create_drawdown_arrays
+
+METRICS: List[str] = [
+    "total_return",
+    "cagr",
+    "volatility",
+    "sharpe",
+    "sortino",
+    "calmar",
+    "skew",
+    "kurtosis",
+    "hit_rate",
+    "max_drawdown",
+    "max_drawdown_duration",
+]
+
+ROLLING_METRICS: List[str] = [
+    "cagr",
+    "volatility",
+    "sharpe",
+    "sortino",
+    "calmar",
+    "skew",
+    "kurtosis",
+    "hit_rate",
+    "max_drawdown",
+    "max_drawdown_duration",
+]
+
+
+def as_returns_matrix(
+    returns: Union[pd.DataFrame, pd.Series, np.ndarray],
+) -> Tuple[np.ndarray, Optional[pd.Index], Optional[pd.Index]]:
+    """
+    Converts the returns to a 2-D float array (time x runs) with NaN set to zero,
+    keeping the index and columns of pandas inputs.
+    """
+    index = columns = None
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    if isinstance(returns, pd.DataFrame):
+        index, columns = returns.index, returns.columns
+        returns = returns.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = np.asarray(returns, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    if values.ndim != 2:
+        raise ValueError(
+            "Expected a (time x runs) returns matrix, got shape %s" % (values.shape,)
+        )
+    return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0), index, columns
+
+
+def _column_blocks(n_columns: int, chunk_size: int) -> List[slice]:
+    """
+    Splits the columns in blocks of at most chunk_size columns.
+    """
+    chunk_size = max(1, int(chunk_size))
+    return [
+        slice(start, min(start + chunk_size, n_columns))
+        for start in range(0, n_columns, chunk_size)
+    ]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Element-wise division returning NaN where the denominator is zero.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def _drawdown_stats(equity: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maximum drawdown and its duration along the first axis of equity curves
+    starting at 1.0. A NaN row is prepended so that the starting capital
+    counts as the first high water mark.
+    """
+    padded = np.concatenate([np.full((1,) + equity.shape[1:], np.nan), equity], axis=0)
+    _, drawdown, duration = create_drawdown_arrays(padded)
+    return np.nanmax(drawdown[1:], axis=0), duration.max(axis=0)
+
+
+def _block_metrics(r: np.ndarray, periods: int) -> Dict[str, np.ndarray]:
+    """
+    Computes all the metrics for a block of columns.
+    """
+    n = r.shape[0]
+    mean = r.mean(axis=0)
+    deviation = r - mean
+    squared = deviation * deviation
+    variance = np.mean(squared, axis=0)
+    std = np.sqrt(variance)
+    negative = np.minimum(r, 0.0)
+    downside = np.sqrt(np.mean(negative * negative, axis=0))
+
+    equity = np.cumprod(1.0 + r, axis=0)
+    final = equity[-1]
+    with np.errstate(invalid="ignore"):
+        cagr = np.where(final > 0, final ** (periods / float(n)), 0.0) - 1.0
+    max_drawdown, max_duration = _drawdown_stats(
+        np.concatenate([np.ones((1, r.shape[1])), equity], axis=0)
+    )
+
+    return {
+        "total_return": final - 1.0,
+        "cagr": cagr,
+        "volatility": std * np.sqrt(periods),
+        "sharpe": np.sqrt(periods) * _ratio(mean, std),
+        "sortino": np.sqrt(periods) * _ratio(mean, downside),
+        "calmar": _ratio(cagr, max_drawdown),
+        "skew": _ratio(np.mean(squared * deviation, axis=0), variance**1.5),
+        "kurtosis": _ratio(np.mean(squared * squared, axis=0), variance**2) - 3.0,
+        "hit_rate": _ratio(
+            np.sum(r > 0, axis=0).astype(np.float64),
+            np.sum(r != 0, axis=0).astype(np.float64),
+        ),
+        "max_drawdown": max_drawdown,
+        "max_drawdown_duration": max_duration,
+    }
+
+
+def compute_metrics(returns: Union[pd.DataFrame, np.ndarray], periods: int = 252,
+                    chunk_size: int = 1024) -> pd.DataFrame:
+    """
+    Computes the performance metrics of many runs at once.
+
+    Parameters:
+    returns - A (time x runs) DataFrame or array of period returns.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    chunk_size - Number of runs processed together, bounds the
+                 memory to ~8 * time * chunk_size bytes per array.
+    Returns:
+    A DataFrame with one row per run and one column per metric of METRICS, so the
+    best runs are e.g. compute_metrics(returns).nlargest(100, "sharpe").
+    """
+    r, _, columns = as_returns_matrix(returns)
+    n_runs = r.shape[1]
+    results = {metric: np.full(n_runs, np.nan) for metric in METRICS}
+    if r.shape[0] > 0:
+        for block in _column_blocks(n_runs, chunk_size):
+            for metric, values in _block_metrics(r[:, block], periods).items():
+                results[metric][block] = values
+    return pd.DataFrame(results, index=columns, columns=METRICS)
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sums over trailing windows with a cumulative sum, the first
+    window - 1 rows being NaN.
+    """
+    cumulative = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=cumulative[1:])
+    out = np.full(values.shape, np.nan)
+    out[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return out
+
+
+def _rolling_drawdowns(
+    r: np.ndarray, window: int, max_elements: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maximum drawdown and duration over trailing windows. Each window needs its own
+    high water mark, so the windows are expanded in row blocks of at most
+    max_elements values.
+    """
+    n, n_cols = r.shape
+    max_drawdown = np.full(r.shape, np.nan)
+    max_duration = np.full(r.shape, np.nan)
+    if n < window:
+        return max_drawdown, max_duration
+
+    log_equity = np.zeros((n + 1, n_cols))
+    with np.errstate(divide="ignore"):
+        np.cumsum(np.log1p(np.maximum(r, -1.0)), axis=0, out=log_equity[1:])
+    # Window ending at row t covers the log equity
+    # from t - window to t (window + 1 points)
+    windows = np.lib.stride_tricks.sliding_window_view(log_equity, window + 1, axis=0)
+    rows = max(1, max_elements // max(1, (window + 1) * n_cols))
+    for start in range(0, windows.shape[0], rows):
+        block = windows[start:start + rows]
+        equity = np.exp(block - block[..., :1])
+        # create_drawdown_arrays works on the first axis: (window + 1, rows, columns)
+        dd, duration = _drawdown_stats(np.moveaxis(equity, -1, 0))
+        max_drawdown[window - 1 + start:window - 1 + start + block.shape[0]] = dd
+        max_duration[window - 1 + start:window - 1 + start + block.shape[0]] = duration
+    return max_drawdown, max_duration
+
+
+def _rolling_block_metrics(r: np.ndarray, window: int, periods: int, metrics: List[str],
+                           max_elements: int) -> Dict[str, np.ndarray]:
+    """
+    Computes the rolling metrics of a block of columns in O(time) with
+    cumulative sums of the powers of the (demeaned) returns.
+    """
+    out: Dict[str, np.ndarray] = {}
+    # Demeaning by the full sample mean limits the
+    # cancellation error of the cumulative sums
+    centre = r.mean(axis=0)
+    d = r - centre
+    d2 = d * d
+    s1 = rolling_sum(d, window) / window
+    s2 = rolling_sum(d2, window) / window
+    variance = np.maximum(s2 - s1 ** 2, 0.0)
+    std = np.sqrt(variance)
+    mean = s1 + centre
+
+    if "volatility" in metrics:
+        out["volatility"] = std * np.sqrt(periods)
+    if "sharpe" in metrics:
+        out["sharpe"] = np.sqrt(periods) * _ratio(mean, std)
+    if "sortino" in metrics:
+        negative = np.minimum(r, 0.0)
+        downside = np.sqrt(rolling_sum(negative * negative, window) / window)
+        out["sortino"] = np.sqrt(periods) * _ratio(mean, downside)
+    if "skew" in metrics or "kurtosis" in metrics:
+        s3 = rolling_sum(d2 * d, window) / window
+        m3 = s3 - 3.0 * s1 * s2 + 2.0 * s1 ** 3
+        if "skew" in metrics:
+            out["skew"] = _ratio(m3, variance ** 1.5)
+        if "kurtosis" in metrics:
+            s4 = rolling_sum(d2 * d2, window) / window
+            m4 = s4 - 4.0 * s1 * s3 + 6.0 * s1 ** 2 * s2 - 3.0 * s1 ** 4
+            out["kurtosis"] = _ratio(m4, variance ** 2) - 3.0
+    if "hit_rate" in metrics:
+        out["hit_rate"] = _ratio(rolling_sum((r > 0).astype(np.float64), window),
+                                 rolling_sum((r != 0).astype(np.float64), window))
+    if "cagr" in metrics or "calmar" in metrics:
+        with np.errstate(divide="ignore"):
+            log_growth = rolling_sum(np.log1p(np.maximum(r, -1.0)), window)
+        cagr = np.expm1(log_growth * periods / float(window))
+        if "cagr" in metrics:
+            out["cagr"] = cagr
+    if (
+        "max_drawdown" in metrics
+        or "max_drawdown_duration" in metrics
+        or "calmar" in metrics
+    ):
+        max_drawdown, max_duration = _rolling_drawdowns(r, window, max_elements)
+        if "max_drawdown" in metrics:
+            out["max_drawdown"] = max_drawdown
+        if "max_drawdown_duration" in metrics:
+            out["max_drawdown_duration"] = max_duration
+        if "calmar" in metrics:
+            out["calmar"] = _ratio(cagr, max_drawdown)
+    return out
+
+
+def compute_rolling_metrics(
+    returns: Union[pd.DataFrame, np.ndarray],
+    window: int,
+    periods: int = 252,
+    metrics: Optional[List[str]] = None,
+    chunk_size: int = 256,
+    max_elements: int = 2**24,
+) -> Dict[str, Union[pd.DataFrame, np.ndarray]]:
+    """
+    Computes the trailing-window version of the metrics for many runs at once.
+    The moment based metrics are O(time) per run, the drawdown based metrics
+    (max_drawdown, max_drawdown_duration, calmar) are O(time * window).
+
+    Parameters:
+    returns - A (time x runs) DataFrame or array of period returns.
+    window - Number of periods in each trailing window.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    metrics - Subset of ROLLING_METRICS to compute, all of them by default.
+    chunk_size - Number of runs processed together.
+    max_elements - Bound on the size of the expanded windows of the drawdown metrics.
+    Returns:
+    A dict of metric name to a (time x runs) DataFrame (array for array input),
+    NaN for the first window - 1 periods.
+    """
+    metrics = list(ROLLING_METRICS if metrics is None else metrics)
+    unknown = set(metrics) - set(ROLLING_METRICS)
+    if unknown:
+        raise ValueError(
+            "Unknown rolling metrics: %s. Available: %s"
+            % (sorted(unknown), ROLLING_METRICS)
+        )
+    if window < 1:
+        raise ValueError("window must be at least 1, got %s" % window)
+
+    r, index, columns = as_returns_matrix(returns)
+    results = {metric: np.full(r.shape, np.nan) for metric in metrics}
+    for block in _column_blocks(r.shape[1], chunk_size):
+        for metric, values in _rolling_block_metrics(
+            r[:, block], window, periods, metrics, max_elements
+        ).items():
+            results[metric][:, block] = values
+
+    if columns is None:
+        return results
+    return {
+        metric: pd.DataFrame(values, index=index, columns=columns)
+        for metric, values in results.items()
+    }
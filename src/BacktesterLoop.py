@@ -1,5 +1,6 @@
 from __future__ import print_function
 import pprint
+from collections import Counter
 
 try:
     import Queue as queue
@@ -11,6 +12,9 @@ from .Events import MarketEvent
 from .Events import SignalEvent
 from .Events import OrderEvent
 from .Events import FillEvent
+from .Events import TargetWeightEvent
+from .Events import OrderBatchEvent
+from .Events import CancelOrderEvent
 
 
 class Backtest(object):
@@ -21,7 +25,9 @@ class Backtest(object):
 
     def __init__(self, data_dir, symbol_list, initial_capital,
                  heartbeat, start_date, end_date, interval,
-                 data_handler, execution_handler, portfolio, strategy
+                 data_handler, execution_handler, portfolio, strategy,
+                 result_writer=None, portfolio_params=None, execution_params=None,
+                 risk_manager=None, risk_params=None, strategy_params=None
                  ):
         """
         Initialises the backtest
@@ -38,6 +44,18 @@ class Backtest(object):
         execution_handler - (Class) Handles the orders/fills for trades.
         portfolio - (Class) Keeps track of portfolio current and prior positions.
         strategy - (Class) Generates signals based on market data.
+        result_writer - (Instance) ResultWriter storing the
+                        equity curve, equity.csv if None.
+        portfolio_params - (Dict) Extra keyword arguments of
+                           the portfolio (e.g. lot_size).
+        execution_params - (Dict) Extra keyword arguments of the
+                           execution handler (e.g. slippage_model).
+        risk_manager - (Class) Optional RiskManagement updated on every
+                       bar, checking the orders before execution.
+        risk_params - (Dict) Extra keyword arguments of
+                      the risk manager (e.g. risk_model).
+        strategy_params - (Dict) Extra keyword arguments of
+                          the strategy (e.g. short_window).
         """
 
         self.data_dir = data_dir
@@ -52,12 +70,20 @@ class Backtest(object):
         self.execution_handler_cls = execution_handler
         self.portfolio_cls = portfolio
         self.strategy_cls = strategy
+        self.result_writer = result_writer
+        self.portfolio_params = portfolio_params or {}
+        self.execution_params = execution_params or {}
+        self.risk_manager_cls = risk_manager
+        self.risk_params = risk_params or {}
+        self.strategy_params = strategy_params or {}
 
         self.events = queue.Queue()
         self.signals = 0
         self.orders = 0
         self.fills = 0
         self.num_strats = 1
+        self.stats = None
+        self.execution_stats = None
 
         self._generate_trading_instances()
 
@@ -79,11 +105,39 @@ class Backtest(object):
                                                       self.start_date, self.end_date)
 
         # similar, here the strategy class could have different type of strategies (vol clustering, intraday, etc)
-        self.strategy = self.strategy_cls(self.data_handler, self.events)
+        self.strategy = self.strategy_cls(
+            self.data_handler, self.events, **self.strategy_params
+        )
 
-        self.portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, self.initial_capital)
+        portfolio_params = dict(self.portfolio_params)
+        if self.result_writer is not None:
+            portfolio_params["result_writer"] = self.result_writer
+        self.portfolio = self.portfolio_cls(
+            self.data_handler,
+            self.events,
+            self.start_date,
+            self.initial_capital,
+            **portfolio_params,
+        )
 
-        self.execution_handler = self.execution_handler_cls(self.events)
+        # Simulated handlers need the market data to price the fills
+        if getattr(self.execution_handler_cls, "requires_bars", False):
+            self.execution_handler = self.execution_handler_cls(
+                self.events, self.data_handler, **self.execution_params
+            )
+        else:
+            self.execution_handler = self.execution_handler_cls(
+                self.events, **self.execution_params
+            )
+
+        self.risk_manager = None
+        if self.risk_manager_cls is not None:
+            self.risk_manager = self.risk_manager_cls(
+                self.data_handler,
+                portfolio=self.portfolio,
+                events=self.events,
+                **self.risk_params,
+            )
 
     def _run_backtest(self):
         """
@@ -108,30 +162,77 @@ class Backtest(object):
                 break
 
             # Handle the events
-            while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    break
-                else:
-                    if event is not None:
-                        if isinstance(event, MarketEvent):
-                            self.strategy.calculate_signals(event)
-                            self.portfolio.update_timeindex(event)
-
-                        elif isinstance(event, SignalEvent):
-                            self.signals += 1
+            self._handle_events()
+
+            time.sleep(self.heartbeat)
+
+    def _handle_events(self):
+        """
+        Handles the events in the queue until it is empty, including the
+        events they generate (signals, orders, fills).
+        """
+        while True:
+            try:
+                event = self.events.get(False)
+            except queue.Empty:
+                # End of the bar, the sized signals may add the rebalancing orders
+                if (
+                    self.risk_manager is not None
+                    and self.risk_manager.sizer is not None
+                    and self.risk_manager.size_positions()
+                ):
+                    continue
+                break
+            else:
+                if event is not None:
+                    if isinstance(event, MarketEvent):
+                        self.execution_handler.on_market(event)
+                        self.strategy.calculate_signals(event)
+                        self.portfolio.update_timeindex(event)
+                        if self.risk_manager is not None:
+                            exits = len(self.risk_manager.forced_exits)
+                            self.risk_manager.update_timeindex(event)
+                            # Stop-loss/take-profit exits sent on this bar
+                            forced = self.risk_manager.forced_exits[exits:]
+                            for _, symbol, reason in forced:
+                                self.strategy.on_forced_exit(symbol, reason)
+
+                    elif isinstance(event, SignalEvent):
+                        self.signals += 1
+                        if (
+                            self.risk_manager is not None
+                            and self.risk_manager.sizer is not None
+                        ):
+                            self.risk_manager.update_signal(event)
+                        else:
                             self.portfolio.update_signal(event)
 
-                        elif isinstance(event, OrderEvent):
-                            self.orders += 1
+                    elif isinstance(event, TargetWeightEvent):
+                        self.signals += 1
+                        self.portfolio.update_target_weights(event)
+
+                    elif isinstance(event, OrderEvent):
+                        self.orders += 1
+                        risk = self.risk_manager
+                        if risk is None or risk.check_order(event):
                             self.execution_handler.execute_order(event)
 
-                        elif isinstance(event, FillEvent):
-                            self.fills += 1
-                            self.portfolio.update_fill(event)
+                    elif isinstance(event, OrderBatchEvent):
+                        self.orders += len(event.orders)
+                        orders = event.orders
+                        if self.risk_manager is not None:
+                            orders = self.risk_manager.check_orders(orders)
+                        if orders:
+                            self.execution_handler.execute_orders(orders)
 
-            time.sleep(self.heartbeat)
+                    elif isinstance(event, CancelOrderEvent):
+                        self.execution_handler.cancel_order(event)
+
+                    elif isinstance(event, FillEvent):
+                        self.fills += 1
+                        self.portfolio.update_fill(event)
+                        if self.risk_manager is not None:
+                            self.risk_manager.update_fill(event)
 
     def _output_performance(self):
         """
@@ -141,6 +242,7 @@ class Backtest(object):
 
         print("Creating summary stats...")
         stats = self.portfolio.output_summary_stats()
+        self.stats = stats
 
         print("Creating equity curve...")
         print(self.portfolio.equity_curve.tail(10))
@@ -149,10 +251,23 @@ class Backtest(object):
         print("Signals: %s" % self.signals)
         print("Orders: %s" % self.orders)
         print("Fills: %s" % self.fills)
+        if self.execution_stats:
+            print("Execution: %s" % self.execution_stats)
+        if self.risk_manager is not None:
+            reasons = Counter(reason for _, _, reason in self.risk_manager.rejections)
+            print("Rejected orders: %s %s" % (sum(reasons.values()), dict(reasons)))
+            print("Forced exits: %s" % len(self.risk_manager.forced_exits))
+        print("Results: %s" % self.portfolio.results_path)
 
     def simulate_trading(self):
         """
         Simulates the backtest and outputs portfolio performance.
         """
-        self._run_backtest()
+        try:
+            self._run_backtest()
+        finally:
+            self.execution_stats = self.execution_handler.finish()
+            self.strategy.finish()
+        # Fills of the orders still pending at the end of the data
+        self._handle_events()
         self._output_performance()
@@ -0,0 +1,190 @@
+"""
+Benchmark-relative analytics: alpha, beta, tracking error, information ratio
+and correlation of strategies against a benchmark (e.g. the equity curve of a
+BuyAndHoldStrat backtest, or SPY returns).
+
+The rolling versions are O(time) for any window: the windowed sums of the
+returns, squared returns and cross products are differences of cumulative
+sums, instead of one regression per window.
+"""
+
+from __future__ import print_function
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .Analytics import as_returns_matrix, rolling_sum
+
+BENCHMARK_METRICS: List[str] = [
+    "alpha",
+    "beta",
+    "correlation",
+    "tracking_error",
+    "information_ratio",
+]
+
+
+def equity_curve_returns(
+    equity_curve: Union[pd.DataFrame, pd.Series, np.ndarray],
+) -> Union[pd.DataFrame, pd.Series, np.ndarray]:
+    """
+    Returns the period returns of an equity curve DataFrame created by
+    Portfolio.create_equity_curve_dataframe (from its "total" column).
+    Anything else is assumed to already hold returns and is returned as is.
+    """
+    if isinstance(equity_curve, pd.DataFrame) and "total" in equity_curve.columns:
+        return equity_curve["total"].pct_change()
+    return equity_curve
+
+
+def _align(
+    returns: Union[pd.DataFrame, pd.Series, np.ndarray],
+    benchmark: Union[pd.DataFrame, pd.Series, np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray, Optional[pd.Index], Optional[pd.Index]]:
+    """
+    Converts the strategy returns to a (time x runs) matrix and the benchmark
+    to a (time x 1) column, aligning pandas inputs on their common index.
+    """
+    returns = equity_curve_returns(returns)
+    benchmark = equity_curve_returns(benchmark)
+    if isinstance(benchmark, pd.DataFrame):
+        if benchmark.shape[1] != 1:
+            raise ValueError(
+                "Expected a single benchmark series, got %d columns"
+                % benchmark.shape[1]
+            )
+        benchmark = benchmark.iloc[:, 0]
+    if (isinstance(returns, (pd.Series, pd.DataFrame))
+            and isinstance(benchmark, pd.Series)):
+        index = returns.index.intersection(benchmark.index)
+        returns = returns.loc[index]
+        benchmark = benchmark.loc[index]
+
+    r, index, columns = as_returns_matrix(returns)
+    b, _, _ = as_returns_matrix(benchmark)
+    if b.shape != (r.shape[0], 1):
+        raise ValueError(
+            "Benchmark of shape %s does not match returns of shape %s"
+            % (b.shape, r.shape)
+        )
+    return r, b, index, columns
+
+
+def _relative_metrics(
+    mean_r: np.ndarray,
+    mean_b: np.ndarray,
+    var_r: np.ndarray,
+    var_b: np.ndarray,
+    cov: np.ndarray,
+    periods: int,
+) -> Dict[str, np.ndarray]:
+    """
+    Computes the metrics from the (windowed) first and second moments.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(var_b > 0, cov / var_b, np.nan)
+        correlation = np.where(
+            (var_r > 0) & (var_b > 0), cov / np.sqrt(var_r * var_b), np.nan
+        )
+        # Var(r - b) = Var(r) - 2 Cov(r, b) + Var(b)
+        active_std = np.sqrt(np.maximum(var_r - 2.0 * cov + var_b, 0.0))
+        information_ratio = np.where(
+            active_std > 0, (mean_r - mean_b) / active_std, np.nan
+        )
+    return {
+        "alpha": (mean_r - beta * mean_b) * periods,
+        "beta": beta,
+        "correlation": correlation,
+        "tracking_error": active_std * np.sqrt(periods),
+        "information_ratio": information_ratio * np.sqrt(periods),
+    }
+
+
+def compute_benchmark_metrics(returns: Union[pd.DataFrame, pd.Series, np.ndarray],
+                              benchmark: Union[pd.DataFrame, pd.Series, np.ndarray],
+                              periods: int = 252) -> pd.DataFrame:
+    """
+    Computes the full sample annualised alpha, beta, correlation, tracking
+    error and information ratio of each run against the benchmark.
+
+    Parameters:
+    returns - An equity curve DataFrame of a Portfolio, or
+              a (time x runs) DataFrame/array of returns.
+    benchmark - An equity curve DataFrame of a Portfolio,
+                or a Series/array of benchmark returns.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    Returns:
+    A DataFrame with one row per run and one column per metric of BENCHMARK_METRICS.
+    """
+    r, b, _, columns = _align(returns, benchmark)
+    mean_r = r.mean(axis=0)
+    mean_b = b.mean(axis=0)
+    dr = r - mean_r
+    db = b - mean_b
+    metrics = _relative_metrics(
+        mean_r,
+        mean_b,
+        np.mean(dr * dr, axis=0),
+        np.mean(db * db, axis=0),
+        np.mean(dr * db, axis=0),
+        periods,
+    )
+    return pd.DataFrame(metrics, index=columns, columns=BENCHMARK_METRICS)
+
+
+def compute_rolling_benchmark_metrics(
+    returns: Union[pd.DataFrame, pd.Series, np.ndarray],
+    benchmark: Union[pd.DataFrame, pd.Series, np.ndarray],
+    window: int,
+    periods: int = 252,
+    chunk_size: int = 1024,
+) -> Dict[str, Union[pd.DataFrame, np.ndarray]]:
+    """
+    Computes the trailing-window alpha, beta, correlation, tracking error and
+    information ratio of each run against the benchmark, in O(time) per run.
+
+    Parameters:
+    returns - An equity curve DataFrame of a Portfolio, or
+              a (time x runs) DataFrame/array of returns.
+    benchmark - An equity curve DataFrame of a Portfolio,
+                or a Series/array of benchmark returns.
+    window - Number of periods in each trailing window.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    chunk_size - Number of runs processed together.
+    Returns:
+    A dict of metric name to a (time x runs) DataFrame (array for array input),
+    NaN for the first window - 1 periods.
+    """
+    if window < 2:
+        raise ValueError("window must be at least 2, got %s" % window)
+    r, b, index, columns = _align(returns, benchmark)
+
+    # Demeaning by the full sample means limits the
+    # cancellation error of the cumulative sums
+    centre_b = b.mean(axis=0)
+    db = b - centre_b
+    sb = rolling_sum(db, window) / window
+    var_b = np.maximum(rolling_sum(db * db, window) / window - sb * sb, 0.0)
+
+    results = {metric: np.full(r.shape, np.nan) for metric in BENCHMARK_METRICS}
+    for start in range(0, r.shape[1], max(1, chunk_size)):
+        block = slice(start, min(start + chunk_size, r.shape[1]))
+        centre_r = r[:, block].mean(axis=0)
+        dr = r[:, block] - centre_r
+        sr = rolling_sum(dr, window) / window
+        var_r = np.maximum(rolling_sum(dr * dr, window) / window - sr * sr, 0.0)
+        cov = rolling_sum(dr * db, window) / window - sr * sb
+        metrics = _relative_metrics(
+            sr + centre_r, sb + centre_b, var_r, var_b, cov, periods
+        )
+        for metric, values in metrics.items():
+            results[metric][:, block] = values
+
+    if columns is None:
+        return results
+    return {
+        metric: pd.DataFrame(values, index=index, columns=columns)
+        for metric, values in results.items()
+    }
@@ -0,0 +1,306 @@
+"""
+Resampling statistics for the results of a parameter sweep. A single Sharpe
+ratio is a point estimate, and the best of many trials is biased upwards.
+This module gives bootstrap confidence intervals of the Sharpe ratio and the
+maximum drawdown of every run, and the probabilistic and deflated Sharpe
+ratios (Bailey & Lopez de Prado) over the whole set of trials.
+
+All functions take a (time x runs) returns matrix, NaN returns being flat periods.
+"""
+
+from __future__ import print_function
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .Analytics import as_returns_matrix
+from .Performance import create_drawdown_arrays
+
+EULER_GAMMA: float = 0.5772156649015329
+
+
+def bootstrap_indices(
+    n: int,
+    n_resamples: int,
+    block_size: float,
+    method: str = "stationary",
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    Generates the time indices of block bootstrap resamples, all at once.
+
+    Parameters:
+    n - Length of the series to resample.
+    n_resamples - Number of resamples.
+    block_size - Block length, the mean block length for the stationary bootstrap.
+    method - 'stationary' (Politis & Romano, geometric block lengths) or 'block'
+             (circular bootstrap with fixed length blocks).
+    rng - The numpy random Generator.
+    Returns:
+    An (n_resamples x n) integer array of indices into the series.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    steps = np.arange(n)
+    if method == "stationary":
+        new_block = rng.random((n_resamples, n)) < 1.0 / block_size
+    elif method == "block":
+        new_block = np.broadcast_to(
+            steps % max(1, int(block_size)) == 0, (n_resamples, n)
+        ).copy()
+    else:
+        raise ValueError(
+            "Unknown bootstrap method: %s. Available: ['stationary', 'block']" % method
+        )
+    new_block[:, 0] = True
+
+    # Each block starts at a random position and continues (circularly) from there
+    starts = rng.integers(0, n, size=(n_resamples, n))
+    block_start = np.maximum.accumulate(np.where(new_block, steps, 0), axis=1)
+    return (np.take_along_axis(starts, block_start, axis=1) + steps - block_start) % n
+
+
+def _resample_counts(indices: np.ndarray, n: int) -> np.ndarray:
+    """
+    Counts how many times each period is drawn in each resample.
+    """
+    n_resamples = indices.shape[0]
+    offsets = (indices + n * np.arange(n_resamples)[:, None]).ravel()
+    return (
+        np.bincount(offsets, minlength=n_resamples * n)
+        .reshape(n_resamples, n)
+        .astype(np.float64)
+    )
+
+
+def _bootstrap_batch(args: Tuple) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Computes the Sharpe ratio (and maximum drawdown) of every run for one batch
+    of resamples. Module level function so that it can run in worker processes.
+    """
+    r, seed, n_resamples, block_size, method, periods, drawdown, max_elements = args
+    n, n_runs = r.shape
+    rng = np.random.default_rng(seed)
+    indices = bootstrap_indices(n, n_resamples, block_size, method, rng)
+
+    # The moments only depend on how often each period
+    # is drawn: (resamples x time) @ (time x runs)
+    counts = _resample_counts(indices, n)
+    mean = counts @ r / n
+    variance = np.maximum(counts @ (r * r) / n - mean * mean, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.sqrt(periods) * np.where(
+            variance > 0, mean / np.sqrt(variance), np.nan
+        )
+
+    max_drawdown = None
+    if drawdown:
+        # The drawdown depends on the order, resample the paths in blocks of runs
+        max_drawdown = np.empty((n_resamples, n_runs))
+        runs = max(1, max_elements // max(1, n_resamples * (n + 2)))
+        for start in range(0, n_runs, runs):
+            block = slice(start, min(start + runs, n_runs))
+            paths = np.cumprod(1.0 + r[:, block][indices.T], axis=0)
+            padded = np.concatenate(
+                [
+                    np.full((1,) + paths.shape[1:], np.nan),
+                    np.ones((1,) + paths.shape[1:]),
+                    paths,
+                ],
+                axis=0,
+            )
+            _, dd, _ = create_drawdown_arrays(padded)
+            max_drawdown[:, block] = np.nanmax(dd[1:], axis=0)
+    return sharpe, max_drawdown
+
+
+def bootstrap_confidence_intervals(
+    returns: Union[pd.DataFrame, np.ndarray],
+    n_resamples: int = 1000,
+    alpha: float = 0.05,
+    block_size: float = 20,
+    method: str = "stationary",
+    seed: Optional[int] = None,
+    n_jobs: int = 1,
+    periods: int = 252,
+    batch_size: int = 100,
+    drawdown: bool = True,
+    max_elements: int = 2**24,
+) -> pd.DataFrame:
+    """
+    Computes block bootstrap confidence intervals of the annualised Sharpe
+    ratio and the maximum drawdown of every run. The same resampled time
+    indices are applied to all runs, preserving their cross-correlation.
+
+    Parameters:
+    returns - A (time x runs) DataFrame or array of period returns.
+    n_resamples - Number of bootstrap resamples.
+    alpha - Two-sided significance level, 0.05 gives 95% intervals.
+    block_size - (Mean) block length, which should cover
+                 the serial dependence of the returns.
+    method - 'stationary' or 'block', see bootstrap_indices.
+    seed - Seed of the resampling. Results only depend
+           on seed and batch_size, not on n_jobs.
+    n_jobs - Number of worker processes the batches of resamples are spread over.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    batch_size - Number of resamples generated together,
+                 each batch having its own random stream.
+    drawdown - Whether to compute the maximum drawdown intervals (the expensive part).
+    max_elements - Bound on the size of the resampled paths of the drawdown.
+    Returns:
+    A DataFrame with one row per run: sharpe, sharpe_lower, sharpe_upper and
+    max_drawdown, max_drawdown_lower, max_drawdown_upper.
+    """
+    r, _, columns = as_returns_matrix(returns)
+    sizes = [
+        min(batch_size, n_resamples - start)
+        for start in range(0, n_resamples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(r, seed_seq, size, block_size, method, periods, drawdown, max_elements)
+             for seed_seq, size in zip(seeds, sizes)]
+
+    if n_jobs == 1:
+        batches = [_bootstrap_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs if n_jobs > 0 else None
+        ) as executor:
+            batches = list(executor.map(_bootstrap_batch, tasks))
+
+    quantiles = [alpha / 2.0, 1.0 - alpha / 2.0]
+    sharpe_samples = np.concatenate([batch[0] for batch in batches], axis=0)
+    mean = r.mean(axis=0)
+    std = r.std(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.sqrt(periods) * np.where(std > 0, mean / std, np.nan)
+    lower, upper = np.nanquantile(sharpe_samples, quantiles, axis=0)
+    result = {"sharpe": sharpe, "sharpe_lower": lower, "sharpe_upper": upper}
+
+    if drawdown:
+        drawdown_samples = np.concatenate([batch[1] for batch in batches], axis=0)
+        equity = np.concatenate(
+            [
+                np.full((1, r.shape[1]), np.nan),
+                np.ones((1, r.shape[1])),
+                np.cumprod(1.0 + r, axis=0),
+            ],
+            axis=0,
+        )
+        _, dd, _ = create_drawdown_arrays(equity)
+        lower, upper = np.nanquantile(drawdown_samples, quantiles, axis=0)
+        result.update({"max_drawdown": np.nanmax(dd[1:], axis=0),
+                       "max_drawdown_lower": lower, "max_drawdown_upper": upper})
+    return pd.DataFrame(result, index=columns)
+
+
+# Complementary error function of the math module applied
+# elementwise, one value per run (NaN stays NaN)
+_erfc = np.vectorize(math.erfc, otypes=[np.float64])
+
+
+def _norm_cdf(x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    """
+    Standard normal cumulative distribution function,
+    the same exact values for a scalar and an array.
+    """
+    cdf = 0.5 * _erfc(-np.asarray(x, dtype=np.float64) / math.sqrt(2.0))
+    return float(cdf) if np.ndim(x) == 0 else cdf
+
+
+def _sharpe_moments(r: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per period (non annualised) Sharpe ratio,
+    skewness and (non excess) kurtosis of each run.
+    """
+    mean = r.mean(axis=0)
+    deviation = r - mean
+    squared = deviation * deviation
+    variance = squared.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(variance > 0, mean / np.sqrt(variance), np.nan)
+        skew = np.where(
+            variance > 0, (squared * deviation).mean(axis=0) / variance**1.5, np.nan
+        )
+        kurtosis = np.where(
+            variance > 0, (squared * squared).mean(axis=0) / variance**2, np.nan
+        )
+    return sharpe, skew, kurtosis
+
+
+def _psr(sharpe: np.ndarray, skew: np.ndarray, kurtosis: np.ndarray, n: int,
+         benchmark_sharpe: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Probabilistic Sharpe ratio from per period moments.
+    """
+    with np.errstate(invalid="ignore"):
+        denominator = np.sqrt(
+            np.maximum(1.0 - skew * sharpe + (kurtosis - 1.0) / 4.0 * sharpe**2, 1e-12)
+        )
+    return _norm_cdf(
+        (sharpe - benchmark_sharpe) * math.sqrt(max(n - 1, 1)) / denominator
+    )
+
+
+def probabilistic_sharpe_ratio(
+    returns: Union[pd.DataFrame, np.ndarray],
+    benchmark_sharpe: float = 0.0,
+    periods: int = 252,
+) -> Union[pd.Series, np.ndarray]:
+    """
+    Probability that the true Sharpe ratio of each run exceeds benchmark_sharpe,
+    accounting for the track record length, skewness and kurtosis of the returns.
+
+    Parameters:
+    returns - A (time x runs) DataFrame or array of period returns.
+    benchmark_sharpe - Annualised Sharpe ratio to beat.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    """
+    r, _, columns = as_returns_matrix(returns)
+    sharpe, skew, kurtosis = _sharpe_moments(r)
+    psr = _psr(
+        sharpe, skew, kurtosis, r.shape[0], benchmark_sharpe / math.sqrt(periods)
+    )
+    return psr if columns is None else pd.Series(psr, index=columns, name="psr")
+
+
+def expected_max_sharpe(sharpe_variance: float, n_trials: int) -> float:
+    """
+    Expected maximum of n_trials Sharpe ratios of zero skill strategies,
+    given the variance of the Sharpe ratios across the trials.
+    """
+    if n_trials < 2:
+        return 0.0
+    normal = NormalDist()
+    return math.sqrt(sharpe_variance) * (
+        (1.0 - EULER_GAMMA) * normal.inv_cdf(1.0 - 1.0 / n_trials)
+        + EULER_GAMMA * normal.inv_cdf(1.0 - 1.0 / (n_trials * math.e))
+    )
+
+
+def deflated_sharpe_ratio(
+    returns: Union[pd.DataFrame, np.ndarray], n_trials: Optional[int] = None
+) -> Union[pd.Series, np.ndarray]:
+    """
+    Deflated Sharpe ratio of every run: the probabilistic Sharpe ratio against
+    the Sharpe ratio expected from the best of n_trials unskilled trials, which
+    corrects for the selection bias of the sweep.
+
+    Parameters:
+    returns - A (time x runs) DataFrame or array of period
+              returns, all the trials of the sweep.
+    n_trials - Number of independent trials, defaults to the number of runs.
+    """
+    r, _, columns = as_returns_matrix(returns)
+    sharpe, skew, kurtosis = _sharpe_moments(r)
+    n_trials = r.shape[1] if n_trials is None else n_trials
+    finite = sharpe[np.isfinite(sharpe)]
+    variance = float(np.var(finite, ddof=1)) if finite.size > 1 else 0.0
+    dsr = _psr(
+        sharpe, skew, kurtosis, r.shape[0], expected_max_sharpe(variance, n_trials)
+    )
+    return dsr if columns is None else pd.Series(dsr, index=columns, name="dsr")
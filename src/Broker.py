@@ -0,0 +1,540 @@
+"""
+Local stand-in for a broker, to measure how the order path behaves under
+realistic latency before pointing it at a real venue.
+
+The SimulatedBroker runs in its own process and talks newline-delimited JSON
+over a TCP socket:
+
+client -> broker: {"msg": "hello", "client_id": str}
+client -> broker: {"msg": "order", "id": int, "symbol": str, "quantity": int,
+                   "direction": "BUY"/"SELL", "order_type": str, "price": float}
+broker -> client: {"msg": "ack", "id": int}
+broker -> client: {"msg": "fill", "id": int, "symbol": str, "quantity": int,
+                   "direction": str, "price": float}
+
+Acks are sent after a network round trip and fills after a further exchange
+latency. Orders are idempotent on their id, so after a reconnection the client
+resends its in-flight orders and the broker replays what was lost.
+"""
+
+from __future__ import print_function
+
+import heapq
+import itertools
+import json
+import multiprocessing
+import random
+import selectors
+import socket
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .Events import FillEvent, OrderEvent
+from .Execution import ExecutionHandler
+
+
+class SimulatedBroker(object):
+    """
+    Single threaded, non-blocking broker server: any number of orders can be
+    in flight, each delayed independently by the configured latencies. The
+    replies are appended to a write buffer per connection, flushed when the
+    socket is writable, so a client that reads slowly does not hold up the
+    others.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        network_latency: float = 0.001,
+        exchange_latency: float = 0.005,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Parameters:
+        host - Interface to listen on.
+        port - Port to listen on, 0 picks a free port.
+        network_latency - One way network latency in seconds.
+        exchange_latency - Time between the order reaching the
+                           exchange and its fill, in seconds.
+        jitter - Random extra latency, as a fraction of each latency.
+        seed - Seed of the jitter.
+        """
+        self.network_latency: float = network_latency
+        self.exchange_latency: float = exchange_latency
+        self.jitter: float = jitter
+        self.random = random.Random(seed)
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen()
+        self.server.setblocking(False)
+        self.port: int = self.server.getsockname()[1]
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.buffers: Dict[socket.socket, bytes] = {}
+        self.outgoing: Dict[socket.socket, bytearray] = {}
+        self.clients: Dict[str, socket.socket] = {}
+        self.client_of: Dict[socket.socket, str] = {}
+        # Scheduled messages as (due time, sequence, client id, message)
+        self.scheduled: List[Tuple[float, int, str, Dict[str, Any]]] = []
+        # Messages of disconnected clients, delivered when they reconnect
+        self.outbox: Dict[str, List[Dict[str, Any]]] = {}
+        self.orders: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._seq = itertools.count()
+        self.running: bool = True
+
+    def _delay(self, latency: float) -> float:
+        return latency * (1.0 + self.jitter * self.random.random())
+
+    def _schedule(self, delay: float, client_id: str, message: Dict[str, Any]) -> None:
+        heapq.heappush(
+            self.scheduled,
+            (time.monotonic() + delay, next(self._seq), client_id, message),
+        )
+
+    def _send(self, client_id: str, message: Dict[str, Any]) -> None:
+        conn = self.clients.get(client_id)
+        if conn is None:
+            self.outbox.setdefault(client_id, []).append(message)
+            return
+        buffer = self.outgoing[conn]
+        flush = not buffer
+        buffer += (json.dumps(message) + "\n").encode()
+        if flush:
+            self._flush(conn)
+
+    def _flush(self, conn: socket.socket) -> None:
+        """
+        Sends as much of the write buffer of conn as the socket accepts, and
+        watches the socket for writability while some of it is left.
+        """
+        buffer = self.outgoing[conn]
+        try:
+            sent = conn.send(buffer) if buffer else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            # The client resends its orders on reconnection, the replies are replayed
+            self._disconnect(conn)
+            return
+        del buffer[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if buffer else 0)
+        if self.selector.get_key(conn).events != events:
+            self.selector.modify(conn, events)
+
+    def _disconnect(self, conn: socket.socket) -> None:
+        client_id = self.client_of.pop(conn, None)
+        if client_id is not None and self.clients.get(client_id) is conn:
+            del self.clients[client_id]
+        self.buffers.pop(conn, None)
+        self.outgoing.pop(conn, None)
+        try:
+            self.selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+
+    def _handle(self, conn: socket.socket, message: Dict[str, Any]) -> None:
+        if message["msg"] == "hello":
+            client_id = message["client_id"]
+            self.clients[client_id] = conn
+            self.client_of[conn] = client_id
+            for pending in self.outbox.pop(client_id, []):
+                self._send(client_id, pending)
+        elif message["msg"] == "order":
+            client_id = self.client_of.get(conn, "")
+            key = (client_id, message["id"])
+            known = self.orders.get(key)
+            latency = self.network_latency
+            round_trip = self._delay(latency) + self._delay(latency)
+            if known is None:
+                self.orders[key] = message
+                self._schedule(
+                    round_trip, client_id, {"msg": "ack", "id": message["id"]}
+                )
+                fill = {
+                    "msg": "fill",
+                    "id": message["id"],
+                    "symbol": message["symbol"],
+                    "quantity": message["quantity"],
+                    "direction": message["direction"],
+                    "price": message["price"],
+                }
+                self._schedule(
+                    round_trip + self._delay(self.exchange_latency), client_id, fill
+                )
+                message["fill"] = fill
+            else:
+                # Resent after a reconnection: acknowledge
+                # again, replay the fill if it is done
+                self._schedule(
+                    round_trip, client_id, {"msg": "ack", "id": message["id"]}
+                )
+                if known.get("filled"):
+                    self._schedule(round_trip, client_id, known["fill"])
+        elif message["msg"] == "shutdown":
+            self.running = False
+
+    def _read(self, conn: socket.socket) -> None:
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(conn)
+            return
+        buffer = self.buffers.get(conn, b"") + data
+        *lines, self.buffers[conn] = buffer.split(b"\n")
+        for line in lines:
+            if line:
+                self._handle(conn, json.loads(line))
+
+    def serve_forever(self) -> None:
+        """
+        Serves the clients until a shutdown message is received.
+        """
+        while self.running:
+            timeout = None
+            if self.scheduled:
+                timeout = max(0.0, self.scheduled[0][0] - time.monotonic())
+            for key, mask in self.selector.select(timeout):
+                if key.fileobj is self.server:
+                    conn, _ = self.server.accept()
+                    conn.setblocking(False)
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self.selector.register(conn, selectors.EVENT_READ)
+                    self.outgoing[conn] = bytearray()
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(key.fileobj)
+                if mask & selectors.EVENT_READ and key.fileobj in self.outgoing:
+                    self._read(key.fileobj)
+            now = time.monotonic()
+            while self.scheduled and self.scheduled[0][0] <= now:
+                _, _, client_id, message = heapq.heappop(self.scheduled)
+                if message["msg"] == "fill":
+                    self.orders[(client_id, message["id"])]["filled"] = True
+                self._send(client_id, message)
+        for conn in list(self.client_of):
+            self._disconnect(conn)
+        self.server.close()
+
+
+def run_broker(
+    ready: Any,
+    host: str,
+    port: int,
+    network_latency: float,
+    exchange_latency: float,
+    jitter: float,
+    seed: Optional[int],
+) -> None:
+    """
+    Entry point of the broker process, reporting the listening port through ready.
+    """
+    broker = SimulatedBroker(
+        host, port, network_latency, exchange_latency, jitter, seed
+    )
+    ready.send(broker.port)
+    ready.close()
+    broker.serve_forever()
+
+
+def start_broker(host: str = "127.0.0.1", port: int = 0, network_latency: float = 0.001,
+                 exchange_latency: float = 0.005, jitter: float = 0.0,
+                 seed: Optional[int] = None) -> Tuple[multiprocessing.Process, int]:
+    """
+    Starts a SimulatedBroker in a daemon process.
+
+    Returns:
+    process, port - The broker process and the port it listens on.
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=run_broker,
+        name="SimulatedBroker",
+        daemon=True,
+        args=(child, host, port, network_latency, exchange_latency, jitter, seed),
+    )
+    process.start()
+    child.close()
+    port = parent.recv()
+    parent.close()
+    return process, port
+
+
+class SocketExecutionHandler(ExecutionHandler):
+    """
+    Execution handler sending the orders to a broker over a socket, with the
+    order/ack/fill protocol of SimulatedBroker. Sending never waits for the
+    broker: the orders are pipelined and the acks and fills are collected on
+    each new bar, the fills entering the events queue when they arrive.
+
+    Lost connections are re-established and the in-flight orders resent.
+    The round trip latencies are recorded for each order.
+    """
+
+    requires_bars: bool = True
+
+    def __init__(
+        self,
+        events: Any,
+        bars: Any,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        network_latency: float = 0.001,
+        exchange_latency: float = 0.005,
+        jitter: float = 0.0,
+        client_id: Optional[str] = None,
+        reconnect_attempts: int = 5,
+        reconnect_delay: float = 0.1,
+    ) -> None:
+        """
+        Initialises the handler, starting a local SimulatedBroker if no port is given.
+
+        Parameters:
+        events - The Queue of Event objects.
+        bars - The DataHandler object, providing the
+               reference price sent with the orders.
+        host - Host of the broker.
+        port - Port of the broker, None to start a local SimulatedBroker.
+        network_latency, exchange_latency, jitter - Latencies of the local
+                                                    SimulatedBroker, in seconds.
+        client_id - Identifies the session with the broker across reconnections.
+        reconnect_attempts - Number of connection attempts before giving up.
+        reconnect_delay - Initial delay between attempts, doubled after each failure.
+        """
+        self.events: Any = events
+        self.bars: Any = bars
+        self.host: str = host
+        self.broker_process: Optional[multiprocessing.Process] = None
+        if port is None:
+            self.broker_process, port = start_broker(
+                host, 0, network_latency, exchange_latency, jitter
+            )
+        self.port: int = port
+        if not client_id:
+            client_id = "client-%d-%d" % (id(self), int(time.time() * 1e6))
+        self.client_id: str = client_id
+        self.reconnect_attempts: int = reconnect_attempts
+        self.reconnect_delay: float = reconnect_delay
+
+        # Orders sent and not filled yet, with the time they were sent
+        self.in_flight: Dict[int, Tuple[OrderEvent, float]] = {}
+        self.acked: Set[int] = set()
+        self.ack_latencies: List[float] = []
+        self.fill_latencies: List[float] = []
+        self.reconnections: int = 0
+        self._buffer: bytes = b""
+        self._outgoing: bytes = b""
+        self.sock: Optional[socket.socket] = None
+        self._connect()
+
+    def _connect(self) -> None:
+        """
+        Connects (or reconnects) to the broker and resends the in-flight orders.
+        """
+        delay = self.reconnect_delay
+        for attempt in range(self.reconnect_attempts):
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5.0)
+                break
+            except OSError:
+                if attempt == self.reconnect_attempts - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        self.sock = sock
+        self._buffer = b""
+        self._outgoing = b""
+        self._queue_message({"msg": "hello", "client_id": self.client_id})
+        for order, _ in self.in_flight.values():
+            self._queue_message(self._order_message(order))
+        self._flush()
+
+    def _reconnect(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.reconnections += 1
+        self._connect()
+
+    def _order_message(self, order: OrderEvent) -> Dict[str, Any]:
+        return {
+            "msg": "order",
+            "id": order.order_id,
+            "symbol": order.symbol,
+            "quantity": order.quantity,
+            "direction": order.direction,
+            "order_type": order.order_type,
+            "price": float(self.bars.get_latest_bar_value(order.symbol, "adj_close")),
+        }
+
+    def _queue_message(self, message: Dict[str, Any]) -> None:
+        self._outgoing += (json.dumps(message) + "\n").encode()
+
+    def _flush(self) -> None:
+        """
+        Sends as much of the outgoing buffer as the socket accepts without blocking.
+        """
+        while self._outgoing:
+            try:
+                sent = self.sock.send(self._outgoing)
+            except BlockingIOError:
+                return
+            except OSError:
+                self._reconnect()
+                return
+            self._outgoing = self._outgoing[sent:]
+
+    def execute_order(self, event: OrderEvent) -> None:
+        """
+        Sends the order to the broker without waiting for its ack or fill.
+
+        Parameters:
+        event - Contains an Event object with order information.
+        """
+        if isinstance(event, OrderEvent) and event.quantity > 0:
+            self.in_flight[event.order_id] = (event, time.monotonic())
+            self._queue_message(self._order_message(event))
+            self._flush()
+
+    def poll(self) -> None:
+        """
+        Collects the acks and fills received so far, without blocking.
+        """
+        self._flush()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                self._reconnect()
+                return
+            if not data:
+                self._reconnect()
+                return
+            *lines, self._buffer = (self._buffer + data).split(b"\n")
+            for line in lines:
+                if line:
+                    self._handle(json.loads(line))
+
+    def _handle(self, message: Dict[str, Any]) -> None:
+        sent = self.in_flight.get(message["id"])
+        if sent is None:
+            # Replayed message of an order already filled
+            return
+        order, sent_time = sent
+        if message["msg"] == "ack":
+            if message["id"] in self.acked:
+                return
+            self.acked.add(message["id"])
+            self.ack_latencies.append(time.monotonic() - sent_time)
+        elif message["msg"] == "fill":
+            self.fill_latencies.append(time.monotonic() - sent_time)
+            del self.in_flight[message["id"]]
+            self.acked.discard(message["id"])
+            self.events.put(
+                FillEvent(
+                    self.bars.get_latest_bar_datetime(order.symbol),
+                    order.symbol,
+                    "SIMULATED_BROKER",
+                    message["quantity"],
+                    message["direction"],
+                    message["price"],
+                )
+            )
+
+    def on_market(self, event: Any) -> None:
+        """
+        Collects the fills received since the previous bar.
+        """
+        self.poll()
+
+    def wait_for_fills(self, timeout: float = 5.0) -> bool:
+        """
+        Blocks until all in-flight orders are filled or the timeout expires,
+        e.g. at the end of a backtest. Returns whether everything was filled.
+        """
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            self.poll()
+            time.sleep(0.0005)
+        return not self.in_flight
+
+    def finish(self) -> Dict[str, float]:
+        """
+        Waits for the fills of the in-flight orders at the end of the
+        backtest, then closes the connection.
+
+        Returns:
+        The latency_summary, orders_in_flight counting
+        the orders not filled by the broker.
+        """
+        self.wait_for_fills()
+        summary = self.latency_summary()
+        self.close()
+        return summary
+
+    def latency_summary(self) -> Dict[str, float]:
+        """
+        Returns the mean and 50/99th percentiles of
+        the ack and fill latencies, in milliseconds.
+        """
+        summary: Dict[str, float] = {"orders_in_flight": float(len(self.in_flight)),
+                                     "reconnections": float(self.reconnections)}
+        for name, latencies in (
+            ("ack", self.ack_latencies),
+            ("fill", self.fill_latencies),
+        ):
+            if latencies:
+                ordered = sorted(latencies)
+                summary["%s_mean_ms" % name] = 1000.0 * sum(ordered) / len(ordered)
+                summary["%s_p50_ms" % name] = 1000.0 * ordered[len(ordered) // 2]
+                summary["%s_p99_ms" % name] = (
+                    1000.0 * ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+                )
+        return summary
+
+    def _drain(self, timeout: float) -> None:
+        """
+        Sends the outgoing buffer, waiting at most timeout
+        seconds for the socket to accept it.
+        """
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_WRITE)
+            while self._outgoing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    return
+                try:
+                    sent = self.sock.send(self._outgoing)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    return
+                self._outgoing = self._outgoing[sent:]
+
+    def close(self) -> None:
+        """
+        Closes the connection, shutting down the local broker if it was started here.
+        """
+        if self.sock is not None:
+            if self.broker_process is not None:
+                self._queue_message({"msg": "shutdown"})
+                self._drain(1.0)
+            self.sock.close()
+            self.sock = None
+        if self.broker_process is not None:
+            self.broker_process.join(timeout=1.0)
+            if self.broker_process.is_alive():
+                self.broker_process.terminate()
+            self.broker_process = None
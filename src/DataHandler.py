@@ -3,13 +3,56 @@ from __future__ import print_function
 import numpy as np
 import os
 import pandas as pd
-import yfinance as yf
-from typing import Dict, List, Tuple, Optional, Iterator, Any, Union
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple, Optional, Iterator, Any, Union
 from datetime import datetime
 from abc import ABCMeta, abstractmethod
 from .Events import MarketEvent
 
 
+class FrameCache(object):
+    """
+    Least recently used cache of the price frames loaded by the data
+    handlers, shared by the backtests of a process. A process running many
+    backtests (a worker of a batch) reads or downloads each data set once.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        """
+        Parameters:
+        max_entries - Maximum number of frames kept, 0 disables the cache.
+        """
+        self.max_entries: int = max_entries
+        self.frames: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable, load: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Returns a copy of the frame cached under key, loaded by load() if missing.
+        The handlers modify their frames, the cached frame is never returned.
+        """
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+            frame = load()
+            # An empty frame (failed download) is loaded again next time
+            if self.max_entries > 0 and len(frame) > 0:
+                self.frames[key] = frame
+                while len(self.frames) > self.max_entries:
+                    self.frames.popitem(last=False)
+        else:
+            self.hits += 1
+            self.frames.move_to_end(key)
+        return frame.copy()
+
+    def clear(self) -> None:
+        self.frames.clear()
+
+
+FRAME_CACHE = FrameCache()
+
+
 class DataManagement(object):
     """
     Data management class implemented in an abstract manner to handle different
@@ -55,6 +98,47 @@ class DataManagement(object):
         """
         raise NotImplementedError("Should implement get_latest_bars_values()")
 
+    def get_history_values(self, symbol: str, val_type: str) -> np.ndarray:
+        """
+        Returns the values of the whole data set, including the bars not
+        yet reached by the backtest. Meant for offline research such as
+        pair selection, never for signals.
+        """
+        return self.symbol_frames[symbol][val_type].values
+
+    def get_latest_bars_panel(self, val_types: List[str], N: int = 1) -> np.ndarray:
+        """
+        Returns the last N bars of the whole universe as a
+        (N x symbols x val_types) array, or N-k bars if less available.
+        Symbols follow symbol_list. When the handler keeps its frames the
+        array is a read-only view of a panel built once, so the cost per
+        bar does not grow with the number of symbols.
+        """
+        frames = getattr(self, "symbol_frames", None)
+        if not frames:
+            return np.stack(
+                [
+                    np.column_stack(
+                        [
+                            self.get_latest_bars_values(symbol, val_type, N)
+                            for val_type in val_types
+                        ]
+                    )
+                    for symbol in self.symbol_list
+                ],
+                axis=1,
+            )
+
+        panels = self.__dict__.setdefault("_panels", {})
+        key = tuple(val_types)
+        if key not in panels:
+            panel = np.stack([frames[symbol][list(val_types)].values.astype(np.float64)
+                              for symbol in self.symbol_list], axis=1)
+            panel.flags.writeable = False
+            panels[key] = panel
+        n_bars = len(self.latest_symbol_data[self.symbol_list[0]])
+        return panels[key][max(0, n_bars - N):n_bars]
+
     @abstractmethod
     def update_bars(self) -> None:
         """
@@ -94,6 +178,7 @@ class YahooDataHandler(DataManagement):
         self.end_date = end_date
         self.symbol_data: Dict[str, Iterator[Tuple[datetime, pd.Series]]] = {}
         self.latest_symbol_data: Dict[str, List[Tuple[datetime, pd.Series]]] = {}
+        self.symbol_frames: Dict[str, pd.DataFrame] = {}
         self.continue_backtest = True
         self._load_data_from_Yahoo_finance()
 
@@ -101,14 +186,30 @@ class YahooDataHandler(DataManagement):
         """
         Queries yfinance api to receive historical data in csv file format
         """
+        # Only needed by this handler, not imported with the module
+        import yfinance as yf
 
         combined_index: Optional[pd.DatetimeIndex] = None
         for symbol in self.symbol_list:
 
             # download data from yfinance for symbol. This could be improved as yfinance can download several
             # symbols at the same time
-            self.symbol_data[symbol] = yf.download(tickers=[symbol], start=self.start_date,
-                                                   end=self.end_date, interval=self.interval, auto_adjust=False)
+            self.symbol_data[symbol] = FRAME_CACHE.get(
+                (
+                    "yahoo",
+                    symbol,
+                    str(self.start_date),
+                    str(self.end_date),
+                    self.interval,
+                ),
+                lambda: yf.download(
+                    tickers=[symbol],
+                    start=self.start_date,
+                    end=self.end_date,
+                    interval=self.interval,
+                    auto_adjust=False,
+                ),
+            )
 
             # Handle multi-level columns (when downloading multiple symbols)
             if isinstance(self.symbol_data[symbol].columns, pd.MultiIndex):
@@ -144,7 +245,10 @@ class YahooDataHandler(DataManagement):
 
         # Reindex the dataframes
         for symbol in self.symbol_list:
-            self.symbol_data[symbol] = self.symbol_data[symbol].reindex(index=combined_index, method="pad").iterrows()
+            self.symbol_frames[symbol] = self.symbol_data[symbol].reindex(
+                index=combined_index, method="pad"
+            )
+            self.symbol_data[symbol] = self.symbol_frames[symbol].iterrows()
 
     def _get_new_bar(self, symbol: str) -> Iterator[Tuple[datetime, pd.Series]]:
         """
@@ -262,6 +366,7 @@ class HistoricCSVDataHandler(DataManagement):
 
         self.symbol_data: Dict[str, Iterator[Tuple[datetime, pd.Series]]] = {}
         self.latest_symbol_data: Dict[str, List[Tuple[datetime, pd.Series]]] = {}
+        self.symbol_frames: Dict[str, pd.DataFrame] = {}
         self.continue_backtest = True
         self._data_conversion_from_csv_files()
 
@@ -274,10 +379,25 @@ class HistoricCSVDataHandler(DataManagement):
         combined_index: Optional[pd.DatetimeIndex] = None
         for symbol in self.symbol_list:
             # Load the CSV file with no header information, indexed on date
-            self.symbol_data[symbol] = pd.io.parsers.read_csv(
-                os.path.join(self.csv_dir, "%s.csv" % symbol),
-                header=0, index_col=0,
-                names=["datetime", "open", "high", "low", "close", "adj_close", "volume"]
+            # (cached by content signature, a modified file is read again)
+            path = os.path.abspath(os.path.join(self.csv_dir, "%s.csv" % symbol))
+            status = os.stat(path)
+            self.symbol_data[symbol] = FRAME_CACHE.get(
+                ("csv", path, status.st_size, status.st_mtime_ns),
+                lambda: pd.io.parsers.read_csv(
+                    path,
+                    header=0,
+                    index_col=0,
+                    names=[
+                        "datetime",
+                        "open",
+                        "high",
+                        "low",
+                        "close",
+                        "adj_close",
+                        "volume",
+                    ],
+                ),
             )
 
             # rename index as well from 'Date' to 'datetime'
@@ -301,7 +421,10 @@ class HistoricCSVDataHandler(DataManagement):
 
         # Reindex the dataframes
         for symbol in self.symbol_list:
-            self.symbol_data[symbol] = self.symbol_data[symbol].reindex(index=combined_index, method="pad").iterrows()
+            self.symbol_frames[symbol] = self.symbol_data[symbol].reindex(
+                index=combined_index, method="pad"
+            )
+            self.symbol_data[symbol] = self.symbol_frames[symbol].iterrows()
 
     def _get_new_bar(self, symbol: str) -> Iterator[Tuple[datetime, pd.Series]]:
         """
@@ -1,6 +1,9 @@
-from typing import Optional, Union
+import itertools
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
+import numpy as np
+
 
 class Event(object):
     """
@@ -42,6 +45,26 @@ class SignalEvent(Event):
         self.strength: float = strength
 
 
+class TargetWeightEvent(Event):
+    """
+    Target weight event generated from a strategy that rebalances the whole
+    universe in one shot, instead of one SignalEvent per symbol.
+
+    Parameters:
+    datetime - A datetime at which the weights are generated.
+    weights - Desired fraction of the total equity per symbol, either a dict
+              keyed by symbol (missing symbols are closed) or an array aligned
+              with the symbol list of the portfolio. Negative weights are shorts.
+    """
+
+    def __init__(
+        self, datetime: datetime, weights: Union[Dict[str, float], np.ndarray]
+    ) -> None:
+        self.type: str = "WEIGHTS"
+        self.datetime: datetime = datetime
+        self.weights: Union[Dict[str, float], np.ndarray] = weights
+
+
 class OrderEvent(Event):
     """
     Order event to be sent to a broker api. It takes into account the quantity,
@@ -49,17 +72,37 @@ class OrderEvent(Event):
 
     Parameters:
     symbol - The symbol for current asset.
-    order_type - Whether is it a 'MARKET' or 'LIMIT' order
+    order_type - 'MKT', 'LMT' (limit), 'STP' (stop) or 'STP_LMT' (stop-limit) order
     quantity --> TODO: this should be implemented in a risk class (Kelly Criterion, etc)
     direction - 1 or -1 based on the type
+    limit_price - Limit price of 'LMT' and 'STP_LMT' orders
+    stop_price - Trigger price of 'STP' and 'STP_LMT' orders
+    time_in_force - 'GTC' (good till cancelled) or 'DAY' for resting orders
+    order_id - Unique id used to cancel the order, generated if not given
     """
 
-    def __init__(self, symbol: str, order_type: str, quantity: int, direction: int) -> None:
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        symbol: str,
+        order_type: str,
+        quantity: int,
+        direction: int,
+        limit_price: Optional[float] = None,
+        stop_price: Optional[float] = None,
+        time_in_force: str = "GTC",
+        order_id: Optional[int] = None,
+    ) -> None:
         self.type: str = "ORDER"
         self.symbol: str = symbol
         self.order_type: str = order_type
         self.quantity: int = quantity
         self.direction: int = direction
+        self.limit_price: Optional[float] = limit_price
+        self.stop_price: Optional[float] = stop_price
+        self.time_in_force: str = time_in_force
+        self.order_id: int = next(OrderEvent._ids) if order_id is None else order_id
 
     def print_order(self) -> None:
         """
@@ -69,6 +112,33 @@ class OrderEvent(Event):
         (self.symbol, self.order_type, self.quantity, self.direction)
 
 
+class CancelOrderEvent(Event):
+    """
+    Cancels a resting (limit, stop or stop-limit) order.
+
+    Parameters:
+    order_id - The id of the OrderEvent to cancel.
+    """
+
+    def __init__(self, order_id: int) -> None:
+        self.type: str = "CANCEL"
+        self.order_id: int = order_id
+
+
+class OrderBatchEvent(Event):
+    """
+    Batch of orders generated in one step (e.g. by a rebalance), so that
+    a rebalance is a single round trip through the events queue.
+
+    Parameters:
+    orders - The list of OrderEvent objects.
+    """
+
+    def __init__(self, orders: List[OrderEvent]) -> None:
+        self.type: str = "ORDER_BATCH"
+        self.orders: List[OrderEvent] = orders
+
+
 class FillEvent(Event):
     """
     Fill event once an order based on the response from the broker
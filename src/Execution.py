@@ -1,8 +1,12 @@
 from abc import ABCMeta, abstractmethod
-from typing import Any, Optional
-from .Events import FillEvent, OrderEvent
+from typing import Any, Dict, List, Optional
+from .Events import FillEvent, OrderEvent, MarketEvent, CancelOrderEvent
+from .FillModels import SlippageModel, SpreadModel, NoSlippage, FixedSpread
+from .OrderBook import RestingOrderBook
 from datetime import datetime
 
+import numpy as np
+
 
 class ExecutionHandler(object):
     """
@@ -12,6 +16,20 @@ class ExecutionHandler(object):
 
     __metaclass__ = ABCMeta
 
+    # Whether the handler needs the DataHandler,
+    # passed by the Backtest as second argument
+    requires_bars: bool = False
+
+    def on_market(self, event: MarketEvent) -> None:
+        """
+        Called by the backtest loop on each new bar, before the strategy,
+        so that handlers can fill the orders that are due on this bar.
+
+        Parameters:
+        event - The MarketEvent of the new bar.
+        """
+        pass
+
     @abstractmethod
     def execute_order(self, event: OrderEvent) -> None:
         """
@@ -23,6 +41,38 @@ class ExecutionHandler(object):
         """
         raise NotImplementedError("Should implement execute_order()")
 
+    def execute_orders(self, orders: List[OrderEvent]) -> None:
+        """
+        Executes a batch of orders generated in the same step. Handlers
+        that can process the batch at once should override it.
+
+        Parameters:
+        orders - The list of OrderEvent objects.
+        """
+        for order in orders:
+            self.execute_order(order)
+
+    def cancel_order(self, event: CancelOrderEvent) -> None:
+        """
+        Cancels a resting order. Handlers filling every order at once
+        have nothing to cancel.
+
+        Parameters:
+        event - Contains the id of the order to cancel.
+        """
+        pass
+
+    def finish(self) -> Optional[Dict[str, float]]:
+        """
+        Called by the backtest once the last bar is handled, before the
+        results. Handlers with orders still pending elsewhere (a broker)
+        put their fills on the events queue and release their resources.
+
+        Returns:
+        Statistics of the handler (e.g. latencies), or None.
+        """
+        return None
+
 
 class SimpleSimulatedExecutionHandler(ExecutionHandler):
     """
@@ -52,3 +102,258 @@ class SimpleSimulatedExecutionHandler(ExecutionHandler):
         if isinstance(event, OrderEvent):
             fill_event: FillEvent = FillEvent(datetime.utcnow(), event.symbol, "FAKE_EXCHANGE", event.quantity, event.direction, float("nan"))
             self.events.put(fill_event)
+
+
+class SimulatedExecutionHandler(ExecutionHandler):
+    """
+    Simulated execution with pluggable slippage and bid/ask spread models,
+    a fill latency in bars and partial fills capped by the bar volume.
+
+    With latency_bars=0 orders fill on the current bar at the adjusted close,
+    otherwise at the adjusted open of the bar latency_bars bars later. All the
+    orders due on a bar are filled together as one vectorized batch; the
+    unfilled remainder of partially filled orders is carried to the next bar.
+
+    LMT, STP and STP_LMT orders rest in a RestingOrderBook and are matched
+    against the following bars. Their fills are not capped by the volume, and
+    triggered stops pay the spread and slippage like market orders.
+    """
+
+    requires_bars: bool = True
+
+    def __init__(
+        self,
+        events: Any,
+        bars: Any,
+        slippage_model: Optional[SlippageModel] = None,
+        spread_model: Optional[SpreadModel] = None,
+        latency_bars: int = 1,
+        max_volume_participation: Optional[float] = None,
+        exchange: str = "SIMULATED",
+        intrabar_path: str = "nearest",
+    ) -> None:
+        """
+        Initialises the handler.
+
+        Parameters:
+        events - The Queue of Event objects.
+        bars - The DataHandler object that provides bar information.
+        slippage_model - SlippageModel of the market impact, none by default.
+        spread_model - SpreadModel of the bid/ask spread,
+                       a fixed 2bps spread by default.
+        latency_bars - Number of bars between an order and its
+                       fill (0 fills on the current close).
+        max_volume_participation - Maximum share of a bar volume filled
+                                   per symbol (None for no cap).
+        exchange - Name of the exchange reported on the fills.
+        intrabar_path - Order in which resting orders are crossed
+                        within a bar: 'OHLC', 'OLHC' or 'nearest'.
+        """
+        self.events: Any = events
+        self.bars: Any = bars
+        self.slippage_model: SlippageModel = (
+            slippage_model if slippage_model is not None else NoSlippage()
+        )
+        self.spread_model: SpreadModel = (
+            spread_model if spread_model is not None else FixedSpread()
+        )
+        self.latency_bars: int = latency_bars
+        self.max_volume_participation: Optional[float] = max_volume_participation
+        self.exchange: str = exchange
+
+        self.bar_count: int = 0
+        # Pending orders as [order, remaining quantity, bar index at which it is due]
+        self.pending: List[List[Any]] = []
+        self.order_book: RestingOrderBook = RestingOrderBook(intrabar_path)
+
+    def on_market(self, event: MarketEvent) -> None:
+        """
+        Fills the orders due on the new bar at its open, then the
+        resting orders crossed by the bar.
+        """
+        if isinstance(event, MarketEvent):
+            self.bar_count += 1
+            self._fill_due_orders("open")
+            self._match_resting_orders()
+
+    def execute_order(self, event: OrderEvent) -> None:
+        """
+        Queues the order to be filled after the latency.
+
+        Parameters:
+        event - Contains an Event object with order information.
+        """
+        self.execute_orders([event])
+
+    def execute_orders(self, orders: List[OrderEvent]) -> None:
+        """
+        Queues a batch of orders, filling them at once when there is no latency.
+
+        Parameters:
+        orders - The list of OrderEvent objects.
+        """
+        for order in orders:
+            if not isinstance(order, OrderEvent) or order.quantity <= 0:
+                continue
+            if order.order_type in ("LMT", "STP", "STP_LMT"):
+                self.order_book.add(order)
+            else:
+                self.pending.append(
+                    [order, order.quantity, self.bar_count + self.latency_bars]
+                )
+        if self.latency_bars == 0:
+            self._fill_due_orders("close")
+
+    def cancel_order(self, event: CancelOrderEvent) -> None:
+        """
+        Cancels a resting order of the book.
+        """
+        if isinstance(event, CancelOrderEvent):
+            self.order_book.cancel(event.order_id)
+
+    def _bar_arrays(self, symbols: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Latest bar values of the given (unique) symbols, the OHLC prices being
+        scaled by adj_close / close to match the prices used by the Portfolio.
+        """
+        bars: Dict[str, np.ndarray] = {
+            field: np.array(
+                [self.bars.get_latest_bar_value(symbol, field) for symbol in symbols],
+                dtype=np.float64,
+            )
+            for field in ("open", "high", "low", "close", "adj_close", "volume")
+        }
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = bars["adj_close"] / bars["close"]
+        factor = np.where(np.isfinite(factor) & (factor > 0), factor, 1.0)
+        for field in ("open", "high", "low", "close"):
+            bars[field] = bars[field] * factor
+        return bars
+
+    def _fill_due_orders(self, reference: str) -> None:
+        """
+        Fills all the pending orders due on the current bar as one batch.
+
+        Parameters:
+        reference - Bar field used as the reference price, 'open' or 'close'.
+        """
+        due = [pending for pending in self.pending if pending[2] <= self.bar_count]
+        if not due:
+            return
+        self.pending = [
+            pending for pending in self.pending if pending[2] > self.bar_count
+        ]
+
+        unique_symbols, inverse = np.unique(
+            [pending[0].symbol for pending in due], return_inverse=True
+        )
+        symbol_bars = self._bar_arrays(unique_symbols)
+        bars = {field: values[inverse] for field, values in symbol_bars.items()}
+        remaining = np.array([pending[1] for pending in due], dtype=np.float64)
+        sign = np.array(
+            [1.0 if pending[0].direction == "BUY" else -1.0 for pending in due]
+        )
+
+        # Cap the quantity filled per symbol to a
+        # share of the bar volume, in order of arrival
+        filled = remaining.copy()
+        if self.max_volume_participation is not None:
+            volume = np.where(
+                np.isfinite(symbol_bars["volume"]), symbol_bars["volume"], np.inf
+            )
+            capacity = np.floor(self.max_volume_participation * volume)
+            by_symbol = np.argsort(inverse, kind="stable")
+            group = inverse[by_symbol]
+            taken_before = np.cumsum(remaining[by_symbol]) - remaining[by_symbol]
+            first = np.searchsorted(group, np.arange(len(unique_symbols)))
+            used = taken_before - taken_before[first][group]
+            filled[by_symbol] = np.clip(
+                capacity[group] - used, 0.0, remaining[by_symbol]
+            )
+
+        reference_price = bars["adj_close"] if reference == "close" else bars["open"]
+        adverse = self.spread_model.half_spread(bars) + self.slippage_model.slippage(
+            filled, bars
+        )
+        fill_price = reference_price * (1.0 + sign * adverse)
+        tradable = np.isfinite(fill_price) & (filled > 0)
+
+        bar_datetimes = [
+            self.bars.get_latest_bar_datetime(symbol) for symbol in unique_symbols
+        ]
+        for i in np.flatnonzero(tradable):
+            order = due[i][0]
+            self.events.put(
+                FillEvent(
+                    bar_datetimes[inverse[i]],
+                    order.symbol,
+                    self.exchange,
+                    int(filled[i]),
+                    order.direction,
+                    float(fill_price[i]),
+                )
+            )
+
+        # Unfilled remainders are retried on the next bar
+        left = np.where(tradable, remaining - filled, remaining)
+        for i in np.flatnonzero(left > 0):
+            self.pending.append([due[i][0], int(left[i]), self.bar_count + 1])
+
+    def _match_resting_orders(self) -> None:
+        """
+        Matches the resting orders of the symbols that have some against the
+        new bar, and fills them in their intrabar order.
+        """
+        symbols = self.order_book.active_symbols()
+        if not symbols:
+            return
+        bar_datetime = self.bars.get_latest_bar_datetime(symbols[0])
+        self.order_book.expire_day_orders(
+            bar_datetime.date() if hasattr(bar_datetime, "date") else bar_datetime
+        )
+
+        symbol_bars = self._bar_arrays(np.array(symbols))
+        matched = []
+        for i, symbol in enumerate(symbols):
+            bar = {
+                field: symbol_bars[field][i]
+                for field in ("open", "high", "low", "close")
+            }
+            if all(np.isfinite(value) for value in bar.values()):
+                matched.extend(
+                    (order, price, i)
+                    for order, price, _ in self.order_book.match(symbol, bar)
+                )
+        if not matched:
+            return
+
+        index = np.array([symbol_index for _, _, symbol_index in matched])
+        bars = {field: values[index] for field, values in symbol_bars.items()}
+        quantity = np.array(
+            [order.quantity for order, _, _ in matched], dtype=np.float64
+        )
+        sign = np.array(
+            [1.0 if order.direction == "BUY" else -1.0 for order, _, _ in matched]
+        )
+        # Triggered stops become market orders, limits fill at their price
+        is_stop = np.array([order.order_type == "STP" for order, _, _ in matched])
+        adverse = np.where(
+            is_stop,
+            self.spread_model.half_spread(bars)
+            + self.slippage_model.slippage(quantity, bars),
+            0.0,
+        )
+        limit_price = np.array([price for _, price, _ in matched])
+        fill_price = limit_price * (1.0 + sign * adverse)
+
+        for k, (order, _, symbol_index) in enumerate(matched):
+            self.events.put(
+                FillEvent(
+                    self.bars.get_latest_bar_datetime(symbols[symbol_index]),
+                    order.symbol,
+                    self.exchange,
+                    order.quantity,
+                    order.direction,
+                    float(fill_price[k]),
+                )
+            )
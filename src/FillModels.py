@@ -0,0 +1,153 @@
+"""
+Slippage and bid/ask spread models of the SimulatedExecutionHandler.
+Every model works on a whole batch of orders at once: the bar fields are
+arrays aligned with the orders (open, high, low, close, volume) and the
+models return the adverse price move of each order as a fraction of the
+reference price, which is then applied in the direction of the trade.
+"""
+
+from __future__ import print_function
+
+from abc import ABCMeta, abstractmethod
+from typing import Dict
+
+import numpy as np
+
+
+class SlippageModel(object):
+    """
+    SlippageModel is an abstract base class for the market impact of an
+    order, as a fraction of the reference price.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def slippage(self, quantity: np.ndarray, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Returns the slippage of each order as a fraction of the price.
+
+        Parameters:
+        quantity - Absolute quantity of each order.
+        bars - Dict of field name to array of bar values aligned with the orders.
+        """
+        raise NotImplementedError("Should implement slippage()")
+
+
+class NoSlippage(SlippageModel):
+    """
+    Fills at the reference price.
+    """
+
+    def slippage(self, quantity: np.ndarray, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        return np.zeros(len(quantity))
+
+
+class FixedBpsSlippage(SlippageModel):
+    """
+    Constant slippage in basis points of the price.
+    """
+
+    def __init__(self, bps: float = 5.0) -> None:
+        """
+        Parameters:
+        bps - Slippage in basis points (1bp = 0.01%).
+        """
+        self.bps: float = bps
+
+    def slippage(self, quantity: np.ndarray, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        return np.full(len(quantity), self.bps * 1e-4)
+
+
+class VolumeParticipationSlippage(SlippageModel):
+    """
+    Slippage growing with the square of the participation rate, the share of
+    the bar volume taken by the order: impact = coefficient * (quantity / volume)^2.
+    """
+
+    def __init__(self, coefficient: float = 0.1) -> None:
+        """
+        Parameters:
+        coefficient - Price impact of an order trading the whole bar volume.
+        """
+        self.coefficient: float = coefficient
+
+    def slippage(self, quantity: np.ndarray, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            participation = np.where(bars["volume"] > 0, quantity / bars["volume"], 1.0)
+        return self.coefficient * np.minimum(participation, 1.0) ** 2
+
+
+class SquareRootImpactSlippage(SlippageModel):
+    """
+    Square root market impact law: impact = eta * sigma * sqrt(quantity / volume),
+    with sigma the Parkinson volatility estimate from the high/low range of the bar.
+    """
+
+    def __init__(self, eta: float = 1.0) -> None:
+        """
+        Parameters:
+        eta - Impact coefficient, of order one in the empirical literature.
+        """
+        self.eta: float = eta
+
+    def slippage(self, quantity: np.ndarray, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sigma = np.log(bars["high"] / bars["low"]) / np.sqrt(4.0 * np.log(2.0))
+            participation = np.where(bars["volume"] > 0, quantity / bars["volume"], 1.0)
+        sigma = np.where(np.isfinite(sigma), sigma, 0.0)
+        return self.eta * sigma * np.sqrt(np.minimum(participation, 1.0))
+
+
+class SpreadModel(object):
+    """
+    SpreadModel is an abstract base class for the bid/ask spread paid when
+    crossing the spread, as a fraction of the mid price.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def half_spread(self, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Returns half the bid/ask spread of each order as a fraction of the price.
+
+        Parameters:
+        bars - Dict of field name to array of bar values aligned with the orders.
+        """
+        raise NotImplementedError("Should implement half_spread()")
+
+
+class FixedSpread(SpreadModel):
+    """
+    Constant bid/ask spread in basis points.
+    """
+
+    def __init__(self, bps: float = 2.0) -> None:
+        """
+        Parameters:
+        bps - Full bid/ask spread in basis points, half of it is paid on each fill.
+        """
+        self.bps: float = bps
+
+    def half_spread(self, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        return np.full(len(bars["close"]), 0.5 * self.bps * 1e-4)
+
+
+class RangeSpread(SpreadModel):
+    """
+    Bid/ask spread proportional to the high/low range of the bar, for data
+    without quotes: spread = fraction * (high - low) / close.
+    """
+
+    def __init__(self, fraction: float = 0.1) -> None:
+        """
+        Parameters:
+        fraction - Share of the bar range taken as the bid/ask spread.
+        """
+        self.fraction: float = fraction
+
+    def half_spread(self, bars: Dict[str, np.ndarray]) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread = self.fraction * (bars["high"] - bars["low"]) / bars["close"]
+        return 0.5 * np.where(np.isfinite(spread), spread, 0.0)
@@ -0,0 +1,361 @@
+"""
+Persistent job queue of the runs of a batch, in a SQLite file.
+
+A job is a JSON payload under a unique key, in one of the states pending,
+running, done or failed. Workers lease pending jobs for lease_seconds and
+renew their leases by heartbeats while the jobs run; the jobs of a worker
+that stops heartbeating (crashed, killed, host lost) return to pending when
+their lease expires and are leased by the other workers. Results are stored
+with the jobs, so an interrupted batch resumes where it stopped.
+
+Workers on several hosts may share the file on a filesystem with working
+POSIX locks: the queue keeps SQLite's rollback journal (WAL needs memory
+shared by the processes) and short BEGIN IMMEDIATE transactions. Leases are
+compared to the clocks of the hosts, which must be synchronized.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .RunCache import canonical_json
+
+STATES: Tuple[str, ...] = ("pending", "running", "done", "failed")
+
+Job = namedtuple("Job", ["id", "key", "payload", "attempts"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    submitted REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+class JobQueue(object):
+    """
+    Connection to a job queue file. A connection belongs to one thread,
+    each worker process (and heartbeat thread) opens its own.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, max_attempts: int = 3,
+                 timeout: float = 60.0) -> None:
+        """
+        Parameters:
+        path - SQLite file of the queue, created if missing.
+        lease_seconds - Duration of a lease without heartbeat.
+        max_attempts - Number of leases of a job before it is marked failed
+                       (errors and expired leases both count).
+        timeout - Seconds waited for the lock of the file held by another worker.
+        """
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        # Autocommit mode, the transactions are explicit
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        with self._transaction():
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    self.connection.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Takes the write lock up front, two workers never lease the same job
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def submit(self, jobs: Iterable[Tuple[str, Any]], force: bool = False) -> int:
+        """
+        Adds jobs to the queue. A key already in the queue is kept as it is,
+        unless its job failed (or is done and force is set): it is then
+        pending again, with the new payload.
+
+        Parameters:
+        jobs - (key, payload) pairs, the payloads are JSON serializable.
+        force - Whether jobs already done are run again.
+        Returns:
+        The number of jobs added or reset to pending.
+        """
+        now = time.time()
+        reset_states = ("failed", "done") if force else ("failed",)
+        with self._transaction() as connection:
+            changes = connection.total_changes
+            connection.executemany(
+                "INSERT INTO jobs (key, payload, submitted) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET payload = excluded.payload, "
+                "state = 'pending', attempts = 0, worker = NULL, lease_expires = NULL, "
+                "result = NULL, error = NULL, submitted = excluded.submitted "
+                "WHERE state IN (%s)"
+                % ", ".join("'%s'" % state for state in reset_states),
+                ((key, canonical_json(payload), now) for key, payload in jobs),
+            )
+            return connection.total_changes - changes
+
+    def _requeue_expired(self, connection: sqlite3.Connection, now: float) -> int:
+        cursor = connection.execute(
+            "UPDATE jobs SET "
+            "state = CASE WHEN attempts >= :max THEN 'failed' ELSE 'pending' END, "
+            "error = CASE WHEN attempts >= :max "
+            "THEN 'lease expired ' || attempts || ' times' ELSE error END, "
+            "worker = NULL, lease_expires = NULL "
+            "WHERE state = 'running' AND lease_expires < :now",
+            {"max": self.max_attempts, "now": now},
+        )
+        return cursor.rowcount
+
+    def requeue_expired(self) -> int:
+        """
+        Returns the jobs whose lease expired to pending (failed after
+        max_attempts leases). lease() does it before leasing.
+        Returns:
+        The number of expired leases.
+        """
+        with self._transaction() as connection:
+            return self._requeue_expired(connection, time.time())
+
+    def lease(self, worker: str, count: int = 1) -> List[Job]:
+        """
+        Leases the oldest pending jobs to a worker for lease_seconds.
+
+        Parameters:
+        worker - Identifier of the worker (host and process).
+        count - Maximum number of jobs leased.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            self._requeue_expired(connection, now)
+            rows = connection.execute(
+                "SELECT id, key, payload, attempts FROM jobs "
+                "WHERE state = 'pending' ORDER BY id LIMIT ?",
+                (count,),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE jobs SET state = 'running', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                ((worker, now + self.lease_seconds, row[0]) for row in rows),
+            )
+        return [
+            Job(job_id, key, json.loads(payload), attempts + 1)
+            for job_id, key, payload, attempts in rows
+        ]
+
+    def heartbeat(self, worker: str, job_ids: Iterable[int]) -> List[int]:
+        """
+        Renews the leases of the jobs of a worker.
+        Returns:
+        The jobs still leased by the worker, a job whose lease expired may
+        have been leased by another worker.
+        """
+        held = []
+        with self._transaction() as connection:
+            for job_id in job_ids:
+                cursor = connection.execute(
+                    "UPDATE jobs SET lease_expires = ? "
+                    "WHERE id = ? AND state = 'running' AND worker = ?",
+                    (time.time() + self.lease_seconds, job_id, worker),
+                )
+                if cursor.rowcount:
+                    held.append(job_id)
+        return held
+
+    def complete(self, job_id: int, worker: str, result: Any) -> bool:
+        """
+        Stores the result of a job and marks it done. The first result of a
+        job is kept: a worker which lost its lease still completes the job
+        if no other worker did.
+        Returns:
+        Whether the result was stored.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = 'done', result = ?, error = NULL, worker = ?, "
+                "lease_expires = NULL, finished = ? WHERE id = ? AND state != 'done'",
+                (canonical_json(result), worker, time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> Optional[str]:
+        """
+        Records the error of a job leased by worker. The job is pending again
+        until it has been leased max_attempts times, then failed.
+        Returns:
+        The new state of the job, None if the worker no longer held it.
+        """
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT attempts FROM jobs "
+                "WHERE id = ? AND state = 'running' AND worker = ?",
+                (job_id, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            state = "failed" if row[0] >= self.max_attempts else "pending"
+            connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, worker = NULL, "
+                "lease_expires = NULL, finished = ? WHERE id = ?",
+                (state, error, time.time(), job_id),
+            )
+            return state
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of jobs in each state.
+        """
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(
+            self.connection.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        )
+        return counts
+
+    def results(self) -> Iterator[Tuple[str, Any, Any]]:
+        """
+        Iterates over the (key, payload, result) of the jobs done, in submission order.
+        """
+        for key, payload, result in self.connection.execute(
+            "SELECT key, payload, result FROM jobs WHERE state = 'done' ORDER BY id"
+        ):
+            yield key, json.loads(payload), json.loads(result)
+
+    def failures(self) -> Iterator[Tuple[str, Any, str]]:
+        """
+        Iterates over the (key, payload, error) of the failed jobs, in submission order.
+        """
+        for key, payload, error in self.connection.execute(
+            "SELECT key, payload, error FROM jobs WHERE state = 'failed' ORDER BY id"
+        ):
+            yield key, json.loads(payload), error
+
+
+def default_worker_id() -> str:
+    """
+    Returns host:pid, unique among the workers sharing a queue.
+    """
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+class Worker(object):
+    """
+    Runs the jobs of a queue one at a time until none is pending or
+    running, renewing the lease of the current job from a heartbeat thread.
+    The worker is one long-lived process: what the jobs load (the frames of
+    the FRAME_CACHE of the data handlers) is reused by the next jobs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run_job: Callable[[str, Any], Any],
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        poll_seconds: float = 1.0,
+    ) -> None:
+        """
+        Parameters:
+        path - SQLite file of the queue.
+        run_job - Function of the key and payload of a job returning its
+                  JSON serializable result, an exception fails the job.
+        worker_id - Identifier of the worker, host:pid by default.
+        lease_seconds - Duration of a lease, renewed every third of it.
+        max_attempts - Number of leases of a job before it is marked failed.
+        poll_seconds - Wait between two polls while other workers run the last jobs.
+        """
+        self.path: str = path
+        self.run_job = run_job
+        self.worker_id: str = worker_id or default_worker_id()
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        self.poll_seconds: float = poll_seconds
+        self.queue: JobQueue = JobQueue(path, lease_seconds, max_attempts)
+        # Statistics: jobs completed, jobs failed, leases lost to expiry
+        self.done: int = 0
+        self.failed: int = 0
+        self.lost: int = 0
+
+    def _heartbeat(self, job_id: int, stop: threading.Event) -> None:
+        # SQLite connections are not shared between threads
+        queue = JobQueue(self.path, self.lease_seconds, self.max_attempts)
+        try:
+            while not stop.wait(self.lease_seconds / 3.0):
+                if not queue.heartbeat(self.worker_id, [job_id]):
+                    self.lost += 1
+                    return
+        finally:
+            queue.close()
+
+    def run_one(self, job: Job) -> bool:
+        """
+        Runs a leased job and records its result or error.
+        Returns:
+        Whether the job succeeded.
+        """
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job.id, stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = self.run_job(job.key, job.payload)
+        except Exception as e:
+            error = "%s: %s" % (type(e).__name__, e)
+            succeeded = False
+        else:
+            succeeded = True
+        finally:
+            stop.set()
+            heartbeat.join()
+        if succeeded:
+            self.queue.complete(job.id, self.worker_id, result)
+            self.done += 1
+        else:
+            self.queue.fail(job.id, self.worker_id, error)
+            self.failed += 1
+        return succeeded
+
+    def run(self, max_jobs: Optional[int] = None) -> int:
+        """
+        Runs jobs until the queue has no pending or running job (the jobs of
+        the other workers are waited for, and leased again if their worker
+        stops heartbeating), or max_jobs jobs were run.
+        Returns:
+        The number of jobs run.
+        """
+        count = 0
+        while max_jobs is None or count < max_jobs:
+            jobs = self.queue.lease(self.worker_id)
+            if not jobs:
+                if self.queue.counts()["running"] == 0:
+                    break
+                time.sleep(self.poll_seconds)
+                continue
+            self.run_one(jobs[0])
+            count += 1
+        return count
@@ -0,0 +1,278 @@
+"""
+Resting order book of the simulated execution: limit, stop and stop-limit
+orders with GTC/DAY time in force and cancellation.
+
+Resting orders are kept in per-symbol heaps sorted by their trigger price,
+so each bar only pops the orders crossed by the bar's high/low range instead
+of scanning every open order. Cancelled, filled and expired orders are
+removed lazily from the heaps. The intrabar order of the fills follows an
+assumed path through the open, high, low and close of the bar.
+"""
+
+from __future__ import print_function
+
+import heapq
+import itertools
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Intrabar paths: the open, then the high and low in the given order, then the close
+OHLC_PATHS: List[str] = ["OHLC", "OLHC", "nearest"]
+
+
+class RestingOrder(object):
+    """
+    An order waiting in the book.
+
+    Parameters:
+    order - The OrderEvent.
+    seq - Arrival sequence number, used as tie breaker for equal prices.
+    """
+
+    def __init__(self, order: Any, seq: int) -> None:
+        self.order: Any = order
+        self.seq: int = seq
+        self.is_buy: bool = order.direction == "BUY"
+        # Stop-limit orders become limit orders once their stop is triggered
+        self.triggered: bool = order.order_type == "LMT"
+        self.session: Optional[Any] = None
+
+
+class SymbolOrderBook(object):
+    """
+    Resting orders of one symbol, in four heaps keyed on the price at which
+    they become crossed:
+    buy limits fill when the low reaches them (highest first),
+    sell limits fill when the high reaches them (lowest first),
+    buy stops trigger when the high reaches them (lowest first),
+    sell stops trigger when the low reaches them (highest first).
+    """
+
+    def __init__(self) -> None:
+        self.buy_limits: List[Tuple[float, int, int]] = []
+        self.sell_limits: List[Tuple[float, int, int]] = []
+        self.buy_stops: List[Tuple[float, int, int]] = []
+        self.sell_stops: List[Tuple[float, int, int]] = []
+
+    def push(self, resting: RestingOrder) -> None:
+        """
+        Adds the order to the heap matching its current state.
+        """
+        order = resting.order
+        entry_id = order.order_id
+        if resting.triggered:
+            if resting.is_buy:
+                heapq.heappush(
+                    self.buy_limits, (-order.limit_price, resting.seq, entry_id)
+                )
+            else:
+                heapq.heappush(
+                    self.sell_limits, (order.limit_price, resting.seq, entry_id)
+                )
+        else:
+            if resting.is_buy:
+                heapq.heappush(
+                    self.buy_stops, (order.stop_price, resting.seq, entry_id)
+                )
+            else:
+                heapq.heappush(
+                    self.sell_stops, (-order.stop_price, resting.seq, entry_id)
+                )
+
+    def pop_crossed(
+        self, low: float, high: float, live: Dict[int, RestingOrder]
+    ) -> List[RestingOrder]:
+        """
+        Pops the live orders crossed by the [low, high] range of the bar,
+        dropping the stale entries met on the way.
+        """
+        crossed: List[RestingOrder] = []
+        for heap, is_crossed in ((self.buy_limits, lambda key: -key >= low),
+                                 (self.sell_limits, lambda key: key <= high),
+                                 (self.buy_stops, lambda key: key <= high),
+                                 (self.sell_stops, lambda key: -key >= low)):
+            while heap and (heap[0][2] not in live or is_crossed(heap[0][0])):
+                _, _, order_id = heapq.heappop(heap)
+                if order_id in live:
+                    crossed.append(live[order_id])
+        return crossed
+
+    def __len__(self) -> int:
+        return (
+            len(self.buy_limits)
+            + len(self.sell_limits)
+            + len(self.buy_stops)
+            + len(self.sell_stops)
+        )
+
+
+def _bar_path(bar: Dict[str, float], path: str) -> List[float]:
+    """
+    Returns the intrabar price path of the bar.
+    """
+    if path == "nearest":
+        path = (
+            "OHLC"
+            if abs(bar["high"] - bar["open"]) <= abs(bar["open"] - bar["low"])
+            else "OLHC"
+        )
+    if path == "OHLC":
+        return [bar["open"], bar["high"], bar["low"], bar["close"]]
+    if path == "OLHC":
+        return [bar["open"], bar["low"], bar["high"], bar["close"]]
+    raise ValueError("Unknown intrabar path: %s. Available: %s" % (path, OHLC_PATHS))
+
+
+def _price_at(points: List[float], t: float) -> float:
+    """
+    Price along the piecewise linear path at time t in [0, len(points) - 1].
+    """
+    i = min(int(t), len(points) - 2)
+    return points[i] + (t - i) * (points[i + 1] - points[i])
+
+
+def _first_touch(
+    points: List[float], level: float, falling: bool, t_start: float = 0.0
+) -> Optional[Tuple[float, float]]:
+    """
+    Finds the first time from t_start at which the price is at or beyond the
+    level (at or below it if falling, at or above otherwise).
+
+    Returns:
+    (time, price) - The price is the level itself, or the price at t_start if
+    it is already beyond the level (e.g. a gap at the open). None if never touched.
+    """
+    start_price = _price_at(points, t_start)
+    if (start_price <= level) if falling else (start_price >= level):
+        return t_start, start_price
+    for i in range(int(t_start), len(points) - 1):
+        a = _price_at(points, max(t_start, i))
+        b = points[i + 1]
+        if (b <= level < a) if falling else (a < level <= b):
+            return (
+                max(t_start, i) + (a - level) / (a - b) * (i + 1 - max(t_start, i)),
+                level,
+            )
+    return None
+
+
+class RestingOrderBook(object):
+    """
+    Book of all the resting orders across the universe.
+    """
+
+    def __init__(self, path: str = "nearest") -> None:
+        """
+        Parameters:
+        path - Intrabar path assumption: 'OHLC', 'OLHC' or 'nearest' (the
+               extreme closest to the open is visited first).
+        """
+        if path not in OHLC_PATHS:
+            raise ValueError(
+                "Unknown intrabar path: %s. Available: %s" % (path, OHLC_PATHS)
+            )
+        self.path: str = path
+        self.books: Dict[str, SymbolOrderBook] = {}
+        self.live: Dict[int, RestingOrder] = {}
+        self.day_orders: Set[int] = set()
+        self._seq = itertools.count()
+
+    def add(self, order: Any) -> None:
+        """
+        Adds a LMT, STP or STP_LMT OrderEvent to the book.
+        """
+        if order.order_type in ("LMT", "STP_LMT") and order.limit_price is None:
+            raise ValueError(
+                "%s order %s requires a limit_price"
+                % (order.order_type, order.order_id)
+            )
+        if order.order_type in ("STP", "STP_LMT") and order.stop_price is None:
+            raise ValueError(
+                "%s order %s requires a stop_price" % (order.order_type, order.order_id)
+            )
+        resting = RestingOrder(order, next(self._seq))
+        self.live[order.order_id] = resting
+        if order.time_in_force == "DAY":
+            self.day_orders.add(order.order_id)
+        self.books.setdefault(order.symbol, SymbolOrderBook()).push(resting)
+
+    def cancel(self, order_id: int) -> bool:
+        """
+        Cancels a resting order, returns whether it was still live.
+        The heap entries are dropped lazily when they reach the top.
+        """
+        self.day_orders.discard(order_id)
+        return self.live.pop(order_id, None) is not None
+
+    def active_symbols(self) -> List[str]:
+        """
+        Returns the symbols with resting orders, dropping the empty books.
+        """
+        for symbol in [symbol for symbol, book in self.books.items() if not len(book)]:
+            del self.books[symbol]
+        return list(self.books.keys())
+
+    def expire_day_orders(self, session: Any) -> List[Any]:
+        """
+        Starts a new bar: DAY orders are assigned the session (date) of the
+        first bar they see, and cancelled once a bar of another session
+        arrives. Returns the expired orders.
+        """
+        expired = []
+        for order_id in list(self.day_orders):
+            resting = self.live.get(order_id)
+            if resting is None:
+                self.day_orders.discard(order_id)
+            elif resting.session is None:
+                resting.session = session
+            elif resting.session != session:
+                expired.append(resting.order)
+                self.cancel(order_id)
+        return expired
+
+    def match(
+        self, symbol: str, bar: Dict[str, float]
+    ) -> List[Tuple[Any, float, float]]:
+        """
+        Matches the resting orders of a symbol against a bar.
+
+        Parameters:
+        symbol - The symbol of the bar.
+        bar - Dict with the open, high, low and close of the bar.
+        Returns:
+        A list of (order, fill price, intrabar time) sorted by intrabar time.
+        """
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+
+        points = _bar_path(bar, self.path)
+        fills: List[Tuple[Any, float, float]] = []
+        for resting in book.pop_crossed(bar["low"], bar["high"], self.live):
+            order = resting.order
+            t_start = 0.0
+            if not resting.triggered:
+                # Buy stops trigger on a rise to the stop price, sell stops on a fall
+                touch = _first_touch(
+                    points, order.stop_price, falling=not resting.is_buy
+                )
+                if touch is None:
+                    book.push(resting)
+                    continue
+                if order.order_type == "STP":
+                    fills.append((order, touch[1], touch[0]))
+                    continue
+                resting.triggered = True
+                t_start = touch[0]
+            # Buy limits fill on a fall to the limit price, sell limits on a rise
+            touch = _first_touch(
+                points, order.limit_price, falling=resting.is_buy, t_start=t_start
+            )
+            if touch is None:
+                book.push(resting)
+            else:
+                fills.append((order, touch[1], touch[0]))
+
+        for order, _, _ in fills:
+            self.cancel(order.order_id)
+        fills.sort(key=lambda fill: fill[2])
+        return fills
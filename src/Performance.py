@@ -16,27 +16,87 @@ def create_sharpe_ratio(returns: pd.Series, periods: int = 252) -> float:
     return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
 
 
-def create_drawdowns(equity_curve: pd.Series) -> Tuple[pd.Series, float, float]:
+def create_drawdown_arrays(
+    equity_curve: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculate the high water mark, the peak-to-trough drawdown and the
+    drawdown duration of one or many equity curves with NumPy
+    cumulative operations (no Python loop over the bars).
+
+    Parameters:
+    equity_curve - A 1-D array (time) or 2-D array (time x curves) of
+                   cumulative equity values. NaN values are skipped by the
+                   high water mark, the first bar is the starting point.
+    Returns:
+    high_water_mark, drawdown, duration - Arrays of the same shape as the input,
+    the duration counting the bars since the last new high (reset on zero drawdown).
+    """
+    values = np.asarray(equity_curve, dtype=np.float64)
+    n = values.shape[0]
+
+    # The High Water Mark starts at zero and ignores NaN values
+    high_water_mark = np.zeros_like(values)
+    if n > 1:
+        high_water_mark[1:] = np.fmax(np.fmax.accumulate(values[1:], axis=0), 0.0)
+    drawdown = high_water_mark - values
+    if n > 0:
+        drawdown[0] = np.nan
+
+    # Duration is the run length of non-zero drawdowns: the distance to the
+    # last bar in which the drawdown was reset to zero
+    steps = np.arange(n).reshape((n,) + (1,) * (values.ndim - 1))
+    reset = drawdown == 0
+    if n > 0:
+        reset[0] = True
+    last_reset = np.maximum.accumulate(np.where(reset, steps, 0), axis=0)
+    duration = (steps - last_reset).astype(np.float64)
+    return high_water_mark, drawdown, duration
+
+
+def create_drawdowns(
+    equity_curve: Union[pd.Series, pd.DataFrame, np.ndarray],
+) -> Tuple[
+    Union[pd.Series, pd.DataFrame, np.ndarray],
+    Union[float, pd.Series, np.ndarray],
+    Union[float, pd.Series, np.ndarray],
+]:
     """
     Calculate the largest peak-to-trough drawdown of the equity curve
-    as well as the duration of the drawdown. Requires that the
-    equity_returns is a pandas Series.
+    as well as the duration of the drawdown. A DataFrame or a 2-D array
+    (time x curves) computes the drawdowns of many curves at once.
 
     Parameters:
-    equity_curve - A pandas Series representing period percentage returns.
+    equity_curve - A pandas Series (or DataFrame)
+                   representing the cumulative equity curve.
     Returns:
-    drawdown, duration - Highest peak-to-trough drawdown and duration.
+    drawdown, max_drawdown, max_duration - The drawdown series, highest peak-to-trough
+    drawdown and longest drawdown duration (per column in the batched mode).
     """
+    _, drawdown, duration = create_drawdown_arrays(equity_curve)
+    if drawdown.shape[0] < 2:
+        max_drawdown = np.full(drawdown.shape[1:], np.nan)
+    else:
+        max_drawdown = np.nanmax(drawdown[1:], axis=0)
+    max_duration = (
+        duration.max(axis=0)
+        if duration.shape[0]
+        else np.full(duration.shape[1:], np.nan)
+    )
 
-    # Calculate the cumulative returns curve and set up the High Water Mark
-    high_water_mark: list = [0]
-    # Create the drawdown and duration series
-    idx = equity_curve.index
-    drawdown: pd.Series = pd.Series(index=idx)
-    duration: pd.Series = pd.Series(index=idx)
-    # Loop over the index range
-    for i in range(1, len(idx)):
-        high_water_mark.append(max(high_water_mark[i - 1], equity_curve.iloc[i]))
-        drawdown.iloc[i] = high_water_mark[i] - equity_curve.iloc[i]
-        duration.iloc[i] = 0 if drawdown.iloc[i] == 0 else duration.iloc[i - 1] + 1
-    return drawdown, drawdown.max(), duration.max()
+    if isinstance(equity_curve, pd.DataFrame):
+        columns = equity_curve.columns
+        return (
+            pd.DataFrame(drawdown, index=equity_curve.index, columns=columns),
+            pd.Series(max_drawdown, index=columns),
+            pd.Series(max_duration, index=columns),
+        )
+    if isinstance(equity_curve, pd.Series):
+        return (
+            pd.Series(drawdown, index=equity_curve.index),
+            float(max_drawdown),
+            float(max_duration),
+        )
+    if drawdown.ndim == 1:
+        return drawdown, float(max_drawdown), float(max_duration)
+    return drawdown, max_drawdown, max_duration
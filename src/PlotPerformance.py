@@ -1,34 +1,316 @@
-import matplotlib.pyplot as plt
+"""
+Tear sheets of the equity curves saved by a ResultWriter (csv, csv.gz, npz
+or parquet): equity curve, period returns and drawdowns.
+
+Long (intraday) curves are downsampled before plotting, keeping their
+visual shape: min/max bucketing keeps the first, lowest, highest and last
+point of each bucket of bars (every spike survives), LTTB (largest triangle
+three buckets) keeps the point of each bucket forming the largest triangle
+with its neighbours. Files are rendered with the Agg or SVG canvas, without
+a display, and many runs are rendered in parallel processes.
+
+The runs of run_backtest.py are written to
+<output_dir>/<strategy>_<symbols>_<settings hash>.<format> (the path is
+printed as "Results:"); a Backtest without a ResultWriter, such as Main.py,
+still writes equity.csv in the working directory.
+
+Usage:
+    python PlotPerformance.py [path, defaults to equity.csv]
+    python PlotPerformance.py MAC_Strat_SPY_1a2b3c4d.csv --output tear_sheet.png
+    python PlotPerformance.py results/*.npz --output-dir plots --format svg --jobs 8
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
 import pandas as pd
-from typing import Tuple
-from matplotlib.figure import Figure
-from matplotlib.axes import Axes
 
-# Function to plot performance from equity curve saved in csv format
-if __name__ == "__main__":
-    data: pd.DataFrame = pd.io.parsers.read_csv("equity.csv", header=0, parse_dates=True, index_col=0)
-    # Plot three charts: Equity curve,
-    # period returns, drawdowns
-    fig: Figure
-    ax1: Axes
-    ax2: Axes
-    ax3: Axes
-    fig, (ax1, ax2, ax3) = plt.subplots(nrows=3, sharex=True)
+try:
+    from .Performance import create_drawdown_arrays
+    from .ResultWriter import read_equity_curve
+except ImportError:
+    from Performance import create_drawdown_arrays
+    from ResultWriter import read_equity_curve
+
+DOWNSAMPLING_METHODS: List[str] = ["minmax", "lttb", "none"]
+
+
+def minmax_downsample(values: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Returns the sorted indices of the first, minimum, maximum and last
+    value of n_buckets buckets of consecutive values (at most 4 per bucket).
+    NaN values are only kept if a whole bucket is NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= 4 * n_buckets:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    n_buckets = -(-n // size)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, size)
+    missing = np.isnan(buckets)
+    starts = np.arange(n_buckets) * size
+    lowest = starts + np.argmin(np.where(missing, np.inf, buckets), axis=1)
+    highest = starts + np.argmax(np.where(missing, -np.inf, buckets), axis=1)
+    last = np.minimum(starts + size - 1, n - 1)
+    return np.unique(np.concatenate((starts, lowest, highest, last)))
+
+
+def lttb_downsample(
+    values: np.ndarray, n_out: int, x: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Returns the sorted indices of n_out points chosen by Largest Triangle
+    Three Buckets: the first and last points, and in each of the n_out - 2
+    buckets in between the point forming the largest triangle with the point
+    kept in the previous bucket and the mean of the next bucket.
+
+    Parameters:
+    values - The y values, NaN are treated as 0.
+    n_out - Number of points kept (at least 3).
+    x - The x values (e.g. the int64 datetimes), the positions by default.
+    """
+    y = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(np.arange(n) if x is None else x, dtype=np.float64)
+    # Bucket b (1..n_out-2) covers [edges[b-1],
+    # edges[b]) of the points between the first and last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Means of the buckets, the last point standing for the bucket after the last one
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        # Twice the area of the triangle (previous, candidate, mean of the next bucket)
+        area = np.abs((x[previous] - mean_x[b + 1]) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (mean_y[b + 1] - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[b + 1] = previous
+    return selected
+
+
+def downsample(
+    series: pd.Series, max_points: int = 2000, method: str = "minmax"
+) -> pd.Series:
+    """
+    Returns the points of series kept for plotting, at most about max_points.
+
+    Parameters:
+    series - A column of the equity curve.
+    max_points - Number of points kept, about the pixel width of the plot times 2 to 4.
+    method - One of DOWNSAMPLING_METHODS.
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(
+            "Unknown downsampling method: %s. Available: %s"
+            % (method, DOWNSAMPLING_METHODS)
+        )
+    if method == "none" or len(series) <= max_points:
+        return series
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if method == "minmax":
+        selected = minmax_downsample(values, max(1, max_points // 4))
+    else:
+        x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else None
+        selected = lttb_downsample(values, max_points, x)
+    return series.iloc[selected]
+
+
+def plot_tear_sheet(
+    data: pd.DataFrame,
+    path: Optional[str] = None,
+    max_points: int = 2000,
+    method: str = "minmax",
+    title: Optional[str] = None,
+    dpi: int = 100,
+) -> Optional[str]:
+    """
+    Plots three charts: equity curve, period returns and drawdowns.
+
+    Parameters:
+    data - The equity curve DataFrame (equity_curve and returns columns,
+           drawdown is computed if missing).
+    path - File written (.png, .svg, .pdf), shown in a window if None.
+    max_points - Number of points plotted per chart.
+    method - Downsampling method, one of DOWNSAMPLING_METHODS.
+    title - Title of the figure.
+    dpi - Resolution of raster files.
+    Returns:
+    The path written to.
+    """
+    # matplotlib is slow to import, only the plots need it
+    from matplotlib.figure import Figure
+
+    if "drawdown" not in data.columns:
+        _, drawdown, _ = create_drawdown_arrays(
+            data["equity_curve"].to_numpy(dtype=np.float64, na_value=np.nan)
+        )
+        data = data.assign(drawdown=drawdown)
+
+    if path is None:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(10, 8))
+    else:
+        # A bare Figure has no window and no GUI backend,
+        # it renders with the canvas of the file format
+        fig = Figure(figsize=(10, 8))
+    ax1, ax2, ax3 = fig.subplots(nrows=3, sharex=True)
     # Set the outer colour to white
     fig.patch.set_facecolor("white")
-    # Plot the equity curve
-    ax1.set_ylabel("Portfolio value, %")
-    data["equity_curve"].plot(ax=ax1, color="blue", lw=2.)
-    ax1.grid(True)
-    # Plot the returns
-    ax2.set_ylabel("Period returns, %")
-    data["returns"].plot(ax=ax2, color="black", lw=2.)
-    ax2.grid(True)
-    # Plot the returns
-    ax3.set_ylabel("Drawdowns, %")
-    data["drawdown"].plot(ax=ax3, color="red", lw=2.)
-    ax3.grid(True)
-    # Plot the figure
-
-    plt.subplots_adjust(hspace=0.3)
-    plt.show()
\ No newline at end of file
+    if title:
+        fig.suptitle(title)
+    for ax, column, label, color in (
+        (ax1, "equity_curve", "Portfolio value, %", "blue"),
+        (ax2, "returns", "Period returns, %", "black"),
+        (ax3, "drawdown", "Drawdowns, %", "red"),
+    ):
+        series = downsample(data[column], max_points, method)
+        ax.plot(
+            series.index,
+            series.to_numpy(dtype=np.float64, na_value=np.nan),
+            color=color,
+            lw=1.0,
+        )
+        ax.set_ylabel(label)
+        ax.grid(True)
+    fig.subplots_adjust(hspace=0.3)
+
+    if path is None:
+        plt.show()
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fig.savefig(path, dpi=dpi, facecolor="white")
+    return path
+
+
+def render_tear_sheet(
+    path: str, output_path: str, max_points: int = 2000, method: str = "minmax"
+) -> str:
+    """
+    Reads a results file and writes its tear sheet to output_path.
+    """
+    return plot_tear_sheet(read_equity_curve(path), output_path, max_points, method,
+                           title=os.path.basename(path))
+
+
+def output_path_of(path: str, output_dir: str, file_format: str = "png") -> str:
+    """
+    Returns output_dir/<name of the results file>.<format>.
+    """
+    name = os.path.basename(path)
+    for extension in (".csv.gz", ".csv", ".npz", ".parquet"):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+            break
+    return os.path.join(output_dir, "%s.%s" % (name, file_format))
+
+
+def render_tear_sheets(
+    paths: Sequence[str],
+    output_dir: str,
+    file_format: str = "png",
+    jobs: int = 1,
+    max_points: int = 2000,
+    method: str = "minmax",
+) -> List[str]:
+    """
+    Renders the tear sheets of many results files in jobs processes.
+    Returns:
+    The paths written, in the order of paths.
+    """
+    outputs = [output_path_of(path, output_dir, file_format) for path in paths]
+    if jobs <= 1 or len(paths) <= 1:
+        return [
+            render_tear_sheet(path, output, max_points, method)
+            for path, output in zip(paths, outputs)
+        ]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        futures = [executor.submit(render_tear_sheet, path, output, max_points, method)
+                   for path, output in zip(paths, outputs)]
+        return [future.result() for future in futures]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Plot the tear sheets of equity curves"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["equity.csv"],
+        help="Results files written by a ResultWriter, e.g. the Results: "
+        "path printed by run_backtest.py (default equity.csv, "
+        "written by Main.py)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="File written for a single results file (.png, .svg, .pdf)",
+    )
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help="Directory of the tear sheets, one per results file")
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="png",
+        choices=["png", "svg", "pdf"],
+        help="File format of the tear sheets in --output-dir",
+    )
+    parser.add_argument("--max-points", type=int, default=2000,
+                        help="Number of points plotted per chart")
+    parser.add_argument(
+        "--method",
+        type=str,
+        default="minmax",
+        choices=DOWNSAMPLING_METHODS,
+        help="Downsampling method of the long curves",
+    )
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="Number of tear sheets rendered in parallel")
+    args = parser.parse_args(argv)
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        parser.error(
+            "no results file %s, run_backtest.py names its results "
+            "<strategy>_<symbols>_<settings hash>.<format>" % ", ".join(missing)
+        )
+
+    if args.output_dir is not None:
+        for output in render_tear_sheets(
+            args.paths,
+            args.output_dir,
+            args.format,
+            args.jobs,
+            args.max_points,
+            args.method,
+        ):
+            print(output)
+    elif len(args.paths) == 1:
+        # Shown in a window without --output, as before
+        plot_tear_sheet(
+            read_equity_curve(args.paths[0]), args.output, args.max_points, args.method
+        )
+    else:
+        parser.error("--output-dir is required with several results files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 from __future__ import print_function
 
 import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 try:
     import Queue as queue
@@ -10,8 +10,15 @@ except ImportError:
 
 import numpy as np
 import pandas as pd
-from .Events import FillEvent, OrderEvent, SignalEvent
+from .Events import (
+    FillEvent,
+    OrderEvent,
+    SignalEvent,
+    TargetWeightEvent,
+    OrderBatchEvent,
+)
 from .Performance import create_sharpe_ratio, create_drawdowns
+from .ResultWriter import ResultWriter
 from math import floor
 
 
@@ -24,18 +31,48 @@ class Portfolio(object):
     """
 
     def __init__(self, bars: Any, events: Any, start_date: datetime, 
-                 initial_capital: float = 100000.0) -> None:
+                 initial_capital: float = 100000.0,
+                 result_writer: Optional[ResultWriter] = None,
+                 lot_size: int = 1, min_trade_value: float = 0.0) -> None:
+        """
+        Parameters:
+        bars - The DataHandler object that provides bar information
+        events - The Event Queue object.
+        start_date - The start datetime of the portfolio.
+        initial_capital - The starting capital for the portfolio.
+        result_writer - ResultWriter storing the equity curve, defaults
+                        to equity.csv in the working directory.
+        lot_size - Target weight orders are rounded down
+                   to multiples of lot_size shares.
+        min_trade_value - Target weight orders with a smaller
+                          absolute value are skipped.
+        """
 
         self.bars = bars
         self.events = events
         self.symbol_list = self.bars.symbol_list
         self.start_date = start_date
         self.initial_capital = initial_capital
+        self.result_writer: Optional[ResultWriter] = result_writer
+        self.results_path: Optional[str] = None
+        self.lot_size: int = lot_size
+        self.min_trade_value: float = min_trade_value
 
         self.all_positions: List[Dict[str, Any]] = self.define_all_positions()
         self.current_positions: Dict[str, int] = {symbol: 0 for symbol in self.symbol_list}
+        # Same positions as an array aligned with
+        # symbol_list, for the vectorized risk computations
+        self.symbol_index: Dict[str, int] = {
+            symbol: i for i, symbol in enumerate(self.symbol_list)
+        }
+        self.position_vector: np.ndarray = np.zeros(len(self.symbol_list))
+        # Exposure totals marked at the latest bar
+        self.gross_exposure: float = 0.0
+        self.net_exposure: float = 0.0
         self.all_holdings: List[Dict[str, Any]] = self.define_all_holdings()
         self.current_holdings: Dict[str, float] = self.define_current_holdings()
+        # Every fill of the backtest, for the run archive
+        self.all_fills: List[Dict[str, Any]] = []
 
     def define_all_positions(self) -> List[Dict[str, Any]]:
         """
@@ -101,12 +138,16 @@ class Portfolio(object):
 
         # Update market value and pnl for all symbols
         # ==============
+        gross_exposure = 0.0
         for symbol in self.symbol_list:
             # Approximation to the real value --> market_value = adj close price * position_size
             # TODO --> This needs to be better represented in real life, depending on the frequency of the strategy
             market_value = self.current_positions[symbol] * self.bars.get_latest_bar_value(symbol, "adj_close")
             holdings[symbol] = market_value
             holdings["total"] += market_value
+            gross_exposure += abs(market_value)
+        self.gross_exposure = gross_exposure
+        self.net_exposure = holdings["total"] - holdings["cash"]
 
         # Append the current holdings
         self.all_holdings.append(holdings)
@@ -154,6 +195,85 @@ class Portfolio(object):
             order = OrderEvent(symbol, order_type, abs(current_quantity), "BUY")
         return order
 
+    """
+    Check if a TargetWeightEvent has been generated from the strategy to
+    rebalance the whole universe, and place all the resulting orders in the
+    queue as a single batch
+    """
+
+    def update_target_weights(self, event: Any) -> None:
+        """
+        Acts on a TargetWeightEvent to generate the batch of
+        rebalancing orders.
+        """
+        if isinstance(event, TargetWeightEvent):
+            orders = self.generate_target_weight_orders(event.weights)
+            if orders:
+                self.events.put(OrderBatchEvent(orders))
+
+    def generate_target_weight_orders(self, weights: Any) -> List[OrderEvent]:
+        """
+        Computes the orders moving the current positions to the target
+        weights of the total equity, valued at the latest adj_close.
+        Quantities are truncated to multiples of lot_size and orders
+        worth less than min_trade_value are dropped. Sells come first
+        in the batch to free cash for the buys.
+
+        Parameters:
+        weights - dict of symbol weights (missing symbols are closed), or an
+                  array aligned with symbol_list.
+        """
+        if isinstance(weights, dict):
+            target_weights = np.array(
+                [weights.get(symbol, 0.0) for symbol in self.symbol_list],
+                dtype=np.float64,
+            )
+        else:
+            target_weights = np.asarray(weights, dtype=np.float64)
+            if target_weights.shape != (len(self.symbol_list),):
+                raise ValueError("Expected %d weights, got shape %s"
+                                 % (len(self.symbol_list), target_weights.shape))
+
+        prices = np.array(
+            [
+                self.bars.get_latest_bar_value(symbol, "adj_close")
+                for symbol in self.symbol_list
+            ],
+            dtype=np.float64,
+        )
+        positions = np.array(
+            [self.current_positions[symbol] for symbol in self.symbol_list],
+            dtype=np.float64,
+        )
+        tradable = np.isfinite(prices) & (prices > 0) & np.isfinite(target_weights)
+        equity = self.current_holdings["cash"] + np.dot(
+            positions[tradable], prices[tradable]
+        )
+
+        # Target quantities and deltas for the whole universe at once
+        with np.errstate(divide="ignore", invalid="ignore"):
+            target_quantity = np.where(
+                tradable, target_weights * equity / prices, positions
+            )
+        delta = np.fix((target_quantity - positions) / self.lot_size) * self.lot_size
+        trade = (
+            tradable & (delta != 0) & (np.abs(delta) * prices >= self.min_trade_value)
+        )
+
+        selected = np.flatnonzero(trade)
+        # Stable sort on the sign puts sells (negative deltas) before buys
+        selected = selected[np.argsort(delta[selected] > 0, kind="stable")]
+        order_type = "MKT"
+        return [
+            OrderEvent(
+                self.symbol_list[i],
+                order_type,
+                int(abs(delta[i])),
+                "BUY" if delta[i] > 0 else "SELL",
+            )
+            for i in selected
+        ]
+
     """
     The functions below update positions, and holdings of the portfolio after a Fill event
     """
@@ -165,6 +285,21 @@ class Portfolio(object):
         if isinstance(event, FillEvent):
             self.update_positions_after_fill(event)
             self.update_holdings_after_fill(event)
+            # At the time of the bar and the price of
+            # the holdings (market price if unknown)
+            fill_cost = event.fill_cost
+            if fill_cost is None or np.isnan(fill_cost):
+                fill_cost = self.bars.get_latest_bar_value(event.symbol, "adj_close")
+            self.all_fills.append(
+                {
+                    "datetime": self.bars.get_latest_bar_datetime(event.symbol),
+                    "symbol": event.symbol,
+                    "direction": event.direction,
+                    "quantity": event.quantity,
+                    "fill_cost": fill_cost,
+                    "commission": event.commission,
+                }
+            )
 
     def update_positions_after_fill(self, fill):
         """
@@ -182,6 +317,8 @@ class Portfolio(object):
             fill_dir = -1
         # Update positions list with new quantities
         self.current_positions[fill.symbol] += fill_dir * fill.quantity
+        i = self.symbol_index[fill.symbol]
+        self.position_vector[i] += fill_dir * fill.quantity
 
     def update_holdings_after_fill(self, fill):
         """
@@ -198,7 +335,10 @@ class Portfolio(object):
         if fill.direction == "SELL":
             fill_dir = -1
         # Update holdings list with new quantities
-        fill_cost = self.bars.get_latest_bar_value(fill.symbol, "adj_close")  # unknown so set to the market price
+        fill_cost = fill.fill_cost
+        if fill_cost is None or np.isnan(fill_cost):
+            # unknown so set to the market price
+            fill_cost = self.bars.get_latest_bar_value(fill.symbol, "adj_close")
         cost = fill_dir * fill_cost * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings["commission"] += fill.commission
@@ -231,5 +371,11 @@ class Portfolio(object):
                  ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
                  ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
                  ("Max Drawdown Duration", "%d" % max_dd_duration)]
-        self.equity_curve.to_csv("equity.csv")
+        if self.result_writer is None:
+            self.results_path = "equity.csv"
+            self.equity_curve.to_csv(self.results_path)
+        else:
+            # The writer may be asynchronous, the file
+            # is then completed in the background
+            self.results_path = self.result_writer.write(self.equity_curve)
         return stats
@@ -0,0 +1,279 @@
+"""
+Position sizing: turns the signal strengths of the strategies into target
+weights of the equity, trading the expected returns off against the risk
+model of the RiskManagement.
+
+Both sizers solve the same mean-variance problem
+
+    max_w  mu' w - risk_aversion / 2 * w' C w
+    s.t.   sum |w| <= max_leverage,  |w_i| <= max_weight  (w >= 0 if long only)
+
+with mu = alpha_scale * strength, by accelerated projected gradient (FISTA
+with adaptive restart). Fractional Kelly is the special case
+risk_aversion = 1 / fraction. C is only used through covariance_matvec, so
+a StatisticalFactorModel makes an iteration O(N F).
+
+Sizing runs every bar: the solver starts from the previous solution, and
+when the previous solution still satisfies the optimality condition for the
+new inputs it is kept without solving, so the rebalances of a slowly moving
+book cost a gradient step.
+"""
+
+from __future__ import print_function
+
+import time
+from abc import ABCMeta
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+POSITION_SIZERS: List[str] = ["kelly", "mean_variance"]
+
+
+def _shrink(size: np.ndarray, cap: float, max_leverage: float,
+            shrinkage: Optional[float] = None) -> Tuple[np.ndarray, float]:
+    """
+    Returns clip(size - tau, 0, cap) and tau >= 0, the shrinkage making it sum
+    to max_leverage. The sum is piecewise linear in tau, with slope changes
+    at size - cap and size: a guess of tau on the right piece (the previous
+    projection of an iterative solver) gives the exact tau in one step,
+    otherwise the pieces are sorted.
+    """
+    if shrinkage is not None:
+        capped = size >= shrinkage + cap
+        active = (size > shrinkage) & ~capped
+        n_active = np.count_nonzero(active)
+        if n_active:
+            tau = (
+                cap * np.count_nonzero(capped) + size[active].sum() - max_leverage
+            ) / n_active
+            projected = np.minimum(np.maximum(size - tau, 0.0), cap)
+            if tau >= 0 and abs(projected.sum() - max_leverage) <= 1e-9 * max_leverage:
+                return projected, tau
+
+    n = len(size)
+    breakpoints = np.concatenate((size - cap, size))
+    slope_changes = np.concatenate((np.full(n, -1.0), np.ones(n)))
+    order = np.argsort(breakpoints)
+    breakpoints = breakpoints[order]
+    slopes = np.cumsum(slope_changes[order])
+    totals = n * cap + np.concatenate(
+        ([0.0], np.cumsum(slopes[:-1] * np.diff(breakpoints)))
+    )
+    k = int(np.searchsorted(-totals, -max_leverage))
+    tau = breakpoints[k - 1] + (totals[k - 1] - max_leverage) / -slopes[k - 1]
+    return np.minimum(np.maximum(size - tau, 0.0), cap), tau
+
+
+def project_weights(
+    weights: np.ndarray,
+    max_weight: float,
+    max_leverage: float,
+    long_only: bool = False,
+    shrinkage: Optional[float] = None,
+) -> Tuple[np.ndarray, float]:
+    """
+    Euclidean projection of weights on {sum |w| <= max_leverage, |w_i| <= max_weight},
+    with w >= 0 if long_only. Exact, in O(N) when the leverage does not bind or
+    the shrinkage guess is right, O(N log N) otherwise.
+
+    Returns:
+    The projected weights and the shrinkage of
+    their sizes (0 if the leverage does not bind).
+    """
+    size = np.maximum(weights, 0.0) if long_only else np.abs(weights)
+    cap = min(max_weight, max_leverage)
+    projected = np.minimum(size, cap)
+    tau = 0.0
+    if projected.sum() > max_leverage:
+        projected, tau = _shrink(size, cap, max_leverage, shrinkage)
+    return np.copysign(projected, weights), tau
+
+
+class PositionSizer(object):
+    """
+    PositionSizer is an abstract base class providing an interface for the
+    sizing methods. size() receives one signed signal strength per symbol
+    and returns the target weights.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(
+        self,
+        risk_aversion: float = 1.0,
+        alpha_scale: float = 0.0005,
+        max_weight: float = 0.1,
+        max_leverage: float = 1.0,
+        long_only: bool = False,
+        tolerance: float = 1e-4,
+        max_iterations: int = 500,
+    ) -> None:
+        """
+        Parameters:
+        risk_aversion - Weight of the variance against the expected return.
+        alpha_scale - Expected return per bar of a signal of strength 1.
+        max_weight - Maximum absolute weight of a symbol.
+        max_leverage - Maximum sum of the absolute weights.
+        long_only - Whether short weights are forbidden.
+        tolerance - Largest weight change of a step for the solution to be
+                    considered converged, and kept unchanged on the next bar
+                    (1e-4: changes under 1 bp of the equity are not traded).
+        max_iterations - Maximum number of gradient steps per solve.
+        """
+        if risk_aversion <= 0:
+            raise ValueError("risk_aversion must be positive, got %s" % risk_aversion)
+        self.risk_aversion: float = risk_aversion
+        self.alpha_scale: float = alpha_scale
+        self.max_weight: float = max_weight
+        self.max_leverage: float = max_leverage
+        self.long_only: bool = long_only
+        self.tolerance: float = tolerance
+        self.max_iterations: int = max_iterations
+
+        self.weights: Optional[np.ndarray] = None
+        self.eigenvector: Optional[np.ndarray] = None
+        self.step: Optional[float] = None
+        self.shrinkage: Optional[float] = None
+        # Statistics: sizes computed, sizes kept
+        # without solving, gradient steps, seconds
+        self.solves: int = 0
+        self.skips: int = 0
+        self.iterations: int = 0
+        self.solve_time: float = 0.0
+
+    def project(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Projects weights on the constraints, starting
+        from the shrinkage of the previous projection.
+        """
+        projected, tau = project_weights(
+            weights, self.max_weight, self.max_leverage, self.long_only, self.shrinkage
+        )
+        if tau > 0:
+            self.shrinkage = tau
+        return projected
+
+    def _largest_eigenvalue(self, risk_model: Any, n: int) -> float:
+        """
+        Estimates the largest eigenvalue of C by power iteration, started
+        from the eigenvector of the previous bar.
+        """
+        if self.eigenvector is None or len(self.eigenvector) != n:
+            self.eigenvector = np.full(n, 1.0 / np.sqrt(n))
+        value = 0.0
+        for _ in range(3):
+            image = risk_model.covariance_matvec(self.eigenvector)
+            value = np.linalg.norm(image)
+            if value <= 0:
+                return 0.0
+            self.eigenvector = image / value
+        return value
+
+    def size(self, signals: np.ndarray, risk_model: Any) -> Optional[np.ndarray]:
+        """
+        Computes the target weights.
+
+        Parameters:
+        signals - Signed signal strength per symbol (positive long), 0 for no view.
+        risk_model - EWMACovariance or StatisticalFactorModel of the symbols.
+        Returns:
+        The target weights, or None if the previous weights are still optimal.
+        """
+        started = time.perf_counter()
+        n = len(signals)
+        mu = self.alpha_scale * np.where(np.isfinite(signals), signals, 0.0)
+
+        previous = self.weights
+        if previous is None or len(previous) != n:
+            previous = np.zeros(n)
+        else:
+            # Still a fixed point of the projected gradient step (with the step of the
+            # previous bar, the risk model moves slowly): still optimal
+            gradient = self.risk_aversion * risk_model.covariance_matvec(previous) - mu
+            if (
+                np.max(np.abs(self.project(previous - self.step * gradient) - previous))
+                <= self.tolerance
+            ):
+                self.skips += 1
+                self.solve_time += time.perf_counter() - started
+                return None
+
+        # Safety margin on the power iteration
+        # estimate, which is never above the eigenvalue
+        lipschitz = 1.2 * self.risk_aversion * self._largest_eigenvalue(risk_model, n)
+        self.step = 1.0 / lipschitz if lipschitz > 0 else 1.0
+        weights = self._solve(mu, risk_model, self.step, previous)
+        self.weights = weights
+        self.solves += 1
+        self.solve_time += time.perf_counter() - started
+        return weights.copy()
+
+    def _solve(
+        self, mu: np.ndarray, risk_model: Any, step: float, start: np.ndarray
+    ) -> np.ndarray:
+        """
+        FISTA from start, restarting the momentum
+        when it stops decreasing the objective.
+        """
+        weights = self.project(start)
+        momentum_point = weights
+        t = 1.0
+        for _ in range(self.max_iterations):
+            self.iterations += 1
+            gradient = (
+                self.risk_aversion * risk_model.covariance_matvec(momentum_point) - mu
+            )
+            new_weights = self.project(momentum_point - step * gradient)
+            if np.max(np.abs(new_weights - momentum_point)) <= self.tolerance:
+                return new_weights
+            t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+            if np.dot(momentum_point - new_weights, new_weights - weights) > 0:
+                t_next = 1.0
+                momentum_point = new_weights
+            else:
+                delta = new_weights - weights
+                momentum_point = new_weights + ((t - 1.0) / t_next) * delta
+            weights = new_weights
+            t = t_next
+        return weights
+
+
+class MeanVarianceSizer(PositionSizer):
+    """
+    Mean-variance (Markowitz) sizing with leverage and box constraints.
+    """
+
+    pass
+
+
+class KellySizer(PositionSizer):
+    """
+    Fractional Kelly sizing: the growth-optimal weights C^-1 mu scaled by
+    fraction, under the leverage and box constraints.
+    """
+
+    def __init__(self, fraction: float = 0.5, **params: Any) -> None:
+        """
+        Parameters:
+        fraction - Fraction of the full Kelly weights (0.5 = half Kelly).
+        params - Constraints of the PositionSizer (alpha_scale,
+                 max_weight, max_leverage, long_only, ...).
+        """
+        if fraction <= 0:
+            raise ValueError("fraction must be positive, got %s" % fraction)
+        super(KellySizer, self).__init__(risk_aversion=1.0 / fraction, **params)
+        self.fraction: float = fraction
+
+
+def create_position_sizer(method: str, **params: Any) -> PositionSizer:
+    """
+    Creates a sizer of POSITION_SIZERS: 'kelly' (fractional Kelly) or
+    'mean_variance'.
+    """
+    sizers = {"kelly": KellySizer, "mean_variance": MeanVarianceSizer}
+    if method not in sizers:
+        raise ValueError(
+            "Unknown position sizer: %s. Available: %s" % (method, POSITION_SIZERS)
+        )
+    return sizers[method](**params)
@@ -0,0 +1,123 @@
+"""
+Lazy registries of the strategies and data handlers.
+
+Each entry records the module defining the class and the optional packages
+it depends on (sklearn, yfinance, ...). Nothing is imported until the class
+is requested, so a run only pays the import time of the components it uses,
+and a missing dependency is reported for the component that needs it.
+"""
+
+from __future__ import print_function
+
+import importlib
+import importlib.util
+from typing import Any, Dict, List, Tuple
+
+# Distribution names of the packages whose import name differs
+PIP_NAMES: Dict[str, str] = {"sklearn": "scikit-learn"}
+
+
+class Registry(object):
+    """
+    Maps names to classes imported on first use.
+    """
+
+    def __init__(self, kind: str) -> None:
+        """
+        Parameters:
+        kind - What is registered ("strategy", "data handler"), for the error messages.
+        """
+        self.kind: str = kind
+        self.entries: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}
+        self.loaded: Dict[str, Any] = {}
+
+    def register(
+        self, name: str, module: str, attribute: str, requires: Tuple[str, ...] = ()
+    ) -> None:
+        """
+        Registers a class without importing it.
+
+        Parameters:
+        name - Name used to select the class (e.g. on the command line).
+        module - Module defining the class, relative to the
+                 src package (e.g. "Strategies.MAC_Strat").
+        attribute - Name of the class in the module.
+        requires - Optional packages imported by the module.
+        """
+        self.entries[name] = (module, attribute, tuple(requires))
+        self.loaded.pop(name, None)
+
+    def names(self) -> List[str]:
+        """
+        Returns the registered names, in registration order.
+        """
+        return list(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def missing_requirements(self, name: str) -> List[str]:
+        """
+        Returns the required packages of an entry that
+        are not installed, without importing them.
+        """
+        return [
+            package
+            for package in self.entries[name][2]
+            if importlib.util.find_spec(package) is None
+        ]
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the class registered under name, importing its module on first use.
+        """
+        if name in self.loaded:
+            return self.loaded[name]
+        if name not in self.entries:
+            raise ValueError(
+                "Unknown %s: %s. Available: %s" % (self.kind, name, self.names())
+            )
+        module_name, attribute, _ = self.entries[name]
+        missing = self.missing_requirements(name)
+        if missing:
+            raise ImportError(
+                "The %s %s requires %s, install with: pip install %s"
+                % (
+                    self.kind,
+                    name,
+                    ", ".join(missing),
+                    " ".join(PIP_NAMES.get(package, package) for package in missing),
+                )
+            )
+        self.loaded[name] = getattr(_import(module_name), attribute)
+        return self.loaded[name]
+
+
+def _import(module_name: str) -> Any:
+    """
+    Imports a module of the src package, also when src itself is on sys.path.
+    """
+    if __package__:
+        return importlib.import_module("." + module_name, __package__)
+    return importlib.import_module(module_name)
+
+
+STRATEGIES: Registry = Registry("strategy")
+STRATEGIES.register(
+    "ETF_Forecast",
+    "Strategies.ETF_Forecast",
+    "ETFDailyForecastStrategy",
+    requires=("sklearn",),
+)
+STRATEGIES.register("MAC_Strat", "Strategies.MAC_Strat", "MovingAverageCrossOverStrat")
+STRATEGIES.register("Buy_And_Hold", "Strategies.Buy_And_Hold_Strat", "BuyAndHoldStrat")
+STRATEGIES.register(
+    "Momentum", "Strategies.Momentum_Strat", "CrossSectionalMomentumStrat"
+)
+STRATEGIES.register("OLS_MR", "Strategies.OLS_MR_Strategy", "OLSMRStrategy")
+
+DATA_HANDLERS: Registry = Registry("data handler")
+DATA_HANDLERS.register("csv", "DataHandler", "HistoricCSVDataHandler")
+DATA_HANDLERS.register(
+    "yahoo", "DataHandler", "YahooDataHandler", requires=("yfinance",)
+)
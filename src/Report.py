@@ -0,0 +1,609 @@
+"""
+Self-contained static HTML reports: one page per run (summary statistics,
+equity and drawdown charts, monthly returns heatmap, trades table) and
+comparison pages of the runs of a RunArchive. The charts are inline SVG and
+the style is inline CSS, the file opens in any browser without the data.
+
+Reports are written section by section to the file. The equity curve is
+consumed in chunks by a CurveSummary, which keeps running statistics, one
+equity value per month and a downsampled curve, so the memory used does not
+grow with the length of the run (CSV results are read in chunks).
+
+Usage:
+    python -m src.Report run results/MAC_Strat_SPY.npz -o report.html
+    python -m src.Report archive runs/ --run-id 3e784465726cd62b4401 -o report.html
+    python -m src.Report compare runs/ --metric sharpe --top 20 -o sweep.html
+"""
+
+from __future__ import print_function
+
+import argparse
+import html
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .Analytics import METRICS
+from .Performance import create_drawdown_arrays
+from .PlotPerformance import minmax_downsample
+from .ResultWriter import read_equity_curve
+
+# Colours of the curves of a comparison chart
+PALETTE: List[str] = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+                      "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
+
+MONTHS: List[str] = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                     "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+STYLE = """
+body { font-family: -apple-system, "Segoe UI", Helvetica, Arial, sans-serif;
+       margin: 2em auto; max-width: 1000px; color: #222; }
+h1 { font-size: 1.6em; }
+h2 { font-size: 1.2em; margin-top: 2em; border-bottom: 1px solid #ddd; }
+table { border-collapse: collapse; font-size: 0.85em; }
+th, td { padding: 3px 8px; border: 1px solid #e0e0e0; text-align: right; }
+th { background: #f5f5f5; } td.text { text-align: left; }
+.meta td { text-align: left; } .note { color: #777; font-size: 0.85em; }
+svg text { font-size: 11px; fill: #444; }
+"""
+
+# Formats of the statistics of the summary tables
+PERCENT_METRICS = ("total_return", "cagr", "volatility", "max_drawdown", "hit_rate")
+
+METRIC_LABELS: Dict[str, str] = {metric: metric.replace("_", " ").capitalize()
+                                 for metric in METRICS}
+METRIC_LABELS["cagr"] = "CAGR"
+
+# Metrics ranking the runs smallest first
+LOWER_IS_BETTER = ("volatility", "max_drawdown", "max_drawdown_duration")
+
+
+def format_metric(name: str, value: Any) -> str:
+    """
+    Formats a metric for the tables: percentages, ratios with 2 decimals, counts.
+    """
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return "-"
+    if name in PERCENT_METRICS:
+        return "%.2f%%" % (100.0 * value)
+    if name.endswith("duration") or name.startswith("n_"):
+        return "%d" % value
+    if isinstance(value, (float, np.floating)):
+        return "%.2f" % value
+    return html.escape(str(value))
+
+
+class CurveSummary(object):
+    """
+    Summary of an equity curve consumed in chunks: the METRICS of Analytics
+    but the higher moments (with the same definitions), the equity at the
+    end of each month and a downsampled equity and drawdown curve. Memory is
+    bounded by the number of months and max_points, not by the length of
+    the curve.
+    """
+
+    def __init__(self, periods: int = 252, max_points: int = 2000) -> None:
+        """
+        Parameters:
+        periods - Periods per year of the bars, for the annualized metrics.
+        max_points - Number of points of the downsampled curves.
+        """
+        self.periods: int = periods
+        self.max_points: int = max_points
+        self.n: int = 0
+        # Running mean and sum of squared deviations of the returns (merged per chunk)
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.downside_squares: float = 0.0
+        self.gains: int = 0
+        self.moves: int = 0
+        # Equity (starting at 1), high water mark, drawdowns
+        self.equity: float = 1.0
+        self.high_water_mark: float = 1.0
+        self.max_drawdown: float = 0.0
+        self.max_duration: int = 0
+        self.duration: int = 0
+        self.month_ends: Dict[pd.Period, float] = {}
+        self.points: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self.n_points: int = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """
+        Adds the next bars of the equity curve (a DataFrame with a returns column).
+        """
+        r = np.nan_to_num(chunk["returns"].to_numpy(dtype=np.float64, na_value=np.nan),
+                          nan=0.0, posinf=0.0, neginf=0.0)
+        m = len(r)
+        if m == 0:
+            return
+        chunk_mean = r.mean()
+        chunk_m2 = np.sum((r - chunk_mean) ** 2)
+        total = self.n + m
+        delta = chunk_mean - self.mean
+        self.m2 += chunk_m2 + delta * delta * self.n * m / total
+        self.mean += delta * m / total
+        self.n = total
+        self.downside_squares += np.sum(np.minimum(r, 0.0) ** 2)
+        self.gains += int(np.count_nonzero(r > 0))
+        self.moves += int(np.count_nonzero(r != 0))
+
+        # Continues the drawdowns of the previous chunks: the
+        # NaN row stands for the previous high water mark
+        equity = self.equity * np.cumprod(1.0 + r)
+        _, drawdown, duration = create_drawdown_arrays(
+            np.concatenate(([np.nan, self.high_water_mark], equity)))
+        drawdown, duration = drawdown[2:], duration[2:]
+        # Durations restart at the chunk, unless the chunk never reaches a new high
+        new_high = np.flatnonzero(drawdown == 0)
+        carried = duration.copy()
+        carried[:new_high[0] if len(new_high) else m] += self.duration
+        self.max_drawdown = max(self.max_drawdown, float(np.nanmax(drawdown)))
+        self.max_duration = max(self.max_duration, int(carried.max()))
+        self.duration = int(carried[-1])
+        self.high_water_mark = max(self.high_water_mark, float(equity.max()))
+        self.equity = float(equity[-1])
+
+        index = pd.DatetimeIndex(chunk.index)
+        month_ends = pd.Series(equity, index=index.to_period("M"))
+        month_ends = month_ends.groupby(level=0).last()
+        self.month_ends.update(month_ends.to_dict())
+
+        selected = minmax_downsample(equity, max(1, self.max_points // 4))
+        self.points.append((index.asi8[selected], equity[selected], drawdown[selected]))
+        self.n_points += len(selected)
+        if self.n_points > 4 * self.max_points:
+            self._compact()
+
+    def _compact(self) -> None:
+        x, equity, drawdown = (np.concatenate(arrays) for arrays in zip(*self.points))
+        # Extremes of both curves are kept
+        selected = np.union1d(minmax_downsample(equity, max(1, self.max_points // 8)),
+                              minmax_downsample(drawdown, max(1, self.max_points // 8)))
+        self.points = [(x[selected], equity[selected], drawdown[selected])]
+        self.n_points = len(selected)
+
+    def curve(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the downsampled curve: datetimes (int64 ns), equity, drawdown.
+        """
+        if self.n_points > self.max_points:
+            self._compact()
+        if not self.points:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        return tuple(np.concatenate(arrays) for arrays in zip(*self.points))
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Returns the METRICS of the curve, without skew and kurtosis.
+        """
+        if self.n == 0:
+            return {metric: np.nan for metric in METRICS
+                    if metric not in ("skew", "kurtosis")}
+        std = np.sqrt(self.m2 / self.n)
+        downside = np.sqrt(self.downside_squares / self.n)
+        annual = np.sqrt(self.periods)
+        if self.equity > 0:
+            cagr = self.equity ** (self.periods / float(self.n)) - 1.0
+        else:
+            cagr = -1.0
+        return {
+            "total_return": self.equity - 1.0,
+            "cagr": cagr,
+            "volatility": std * annual,
+            "sharpe": annual * self.mean / std if std > 0 else np.nan,
+            "sortino": annual * self.mean / downside if downside > 0 else np.nan,
+            "calmar": cagr / self.max_drawdown if self.max_drawdown > 0 else np.nan,
+            "hit_rate": self.gains / float(self.moves) if self.moves else np.nan,
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_duration": self.max_duration,
+        }
+
+    def monthly_returns(self) -> pd.DataFrame:
+        """
+        Returns the monthly returns as a (years x months) DataFrame, with a Year column.
+        """
+        months = pd.Series(self.month_ends).sort_index()
+        returns = months / months.shift(1, fill_value=1.0) - 1.0
+        table = pd.DataFrame({"year": months.index.year, "month": months.index.month,
+                              "return": returns.values})
+        table = table.pivot(index="year", columns="month", values="return")
+        table = table.reindex(columns=range(1, 13))
+        year_ends = months.groupby(months.index.year).last()
+        table["Year"] = year_ends / year_ends.shift(1, fill_value=1.0) - 1.0
+        return table
+
+
+def iter_equity_curve(path: str, chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    Reads a results file of a ResultWriter in chunks of bars. CSV files are
+    read chunk by chunk, the other formats are read whole and sliced.
+    """
+    if path.endswith(".csv") or path.endswith(".csv.gz"):
+        for chunk in pd.read_csv(path, header=0, parse_dates=True, index_col=0,
+                                 chunksize=chunksize):
+            yield chunk
+    else:
+        for chunk in iter_frame_chunks(read_equity_curve(path), chunksize):
+            yield chunk
+
+
+def iter_frame_chunks(frame: pd.DataFrame,
+                      chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(frame), chunksize):
+        yield frame.iloc[start:start + chunksize]
+
+
+def _ticks(low: float, high: float, count: int = 5) -> Tuple[np.ndarray, int]:
+    """
+    Returns about count round ticks between low and
+    high, and the number of decimals they need.
+    """
+    step = (high - low) / count
+    magnitude = 10.0 ** np.floor(np.log10(step))
+    step = min(m * magnitude for m in (1, 2, 2.5, 5, 10)
+               if m * magnitude >= step * (1 - 1e-9))
+    decimals = int(-np.floor(np.log10(step) + 1e-9))
+    decimals = max(0, decimals + (1 if step / magnitude == 2.5 else 0))
+    return np.arange(np.ceil(low / step) * step, high + 1e-9 * step, step), decimals
+
+
+def svg_line_chart(x: np.ndarray, series: Sequence[Tuple[str, str, np.ndarray]],
+                   y_label: str = "", percent: bool = False, width: int = 960,
+                   height: int = 260) -> str:
+    """
+    Returns an inline SVG chart of lines sharing a datetime x axis.
+
+    Parameters:
+    x - Datetimes as int64 ns, or one array per series (same length as its values).
+    series - (label, colour, values) of each line.
+    y_label - Title of the y axis.
+    percent - Whether the y values are fractions shown as percentages.
+    """
+    left, right, top, bottom = 60, 10, 20, 30
+    xs = [np.asarray(x if not isinstance(x, (list, tuple)) else x[i], dtype=np.int64)
+          for i in range(len(series))]
+    values = [np.asarray(v, dtype=np.float64) for _, _, v in series]
+    finite = np.concatenate([v[np.isfinite(v)] for v in values] + [np.empty(0)])
+    all_x = np.concatenate(xs + [np.empty(0, dtype=np.int64)])
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+             'viewBox="0 0 %d %d">' % (width, height, width, height)]
+    if len(finite) == 0 or len(all_x) == 0:
+        parts.append('<text x="%d" y="%d">No data</text></svg>' % (left, height // 2))
+        return "".join(parts)
+    x_low, x_high = float(all_x.min()), float(all_x.max())
+    y_low, y_high = float(finite.min()), float(finite.max())
+    if y_high == y_low:
+        y_low -= 0.5 * (abs(y_low) or 1.0)
+        y_high += 0.5 * (abs(y_high) or 1.0)
+    x_scale = (width - left - right) / ((x_high - x_low) or 1.0)
+    y_scale = (height - top - bottom) / (y_high - y_low)
+
+    if percent:
+        ticks, decimals = _ticks(100 * y_low, 100 * y_high)
+    else:
+        ticks, decimals = _ticks(y_low, y_high)
+    for tick in ticks:
+        y = top + (y_high - (tick / 100 if percent else tick)) * y_scale
+        parts.append('<line x1="%d" x2="%d" y1="%.1f" y2="%.1f" stroke="#eee"/>'
+                     % (left, width - right, y, y))
+        parts.append('<text x="%d" y="%.1f" text-anchor="end">%.*f%s</text>'
+                     % (left - 4, y + 4, decimals, tick, "%" if percent else ""))
+    x_ticks = pd.date_range(pd.Timestamp(int(x_low)), pd.Timestamp(int(x_high)),
+                            periods=6)
+    for tick in x_ticks:
+        x_position = left + (tick.value - x_low) * x_scale
+        parts.append('<text x="%.1f" y="%d" text-anchor="middle">%s</text>'
+                     % (x_position, height - 8, tick.strftime("%Y-%m-%d")))
+    parts.append('<text x="12" y="%d" transform="rotate(-90 12 %d)" '
+                 'text-anchor="middle">%s</text>'
+                 % (height // 2, height // 2, html.escape(y_label)))
+    for (label, colour, _), xi, v in zip(series, xs, values):
+        keep = np.isfinite(v)
+        points = " ".join("%.1f,%.1f" % (left + (a - x_low) * x_scale,
+                                         top + (y_high - b) * y_scale)
+                          for a, b in zip(xi[keep], v[keep]))
+        parts.append('<polyline fill="none" stroke="%s" stroke-width="1.2" points="%s">'
+                     '<title>%s</title></polyline>'
+                     % (colour, points, html.escape(label)))
+    parts.append('<rect x="%d" y="%d" width="%d" height="%d" fill="none" '
+                 'stroke="#ccc"/></svg>'
+                 % (left, top, width - left - right, height - top - bottom))
+    return "".join(parts)
+
+
+def _heat_colour(value: float, scale: float) -> str:
+    if not np.isfinite(value):
+        return "#fff"
+    strength = min(abs(value) / scale, 1.0) if scale > 0 else 0.0
+    fade = int(255 - 155 * strength)
+    return "#%02x%02x%02x" % ((fade, 255, fade) if value >= 0 else (255, fade, fade))
+
+
+class HTMLReport(object):
+    """
+    HTML page written section by section, use as a context manager.
+    """
+
+    def __init__(self, path: str, title: str) -> None:
+        """
+        Parameters:
+        path - File written.
+        title - Title of the page.
+        """
+        self.path: str = path
+        self.title: str = title
+        self.file: Any = None
+
+    def __enter__(self) -> "HTMLReport":
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written to a temporary file, a reader never sees half a report
+        self.file = open(self.path + ".tmp", "w", encoding="utf-8")
+        self.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                   '<title>%s</title><style>%s</style></head><body>\n<h1>%s</h1>\n'
+                   % (html.escape(self.title), STYLE, html.escape(self.title)))
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.write("</body></html>\n")
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            os.remove(self.path + ".tmp")
+
+    def write(self, text: str) -> None:
+        self.file.write(text)
+
+    def heading(self, text: str) -> None:
+        self.write("<h2>%s</h2>\n" % html.escape(text))
+
+    def note(self, text: str) -> None:
+        self.write('<p class="note">%s</p>\n' % html.escape(text))
+
+    def key_values(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        Writes a two-column table of already formatted values.
+        """
+        self.write('<table class="meta">')
+        for key, value in items:
+            self.write("<tr><th>%s</th><td>%s</td></tr>"
+                       % (html.escape(key), html.escape(value)))
+        self.write("</table>\n")
+
+    def table(self, columns: Sequence[str], rows: Iterable[Sequence[str]],
+              text_columns: Sequence[int] = (), max_rows: Optional[int] = None) -> int:
+        """
+        Writes a table, streaming the rows (formatted strings). Rows beyond
+        max_rows are counted, not written.
+        Returns:
+        The number of rows.
+        """
+        header = "".join("<th>%s</th>" % html.escape(c) for c in columns)
+        self.write("<table><tr>%s</tr>\n" % header)
+        count = 0
+        for row in rows:
+            count += 1
+            if max_rows is None or count <= max_rows:
+                self.write("<tr>%s</tr>\n" % "".join(
+                    '<td%s>%s</td>' % (' class="text"' if i in text_columns else "",
+                                       html.escape(cell))
+                    for i, cell in enumerate(row)))
+        self.write("</table>\n")
+        if max_rows is not None and count > max_rows:
+            self.note("%d of %d rows shown." % (max_rows, count))
+        return count
+
+    def chart(self, svg: str) -> None:
+        self.write("<div>%s</div>\n" % svg)
+
+    def heatmap(self, monthly: pd.DataFrame) -> None:
+        """
+        Writes the monthly returns table of
+        CurveSummary.monthly_returns, coloured by sign and size.
+        """
+        values = monthly[list(range(1, 13))].to_numpy(dtype=np.float64)
+        finite = np.abs(values[np.isfinite(values)])
+        scale = float(np.percentile(finite, 95)) if len(finite) else 0.0
+        header = "".join("<th>%s</th>" % m for m in MONTHS)
+        self.write("<table><tr><th></th>%s<th>Year</th></tr>\n" % header)
+        for year, row in monthly.iterrows():
+            cells = "".join('<td style="background:%s">%s</td>'
+                            % (_heat_colour(row[month], scale),
+                               "%.1f%%" % (100 * row[month])
+                               if np.isfinite(row[month]) else "")
+                            for month in range(1, 13))
+            self.write("<tr><th>%d</th>%s<td><b>%.1f%%</b></td></tr>\n"
+                       % (year, cells, 100 * row["Year"]))
+        self.write("</table>\n")
+
+
+def _fill_rows(fills: Iterable[Dict[str, Any]]) -> Iterator[List[str]]:
+    for fill in fills:
+        price = fill.get("fill_cost")
+        price = float(price) if price is not None else np.nan
+        quantity = float(fill["quantity"])
+        yield [str(pd.Timestamp(fill["datetime"])), str(fill["symbol"]),
+               str(fill["direction"]), "%g" % quantity, "%.4f" % price,
+               "%.2f" % (price * quantity), "%.2f" % float(fill["commission"])]
+
+
+def write_run_report(path: str, curve_chunks: Iterable[pd.DataFrame],
+                     fills: Iterable[Dict[str, Any]] = (),
+                     title: str = "Backtest report",
+                     metadata: Optional[Dict[str, Any]] = None, periods: int = 252,
+                     max_points: int = 2000, max_trades: int = 5000) -> str:
+    """
+    Writes the report of a run.
+
+    Parameters:
+    path - HTML file written.
+    curve_chunks - The equity curve in chunks of bars
+                   (iter_equity_curve, iter_frame_chunks).
+    fills - Fills of the run (Portfolio.all_fills,
+            or the rows of RunArchive.load_fills).
+    title - Title of the page.
+    metadata - Settings of the run shown at the top (strategy, symbols, parameters).
+    periods - Periods per year of the bars.
+    max_points - Number of points of the charts.
+    max_trades - Number of fills listed, the others are only counted.
+    Returns:
+    The path written to.
+    """
+    summary = CurveSummary(periods, max_points)
+    for chunk in curve_chunks:
+        summary.update(chunk)
+    x, equity, drawdown = summary.curve()
+
+    with HTMLReport(path, title) as report:
+        if metadata:
+            report.key_values((key, value if isinstance(value, str) else repr(value))
+                              for key, value in metadata.items())
+        report.heading("Summary")
+        metrics = summary.metrics()
+        report.key_values([(METRIC_LABELS[name], format_metric(name, value))
+                           for name, value in metrics.items()]
+                          + [("Bars", "%d" % summary.n)])
+        report.heading("Equity curve")
+        report.chart(svg_line_chart(x, [("Equity", "#1f77b4", equity)],
+                                    "Equity (start = 1)"))
+        report.chart(svg_line_chart(x, [("Drawdown", "#d62728", -drawdown)], "Drawdown",
+                                    percent=True))
+        report.heading("Monthly returns")
+        if summary.month_ends:
+            report.heatmap(summary.monthly_returns())
+        report.heading("Trades")
+        columns = ["Time", "Symbol", "Direction", "Quantity", "Price", "Value",
+                   "Commission"]
+        count = report.table(columns, _fill_rows(fills), text_columns=(0, 1, 2),
+                             max_rows=max_trades)
+        if count == 0:
+            report.note("No fills.")
+    return path
+
+
+def write_archive_run_report(path: str, archive: Any, run_id: str,
+                             max_trades: int = 5000) -> str:
+    """
+    Writes the report of a run of a RunArchive.
+    """
+    row = archive.query(where="run_id = ?", where_args=[run_id]).iloc[0]
+    fills = archive.load_fills(run_id)
+    metadata = {"Run": run_id, "Strategy": row["strategy"], "Symbols": row["symbols"],
+                "Period": "%s to %s" % (row["start_date"], row["end_date"]),
+                "Parameters": row["params"]}
+    return write_run_report(path, iter_frame_chunks(archive.load_equity_curve(run_id)),
+                            fills.to_dict("records"),
+                            title="%s %s" % (row["strategy"], run_id),
+                            metadata=metadata, max_trades=max_trades)
+
+
+def write_comparison_report(path: str, archive: Any, metric: str = "sharpe",
+                            top: int = 10, max_rows: int = 1000,
+                            title: str = "Comparison of the runs",
+                            ascending: Optional[bool] = None, **filters: Any) -> str:
+    """
+    Writes a comparison page of the runs of a RunArchive: the equity curves of
+    the top runs by metric, the best run of each strategy, and the table of
+    the metrics of all the runs matching the filters (RunArchive.query filters).
+
+    Parameters:
+    path - HTML file written.
+    archive - The RunArchive.
+    metric - Metric ranking the runs.
+    top - Number of runs whose curves are drawn.
+    max_rows - Number of runs listed in the table, the others are only counted.
+    title - Title of the page.
+    ascending - Whether the smallest values rank first, by default for the
+                LOWER_IS_BETTER metrics (drawdown, volatility).
+    """
+    if ascending is None:
+        ascending = metric in LOWER_IS_BETTER
+    columns = ["strategy", "symbols", "params"] + METRICS
+    runs = archive.query(columns, order_by=metric, ascending=ascending, **filters)
+
+    with HTMLReport(path, title) as report:
+        order = "smallest first" if ascending else "largest first"
+        report.key_values([("Runs", "%d" % len(runs)),
+                           ("Ranked by", "%s, %s" % (metric, order))])
+        report.heading("Top %d runs by %s" % (min(top, len(runs)), metric))
+        xs, lines = [], []
+        for i, run_id in enumerate(runs.index[:top]):
+            curve = archive.load_equity_curve(run_id)
+            equity = curve["equity_curve"].to_numpy(dtype=np.float64, na_value=np.nan)
+            selected = minmax_downsample(equity, 250)
+            xs.append(pd.DatetimeIndex(curve.index).asi8[selected])
+            label = "%s %s" % (runs.at[run_id, "strategy"], run_id)
+            lines.append((label, PALETTE[i % len(PALETTE)], equity[selected]))
+        report.chart(svg_line_chart(xs, lines, "Equity (start = 1)"))
+
+        report.heading("Best run of each strategy")
+        best = runs.groupby("strategy", sort=False).head(1)
+        labels = [METRIC_LABELS[m] for m in METRICS]
+        report.table(["Strategy", "Run"] + labels,
+                     ([row["strategy"], run_id]
+                      + [format_metric(m, row[m]) for m in METRICS]
+                      for run_id, row in best.iterrows()), text_columns=(0, 1))
+
+        report.heading("All runs")
+        report.table(["Run", "Strategy", "Symbols", "Parameters"] + labels,
+                     ([run_id] + [format_metric(c, row[c]) if c in METRICS
+                                  else str(row[c]) for c in columns]
+                      for run_id, row in runs.iterrows()),
+                     text_columns=(0, 1, 2, 3), max_rows=max_rows)
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Static HTML reports of backtest runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Report of a results file of a ResultWriter")
+    run.add_argument("path", help="Results file (csv, csv.gz, npz, parquet)")
+    run.add_argument("--periods", type=int, default=252,
+                     help="Periods per year of the bars")
+    archived = commands.add_parser("archive", help="Report of a run of a RunArchive")
+    archived.add_argument("archive", help="RunArchive directory")
+    archived.add_argument("--run-id", required=True, help="Run of the archive")
+    compare = commands.add_parser("compare",
+                                  help="Comparison page of the runs of a RunArchive")
+    compare.add_argument("archive", help="RunArchive directory")
+    compare.add_argument("--metric", default="sharpe", choices=METRICS,
+                         help="Metric ranking the runs")
+    compare.add_argument("--top", type=int, default=10,
+                         help="Number of equity curves drawn")
+    compare.add_argument("--strategy", default=None,
+                         help="Only the runs of this strategy")
+    order = compare.add_mutually_exclusive_group()
+    order.add_argument("--ascending", dest="ascending", action="store_const",
+                       const=True,
+                       help="Rank the smallest values first (default for drawdown and "
+                            "volatility)")
+    order.add_argument("--descending", dest="ascending", action="store_const",
+                       const=False,
+                       help="Rank the largest values first (default for the other "
+                            "metrics)")
+    for command in (run, archived, compare):
+        command.add_argument("--output", "-o", required=True, help="HTML file written")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        write_run_report(args.output, iter_equity_curve(args.path),
+                         title=os.path.basename(args.path), periods=args.periods)
+    else:
+        from .RunArchive import RunArchive
+        archive = RunArchive(args.archive)
+        if args.command == "archive":
+            write_archive_run_report(args.output, archive, args.run_id)
+        else:
+            write_comparison_report(args.output, archive, args.metric, args.top,
+                                    ascending=args.ascending, strategy=args.strategy)
+    print(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
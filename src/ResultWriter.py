@@ -0,0 +1,269 @@
+from __future__ import print_function
+
+import atexit
+import os
+import threading
+from abc import ABCMeta, abstractmethod
+from typing import Any, Dict, Optional
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import numpy as np
+import pandas as pd
+
+
+class ResultWriter(object):
+    """
+    ResultWriter is an abstract base class providing an interface for
+    persisting the equity curve of a finished backtest. Each run writes
+    to its own path (output_dir/run_id.<extension>), so that parallel
+    runs of a parameter sweep do not overwrite each other.
+    """
+
+    __metaclass__ = ABCMeta
+
+    extension: str = ""
+
+    def __init__(self, output_dir: str = ".", run_id: str = "equity") -> None:
+        """
+        Initialises the writer.
+
+        Parameters:
+        output_dir - Directory in which the results are stored (created if missing).
+        run_id - Name of the run, used as the file name of the results.
+        """
+        self.output_dir: str = output_dir
+        self.run_id: str = run_id
+
+    def output_path(self, run_id: Optional[str] = None) -> str:
+        """
+        Returns the path of the results file of a run.
+        """
+        return os.path.join(
+            self.output_dir, "%s%s" % (run_id or self.run_id, self.extension)
+        )
+
+    def write(self, equity_curve: pd.DataFrame, run_id: Optional[str] = None) -> str:
+        """
+        Writes the equity curve DataFrame and returns the path written to.
+
+        Parameters:
+        equity_curve - The DataFrame created by Portfolio.create_equity_curve_dataframe.
+        run_id - Overrides the run id given at construction.
+        """
+        path = self.output_path(run_id)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = path + ".tmp"
+        self._write(equity_curve, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @abstractmethod
+    def _write(self, equity_curve: pd.DataFrame, path: str) -> None:
+        """
+        Writes the equity curve to path in the format of the writer.
+        """
+        raise NotImplementedError("Should implement _write()")
+
+    def close(self) -> None:
+        """
+        Flushes any pending results. Synchronous writers have nothing to do.
+        """
+        pass
+
+
+class CSVResultWriter(ResultWriter):
+    """
+    Writes the equity curve as CSV text, the historical equity.csv
+    format. Setting compression to 'gzip' stores a .csv.gz file instead.
+    """
+
+    def __init__(self, output_dir: str = ".", run_id: str = "equity",
+                 compression: Optional[str] = None) -> None:
+        super(CSVResultWriter, self).__init__(output_dir, run_id)
+        self.compression: Optional[str] = compression
+        self.extension = ".csv.gz" if compression == "gzip" else ".csv"
+
+    def _write(self, equity_curve: pd.DataFrame, path: str) -> None:
+        equity_curve.to_csv(path, compression=self.compression)
+
+
+class NpzResultWriter(ResultWriter):
+    """
+    Writes every column of the equity curve as a separate binary array
+    in a compressed NumPy archive. It has no dependency other than NumPy
+    and avoids the text formatting cost of CSV.
+    """
+
+    extension = ".npz"
+
+    def __init__(self, output_dir: str = ".", run_id: str = "equity",
+                 compressed: bool = True) -> None:
+        super(NpzResultWriter, self).__init__(output_dir, run_id)
+        self.compressed: bool = compressed
+
+    def _write(self, equity_curve: pd.DataFrame, path: str) -> None:
+        arrays: Dict[str, np.ndarray] = {
+            "__index__": pd.DatetimeIndex(equity_curve.index).values.astype(
+                "datetime64[ns]"
+            )
+        }
+        for column in equity_curve.columns:
+            arrays[str(column)] = equity_curve[column].to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+        save = np.savez_compressed if self.compressed else np.savez
+        # np.savez appends .npz to names that do not end with it
+        with open(path, "wb") as f:
+            save(f, **arrays)
+
+
+class ParquetResultWriter(ResultWriter):
+    """
+    Writes the equity curve to a compressed columnar Parquet file.
+    Requires pyarrow (or fastparquet) to be installed.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, output_dir: str = ".", run_id: str = "equity",
+                 compression: str = "snappy") -> None:
+        super(ParquetResultWriter, self).__init__(output_dir, run_id)
+        self.compression: str = compression
+
+    def _write(self, equity_curve: pd.DataFrame, path: str) -> None:
+        equity_curve.to_parquet(path, compression=self.compression)
+
+
+RESULT_WRITERS: Dict[str, Any] = {
+    "csv": CSVResultWriter,
+    "npz": NpzResultWriter,
+    "parquet": ParquetResultWriter,
+}
+
+
+class AsyncResultWriter(ResultWriter):
+    """
+    Wraps another ResultWriter and performs the writes in a background
+    thread, so that the caller can move on to the next job while the
+    results are formatted and written to disk. The equity curve is
+    handed over to the thread and must not be modified afterwards.
+    """
+
+    def __init__(self, writer: ResultWriter, max_pending: int = 0) -> None:
+        """
+        Parameters:
+        writer - The ResultWriter performing the actual writes.
+        max_pending - Maximum number of queued writes before
+                      write() blocks (0 = unbounded).
+        """
+        super(AsyncResultWriter, self).__init__(writer.output_dir, writer.run_id)
+        self.writer: ResultWriter = writer
+        self.extension = writer.extension
+        self.errors: list = []
+        self._queue: Any = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name="ResultWriter", daemon=True
+                )
+                self._thread.start()
+                # Daemon threads are killed at exit,
+                # make sure the queue is drained first
+                atexit.register(self.close)
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                equity_curve, run_id = item
+                self.writer.write(equity_curve, run_id)
+            except Exception as e:
+                self.errors.append(e)
+                print("Error writing results: %s" % e)
+            finally:
+                self._queue.task_done()
+
+    def write(self, equity_curve: pd.DataFrame, run_id: Optional[str] = None) -> str:
+        """
+        Queues the equity curve to be written and returns the path
+        it will be written to.
+        """
+        self._start()
+        self._queue.put((equity_curve, run_id))
+        return self.writer.output_path(run_id)
+
+    def _write(self, equity_curve: pd.DataFrame, path: str) -> None:
+        self.writer._write(equity_curve, path)
+
+    def flush(self) -> None:
+        """
+        Blocks until all queued results have been written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """
+        Writes all queued results and stops the background thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+            atexit.unregister(self.close)
+
+
+def create_result_writer(
+    output_dir: str = ".",
+    run_id: str = "equity",
+    result_format: str = "csv",
+    asynchronous: bool = False,
+) -> ResultWriter:
+    """
+    Creates a ResultWriter from its format name.
+
+    Parameters:
+    output_dir - Directory in which the results are stored.
+    run_id - Name of the run, used as the file name of the results.
+    result_format - One of 'csv', 'csv.gz', 'npz' or 'parquet'.
+    asynchronous - Whether the writes are performed in a background thread.
+    """
+    if result_format == "csv.gz":
+        writer: ResultWriter = CSVResultWriter(output_dir, run_id, compression="gzip")
+    elif result_format in RESULT_WRITERS:
+        writer = RESULT_WRITERS[result_format](output_dir, run_id)
+    else:
+        raise ValueError("Unknown result format: %s. Available: %s"
+                         % (result_format, list(RESULT_WRITERS.keys()) + ["csv.gz"]))
+    if asynchronous:
+        writer = AsyncResultWriter(writer)
+    return writer
+
+
+def read_equity_curve(path: str) -> pd.DataFrame:
+    """
+    Reads an equity curve written by any of the ResultWriters,
+    selecting the format from the file extension.
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            index = pd.DatetimeIndex(data["__index__"], name="datetime")
+            columns = {name: data[name] for name in data.files if name != "__index__"}
+        return pd.DataFrame(columns, index=index)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, header=0, parse_dates=True, index_col=0)
@@ -1,8 +1,368 @@
 from __future__ import print_function
-from typing import Dict, List, Optional, Union
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple, Union
 import numpy as np
 import pandas as pd
 
+try:
+    from .Events import OrderEvent, TargetWeightEvent
+    from .PositionSizing import PositionSizer, create_position_sizer
+except ImportError:
+    from Events import OrderEvent, TargetWeightEvent
+    from PositionSizing import PositionSizer, create_position_sizer
+
+RISK_MODELS: List[str] = ["ewma", "factor"]
+VAR_METHODS: List[str] = ["historical", "parametric", "cornish_fisher"]
+
+
+class EWMACovariance(object):
+    """
+    Exponentially weighted covariance of the returns of the universe
+    (RiskMetrics, zero mean), updated with one rank-1 update per bar:
+    C <- lambda * C + (1 - lambda) * r r'.
+    Memory and cost per bar are O(N^2), use StatisticalFactorModel for
+    large universes.
+    """
+
+    def __init__(
+        self, n_assets: int, halflife: float = 11.0, min_periods: int = 20
+    ) -> None:
+        """
+        Parameters:
+        n_assets - Number of assets.
+        halflife - Number of bars after which the weight of
+                   a bar is halved (0.94 decay ~ 11 bars).
+        min_periods - Number of bars before the model is considered ready.
+        """
+        self.decay: float = 0.5 ** (1.0 / halflife)
+        self.min_periods: int = min_periods
+        self.cov: np.ndarray = np.zeros((n_assets, n_assets))
+        self.weight: float = 0.0
+        self.count: int = 0
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether enough bars were seen for the estimates to be used.
+        """
+        return self.count >= self.min_periods
+
+    def update(self, returns: np.ndarray) -> None:
+        """
+        Adds the returns of a bar, NaN returns counting as zero.
+        """
+        r = np.where(np.isfinite(returns), returns, 0.0)
+        # Normalised by the total weight so that the
+        # first bars are not biased towards zero
+        self.weight = self.decay * self.weight + 1.0
+        alpha = 1.0 / self.weight
+        self.cov *= 1.0 - alpha
+        self.cov += alpha * np.outer(r, r)
+        self.count += 1
+
+    def covariance(self) -> np.ndarray:
+        """
+        Returns the N x N covariance matrix.
+        """
+        return self.cov
+
+    def variances(self) -> np.ndarray:
+        """
+        Returns the variance of each asset.
+        """
+        return np.diagonal(self.cov).copy()
+
+    def covariance_matvec(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Returns C w.
+        """
+        return self.cov @ weights
+
+    def portfolio_variance(self, weights: np.ndarray) -> float:
+        """
+        Returns w' C w.
+        """
+        return float(weights @ self.covariance_matvec(weights))
+
+
+class StatisticalFactorModel(object):
+    """
+    Statistical factor model from a rolling (exponentially weighted) PCA of
+    the returns: C ~ U diag(s) U' + diag(specific), with F factors.
+
+    The top F eigenvectors U of the weighted second moment matrix are kept
+    up to date with an incremental SVD (Brand): each bar's return vector is
+    split into its projection on U and an orthogonal residual, and the
+    eigenproblem is solved on the small (F+1) x (F+1) matrix of the updated
+    basis. Nothing N x N is ever formed, memory and cost per bar are
+    O(N F + F^3). The specific variances are the weighted second moments of
+    each asset minus the part explained by the factors.
+    """
+
+    def __init__(
+        self,
+        n_assets: int,
+        n_factors: int = 10,
+        halflife: float = 63.0,
+        min_periods: int = 20,
+        reorthogonalize_period: int = 250,
+        min_specific_variance: float = 1e-10,
+    ) -> None:
+        """
+        Parameters:
+        n_assets - Number of assets.
+        n_factors - Number of statistical factors F.
+        halflife - Number of bars after which the weight of a bar is halved.
+        min_periods - Number of bars before the model is considered ready.
+        reorthogonalize_period - Number of bars between QR
+                                 re-orthogonalisations of the exposures.
+        min_specific_variance - Floor of the specific variances.
+        """
+        self.n_factors: int = min(n_factors, n_assets)
+        self.decay: float = 0.5 ** (1.0 / halflife)
+        self.min_periods: int = min_periods
+        self.reorthogonalize_period: int = reorthogonalize_period
+        self.min_specific_variance: float = min_specific_variance
+        self.exposures: np.ndarray = np.zeros((n_assets, 0))
+        self.factor_variances: np.ndarray = np.zeros(0)
+        self.second_moments: np.ndarray = np.zeros(n_assets)
+        self.weight: float = 0.0
+        self.count: int = 0
+        # Specific variances of the current bar, computed on first use
+        self._specific_variances: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether enough bars were seen for the estimates to be used.
+        """
+        return self.count >= self.min_periods
+
+    def update(self, returns: np.ndarray) -> None:
+        """
+        Adds the returns of a bar, NaN returns counting as zero.
+        """
+        r = np.where(np.isfinite(returns), returns, 0.0)
+        self._specific_variances = None
+        self.weight = self.decay * self.weight + 1.0
+        alpha = 1.0 / self.weight
+        self.second_moments += alpha * (r * r - self.second_moments)
+
+        # Incremental SVD of (1 - alpha) U S U' + alpha r r'
+        u = self.exposures
+        projection = u.T @ r
+        residual = r - u @ projection
+        residual_norm = np.sqrt(residual @ residual)
+        k = u.shape[1]
+        small = np.zeros((k + 1, k + 1))
+        small[:k, :k] = np.diag((1.0 - alpha) * self.factor_variances)
+        extended = np.append(projection, residual_norm)
+        small += alpha * np.outer(extended, extended)
+        values, vectors = np.linalg.eigh(small)
+
+        # Keep the top F directions, largest first
+        keep = np.argsort(values)[::-1][:self.n_factors]
+        if residual_norm > 0:
+            basis = np.column_stack([u, residual / residual_norm])
+        else:
+            basis = np.column_stack([u, np.zeros(len(r))])
+        self.exposures = basis @ vectors[:, keep]
+        self.factor_variances = np.maximum(values[keep], 0.0)
+        self.count += 1
+
+        if (
+            self.reorthogonalize_period
+            and self.count % self.reorthogonalize_period == 0
+        ):
+            q, upper = np.linalg.qr(self.exposures)
+            # Rotate back onto the eigenbasis of the re-orthogonalised factors
+            values, vectors = np.linalg.eigh(
+                upper @ np.diag(self.factor_variances) @ upper.T
+            )
+            order = np.argsort(values)[::-1]
+            self.exposures = q @ vectors[:, order]
+            self.factor_variances = np.maximum(values[order], 0.0)
+
+    def factor_returns(self, returns: np.ndarray) -> np.ndarray:
+        """
+        Returns the factor returns U' r of a bar.
+        """
+        return self.exposures.T @ np.where(np.isfinite(returns), returns, 0.0)
+
+    def specific_variances(self) -> np.ndarray:
+        """
+        Returns the variance of each asset not explained by the factors.
+        """
+        if self._specific_variances is None:
+            explained = (self.exposures * self.exposures) @ self.factor_variances
+            self._specific_variances = np.maximum(
+                self.second_moments - explained, self.min_specific_variance
+            )
+        return self._specific_variances
+
+    def variances(self) -> np.ndarray:
+        """
+        Returns the total (factor + specific) variance of each asset.
+        """
+        explained = (self.exposures * self.exposures) @ self.factor_variances
+        return explained + self.specific_variances()
+
+    def covariance(self) -> np.ndarray:
+        """
+        Returns the dense N x N covariance, for inspection of small universes only.
+        """
+        factor = (self.exposures * self.factor_variances) @ self.exposures.T
+        return factor + np.diag(self.specific_variances())
+
+    def covariance_matvec(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Returns C w in O(N F).
+        """
+        factor_exposure = self.exposures.T @ weights
+        return (self.exposures @ (self.factor_variances * factor_exposure)
+                + self.specific_variances() * weights)
+
+    def portfolio_variance(self, weights: np.ndarray) -> float:
+        """
+        Returns w' C w in O(N F).
+        """
+        factor_exposure = self.exposures.T @ weights
+        return float(factor_exposure @ (self.factor_variances * factor_exposure)
+                     + (self.specific_variances() * weights) @ weights)
+
+
+def create_risk_model(
+    model: str, n_assets: int, **params: Any
+) -> Union[EWMACovariance, StatisticalFactorModel]:
+    """
+    Creates a risk model of RISK_MODELS: 'ewma' (dense EWMA covariance) or
+    'factor' (statistical factor model).
+    """
+    models = {"ewma": EWMACovariance, "factor": StatisticalFactorModel}
+    if model not in models:
+        raise ValueError(
+            "Unknown risk model: %s. Available: %s" % (model, RISK_MODELS)
+        )
+    return models[model](n_assets, **params)
+
+
+class ValueAtRisk(object):
+    """
+    Portfolio Value at Risk and Conditional VaR (expected shortfall) over a
+    rolling window of asset returns, as positive losses in currency for a
+    horizon of one bar.
+
+    The returns are kept in a preallocated (window x N) ring buffer. The
+    P&L scenarios of the current positions are one matrix-vector product,
+    and the historical quantile is found with a partial sort (np.partition,
+    O(window)) instead of a full sort. The parametric VaR assumes normal
+    P&L, the Cornish-Fisher VaR corrects the normal quantile for the
+    skewness and kurtosis of the scenarios; its CVaR averages the corrected
+    quantiles over the tail.
+    """
+
+    def __init__(self, n_assets: int, window: int = 250, confidence: float = 0.99,
+                 methods: Optional[List[str]] = None, tail_points: int = 64) -> None:
+        """
+        Parameters:
+        n_assets - Number of assets.
+        window - Number of bars of returns in the historical scenarios.
+        confidence - Confidence level, 0.99 for the 1% worst outcomes.
+        methods - Methods of VAR_METHODS to compute, defaults to all of them.
+        tail_points - Number of tail quantiles averaged for the Cornish-Fisher CVaR.
+        """
+        methods = list(VAR_METHODS if methods is None else methods)
+        unknown = [method for method in methods if method not in VAR_METHODS]
+        if unknown:
+            raise ValueError(
+                "Unknown VaR methods: %s. Available: %s" % (unknown, VAR_METHODS)
+            )
+        self.window: int = window
+        self.confidence: float = confidence
+        self.methods: List[str] = methods
+        self.returns: np.ndarray = np.zeros((window, n_assets))
+        self.position: int = 0
+        self.count: int = 0
+
+        # Normal quantiles of the confidence level and of the tail grid, computed once
+        normal = NormalDist()
+        tail = 1.0 - confidence
+        self.z: float = normal.inv_cdf(tail)
+        self.tail_density: float = normal.pdf(self.z) / tail
+        self.tail_z: np.ndarray = np.array(
+            [normal.inv_cdf(tail * (i + 0.5) / tail_points)
+             for i in range(tail_points)]
+        )
+
+    def update(self, returns: np.ndarray) -> None:
+        """
+        Writes the returns of a bar in the ring buffer, NaN returns counting as zero.
+        """
+        self.returns[self.position] = np.where(np.isfinite(returns), returns, 0.0)
+        self.position = (self.position + 1) % self.window
+        self.count += 1
+
+    @staticmethod
+    def _cornish_fisher(
+        z: Union[float, np.ndarray], skew: float, kurtosis: float
+    ) -> Union[float, np.ndarray]:
+        """
+        Cornish-Fisher expansion of a normal
+        quantile, kurtosis being the excess kurtosis.
+        """
+        z2 = z * z
+        return (z + (z2 - 1.0) * skew / 6.0 + (z2 * z - 3.0 * z) * kurtosis / 24.0
+                - (2.0 * z2 * z - 5.0 * z) * skew * skew / 36.0)
+
+    def compute(self, exposures: np.ndarray) -> Dict[str, float]:
+        """
+        Computes the VaR and CVaR of the positions.
+
+        Parameters:
+        exposures - Market value of the position in each asset.
+        Returns:
+        A dict with the <method>_var and <method>_cvar of each method, NaN
+        until at least two bars of returns are available.
+        """
+        n = min(self.count, self.window)
+        result: Dict[str, float] = {}
+        if n < 2:
+            for method in self.methods:
+                result["%s_var" % method] = result["%s_cvar" % method] = np.nan
+            return result
+
+        pnl = self.returns[:n] @ np.where(np.isfinite(exposures), exposures, 0.0)
+        if "historical" in self.methods:
+            k = max(0, int(np.floor((1.0 - self.confidence) * n)) - 1)
+            worst = np.partition(pnl, k)[:k + 1]
+            result["historical_var"] = -float(worst[k])
+            result["historical_cvar"] = -float(worst.mean())
+
+        mean = float(pnl.mean())
+        deviation = pnl - mean
+        variance = float(deviation @ deviation) / n
+        std = float(np.sqrt(variance))
+        if "parametric" in self.methods:
+            result["parametric_var"] = -(mean + self.z * std)
+            result["parametric_cvar"] = -(mean - std * self.tail_density)
+        if "cornish_fisher" in self.methods:
+            if variance > 0:
+                squared = deviation * deviation
+                skew = float((squared * deviation).mean()) / variance ** 1.5
+                kurtosis = (
+                    float((squared * squared).mean()) / (variance * variance) - 3.0
+                )
+            else:
+                skew = kurtosis = 0.0
+            result["cornish_fisher_var"] = -(
+                mean + float(self._cornish_fisher(self.z, skew, kurtosis)) * std
+            )
+            result["cornish_fisher_cvar"] = -(
+                mean
+                + float(self._cornish_fisher(self.tail_z, skew, kurtosis).mean()) * std
+            )
+        return result
+
 
 class RiskManagement(object):
     """
@@ -16,15 +376,394 @@ class RiskManagement(object):
     - Position sizing, for better capital management (leverage, weight between portfolios)
         --> Kelly Criterion?
         --> Markowitz theory?
+
+    The covariance of the universe is maintained bar by bar by a risk model:
+    an EWMACovariance, or a StatisticalFactorModel for large universes.
+
+    With a portfolio, it is also the pre-trade risk gate of the event loop:
+    every order is checked against the position, gross/net exposure and
+    concentration limits in O(1) from exposure totals maintained
+    incrementally (marked by the Portfolio each bar, adjusted by each
+    approved order), and stop-loss/take-profit exits are sent when a
+    position's trigger prices are crossed. The trigger prices are kept in
+    arrays indexed like symbol_list, with the index of the armed positions
+    maintained on the fills: each bar compares the prices of the armed
+    positions only, in one vectorized operation, and only the crossed
+    positions are visited. The exits are recorded in forced_exits, the
+    Backtest notifies the strategy.
+
+    With a sizer, the SignalEvents are sized here instead of by the
+    Portfolio: their strengths are kept per symbol and, once per bar, turned
+    into a TargetWeightEvent by a fractional Kelly or mean-variance
+    PositionSizer using the risk model.
     """
     
-    def __init__(self, portfolio_value: float = 100000.0, max_position_size: float = 0.1) -> None:
+    def __init__(
+        self,
+        bars: Any,
+        portfolio: Any = None,
+        portfolio_value: float = 100000.0,
+        max_position_size: Optional[float] = 0.1,
+        risk_model: Optional[str] = "factor",
+        risk_model_params: Optional[Dict[str, Any]] = None,
+        var_every: int = 1,
+        var_params: Optional[Dict[str, Any]] = None,
+        events: Any = None,
+        max_gross_exposure: Optional[float] = None,
+        max_net_exposure: Optional[float] = None,
+        max_concentration: Optional[float] = None,
+        concentration_min_positions: int = 5,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None,
+        sizer: Optional[str] = None,
+        sizer_params: Optional[Dict[str, Any]] = None,
+    ) -> None:
         """
         Initialize risk management parameters.
         
         Parameters:
+        bars - The DataHandler object that provides bar information
+        portfolio - The Portfolio object whose positions are measured.
         portfolio_value - Total portfolio value
         max_position_size - Maximum position size as fraction of portfolio (0.1 = 10%)
+        risk_model - 'ewma', 'factor' or None for no covariance model.
+        risk_model_params - Keyword arguments of the risk model.
+        var_every - Number of bars between two VaR computations, 0 to disable them.
+        var_params - Keyword arguments of the ValueAtRisk (window,
+                     confidence, methods).
+        events - The Event Queue object, receiving the stop-loss/take-profit orders.
+        max_gross_exposure - Maximum sum of the absolute position
+                             values as fraction of portfolio.
+        max_net_exposure - Maximum absolute sum of the position
+                           values as fraction of portfolio.
+        max_concentration - Maximum share of the gross exposure in one symbol, checked
+                            once concentration_min_positions positions are open.
+        stop_loss - Exit a position losing this fraction
+                    from its entry price (0.05 = 5%).
+        take_profit - Exit a position gaining this fraction from its entry price.
+        sizer - 'kelly', 'mean_variance' or None to leave the signals to the Portfolio.
+        sizer_params - Keyword arguments of the sizer (fraction,
+                       risk_aversion, max_weight, ...).
         """
+        self.bars: Any = bars
+        self.portfolio: Any = portfolio
+        self.symbol_list: List[str] = self.bars.symbol_list
         self.portfolio_value: float = portfolio_value
         self.max_position_size: float = max_position_size
+        self.risk_model: Optional[Union[EWMACovariance, StatisticalFactorModel]] = None
+        if risk_model is not None:
+            self.risk_model = create_risk_model(
+                risk_model, len(self.symbol_list), **(risk_model_params or {})
+            )
+        self.latest_returns: np.ndarray = np.full(len(self.symbol_list), np.nan)
+        self.latest_prices: np.ndarray = np.full(len(self.symbol_list), np.nan)
+
+        self.var_every: int = var_every
+        self.value_at_risk: ValueAtRisk = ValueAtRisk(
+            len(self.symbol_list), **(var_params or {})
+        )
+        self.var_history: List[Dict[str, Any]] = []
+        self.bar_index: int = 0
+
+        # Pre-trade limits, fractions of the portfolio equity
+        self.events: Any = events
+        self.max_gross_exposure: Optional[float] = max_gross_exposure
+        self.max_net_exposure: Optional[float] = max_net_exposure
+        self.max_concentration: Optional[float] = max_concentration
+        self.concentration_min_positions: int = concentration_min_positions
+        self.symbol_index: Dict[str, int] = {
+            symbol: i for i, symbol in enumerate(self.symbol_list)
+        }
+        # Approved orders not filled yet, and the exposure totals including them
+        self.pending: np.ndarray = np.zeros(len(self.symbol_list))
+        self.gross_exposure: float = 0.0
+        self.net_exposure: float = 0.0
+        self.open_positions: int = 0
+        self.rejections: List[Tuple[Any, str, str]] = []
+
+        # Stop-loss/take-profit trigger prices, NaN when flat or already triggered
+        self.stop_loss: Optional[float] = stop_loss
+        self.take_profit: Optional[float] = take_profit
+        self.entry_prices: np.ndarray = np.full(len(self.symbol_list), np.nan)
+        self.stop_prices: np.ndarray = np.full(len(self.symbol_list), np.nan)
+        self.take_prices: np.ndarray = np.full(len(self.symbol_list), np.nan)
+        # Sorted indices of the positions with a trigger price
+        self.armed: np.ndarray = np.zeros(0, dtype=np.intp)
+        self.forced_exits: List[Tuple[Any, str, str]] = []
+
+        # Position sizing of the signals, signed strength per symbol
+        self.sizer: Optional[PositionSizer] = None
+        if sizer is not None:
+            if self.risk_model is None:
+                raise ValueError("Position sizing needs a risk_model")
+            self.sizer = create_position_sizer(sizer, **(sizer_params or {}))
+        self.signals: np.ndarray = np.zeros(len(self.symbol_list))
+        self.sizing_due: bool = False
+
+    def update_timeindex(self, event: Any) -> None:
+        """
+        Updates the risk model and the VaR scenarios with the returns of the
+        latest bar of every symbol, and measures the VaR of the portfolio
+        every var_every bars.
+        """
+        prices = self.bars.get_latest_bars_panel(["adj_close"], 2)[:, :, 0]
+        if prices.shape[0] == 0:
+            return
+        self.latest_prices = prices[-1]
+        self.bar_index += 1
+        self.sizing_due = self.sizer is not None
+        if self.portfolio is not None:
+            self._mark_exposures()
+            self._check_triggers()
+        if prices.shape[0] < 2:
+            return
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.latest_returns = prices[1] / prices[0] - 1.0
+        if self.risk_model is not None:
+            self.risk_model.update(self.latest_returns)
+        if self.var_every:
+            self.value_at_risk.update(self.latest_returns)
+            if self.portfolio is not None and self.bar_index % self.var_every == 0:
+                self.measure_var()
+
+    def update_signal(self, event: Any) -> None:
+        """
+        Records the strength of a SignalEvent (LONG positive, SHORT negative,
+        EXIT zero), to be sized at the end of the bar.
+        """
+        i = self.symbol_index[event.symbol]
+        if event.signal_type == "LONG":
+            self.signals[i] = event.strength
+        elif event.signal_type == "SHORT":
+            self.signals[i] = -event.strength
+        else:
+            self.signals[i] = 0.0
+
+    def size_positions(self) -> bool:
+        """
+        Sizes the signals once the events of the bar are processed, putting
+        a TargetWeightEvent in the queue when the target weights changed.
+        Returns whether an event was put.
+        """
+        if not self.sizing_due:
+            return False
+        self.sizing_due = False
+        if not self.risk_model.ready:
+            return False
+        weights = self.sizer.size(self.signals, self.risk_model)
+        if weights is None:
+            return False
+        self.events.put(
+            TargetWeightEvent(
+                self.bars.get_latest_bar_datetime(self.symbol_list[0]), weights
+            )
+        )
+        return True
+
+    def _mark_exposures(self) -> None:
+        """
+        Restarts the exposure totals from the portfolio marks of the bar,
+        adding the orders still pending.
+        """
+        self.gross_exposure = self.portfolio.gross_exposure
+        self.net_exposure = self.portfolio.net_exposure
+        for i in np.flatnonzero(self.pending):
+            price = self.latest_prices[i]
+            position = self.portfolio.position_vector[i]
+            change = abs(position + self.pending[i]) - abs(position)
+            self.gross_exposure += change * price
+            self.net_exposure += self.pending[i] * price
+
+    def _reject(self, order: Any, reason: str) -> bool:
+        self.rejections.append(
+            (self.bars.get_latest_bar_datetime(order.symbol), order.symbol, reason)
+        )
+        return False
+
+    def check_order(self, order: Any) -> bool:
+        """
+        Pre-trade check of an OrderEvent against the limits, in O(1).
+        Orders reducing a position are always accepted. An accepted order
+        is added to the pending exposure.
+
+        Returns:
+        Whether the order may be sent to the execution handler.
+        """
+        if self.portfolio is None:
+            return True
+        i = self.symbol_index[order.symbol]
+        signed = order.quantity if order.direction == "BUY" else -order.quantity
+        price = self.latest_prices[i]
+        current = self.portfolio.position_vector[i] + self.pending[i]
+        new = current + signed
+
+        if abs(new) > abs(current) or np.sign(new) == -np.sign(current) != 0:
+            equity = self.portfolio.all_holdings[-1]["total"]
+            value = abs(new) * price
+            gross = self.gross_exposure + (abs(new) - abs(current)) * price
+            net = self.net_exposure + signed * price
+            if not np.isfinite(price) or equity <= 0:
+                return self._reject(order, "no price or no equity")
+            if (
+                self.max_position_size is not None
+                and value > self.max_position_size * equity
+            ):
+                return self._reject(order, "position size")
+            if (
+                self.max_gross_exposure is not None
+                and gross > self.max_gross_exposure * equity
+            ):
+                return self._reject(order, "gross exposure")
+            if (
+                self.max_net_exposure is not None
+                and abs(net) > self.max_net_exposure * equity
+            ):
+                return self._reject(order, "net exposure")
+            if (
+                self.max_concentration is not None
+                and self.open_positions >= self.concentration_min_positions
+                and value > self.max_concentration * gross
+            ):
+                return self._reject(order, "concentration")
+
+        self.pending[i] += signed
+        self.gross_exposure += (abs(new) - abs(current)) * price
+        self.net_exposure += signed * price
+        return True
+
+    def check_orders(self, orders: List[Any]) -> List[Any]:
+        """
+        Pre-trade check of a batch of orders, in order. Returns the accepted orders.
+        """
+        return [order for order in orders if self.check_order(order)]
+
+    def update_fill(self, event: Any) -> None:
+        """
+        Moves a fill from the pending orders to the position (already
+        updated by the Portfolio), and resets the entry and trigger prices
+        of the symbol.
+        """
+        if self.portfolio is None:
+            return
+        i = self.symbol_index[event.symbol]
+        signed = event.quantity if event.direction == "BUY" else -event.quantity
+        self.pending[i] -= signed
+        if abs(self.pending[i]) < 1e-9:
+            self.pending[i] = 0.0
+
+        position = self.portfolio.position_vector[i]
+        previous = position - signed
+        self.open_positions += int(position != 0) - int(previous != 0)
+        price = (
+            event.fill_cost
+            if event.fill_cost is not None and np.isfinite(event.fill_cost)
+            else self.latest_prices[i]
+        )
+        if position == 0:
+            self.entry_prices[i] = np.nan
+        elif previous == 0 or np.sign(previous) != np.sign(position):
+            self.entry_prices[i] = price
+        elif abs(position) > abs(previous):
+            # Average entry price of the increased position
+            self.entry_prices[i] = (
+                self.entry_prices[i] * abs(previous) + price * abs(signed)
+            ) / abs(position)
+        self._set_triggers(i, position)
+
+    def _set_triggers(self, i: int, position: float) -> None:
+        direction = np.sign(position)
+        entry = self.entry_prices[i]
+        self.stop_prices[i] = (
+            entry * (1.0 - direction * self.stop_loss)
+            if self.stop_loss is not None and direction != 0
+            else np.nan
+        )
+        self.take_prices[i] = (
+            entry * (1.0 + direction * self.take_profit)
+            if self.take_profit is not None and direction != 0
+            else np.nan
+        )
+        if np.isfinite(self.stop_prices[i]) or np.isfinite(self.take_prices[i]):
+            self.armed = np.union1d(self.armed, [i])
+        else:
+            self.armed = self.armed[self.armed != i]
+
+    def _check_triggers(self) -> None:
+        """
+        Sends exit orders for the positions whose stop-loss or take-profit
+        price is crossed by the latest prices, and records them in
+        forced_exits as (datetime, symbol, reason).
+        """
+        armed = self.armed
+        if armed.size == 0:
+            return
+        direction = np.sign(self.portfolio.position_vector[armed])
+        prices = self.latest_prices[armed]
+        with np.errstate(invalid="ignore"):
+            # Long: stop below and take above the entry, short: the reverse
+            stopped = (direction * (prices - self.stop_prices[armed])) <= 0
+            taken = (direction * (prices - self.take_prices[armed])) >= 0
+        crossed = np.flatnonzero(stopped | taken)
+        if crossed.size == 0:
+            return
+        # Disarmed until the exit is filled
+        self.armed = np.delete(armed, crossed)
+        for k in crossed:
+            i = armed[k]
+            symbol = self.symbol_list[i]
+            quantity = abs(self.portfolio.position_vector[i] + self.pending[i])
+            self.stop_prices[i] = self.take_prices[i] = np.nan
+            if quantity > 0 and self.events is not None:
+                side = "SELL" if direction[k] > 0 else "BUY"
+                self.events.put(OrderEvent(symbol, "MKT", int(quantity), side))
+                reason = "stop loss" if stopped[k] else "take profit"
+                self.forced_exits.append(
+                    (self.bars.get_latest_bar_datetime(symbol), symbol, reason)
+                )
+
+    def exposures(self) -> np.ndarray:
+        """
+        Returns the market value of the portfolio position in each symbol.
+        """
+        return self.portfolio.position_vector * self.latest_prices
+
+    def measure_var(self) -> Dict[str, Any]:
+        """
+        Computes the VaR and CVaR of the current positions and records them.
+        """
+        record: Dict[str, Any] = {
+            "datetime": self.bars.get_latest_bar_datetime(self.symbol_list[0])
+        }
+        record.update(self.value_at_risk.compute(self.exposures()))
+        self.var_history.append(record)
+        return record
+
+    def var_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the recorded VaR and CVaR as a DataFrame indexed by datetime.
+        """
+        return (
+            pd.DataFrame(self.var_history).set_index("datetime")
+            if self.var_history
+            else pd.DataFrame()
+        )
+
+    def covariance(self) -> pd.DataFrame:
+        """
+        Returns the current covariance matrix as a
+        DataFrame (dense, small universes only).
+        """
+        return pd.DataFrame(
+            self.risk_model.covariance(),
+            index=self.symbol_list,
+            columns=self.symbol_list,
+        )
+
+    def portfolio_volatility(self, weights: np.ndarray) -> float:
+        """
+        Returns the per bar volatility of a portfolio
+        of weights aligned with symbol_list.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        variance = self.risk_model.portfolio_variance(weights)
+        return float(np.sqrt(max(variance, 0.0)))
@@ -0,0 +1,387 @@
+"""
+Archive of the results of many backtest runs.
+
+The metrics of the runs (the METRICS of Analytics, computed once when a run
+is added) are columns of an indexed SQLite table, with the metadata of the
+runs (strategy, symbols, date range, parameters), so that ranking or
+filtering thousands of runs reads these columns only. The equity curve and
+fills of each run are stored separately in compressed NumPy archives, and
+are only loaded for the runs that are looked at.
+
+Layout of an archive directory:
+
+    index.sqlite         runs (metadata and metrics) and run_params (one row
+                         per parameter)
+    curves/<run>.npz     equity curve, written by the NpzResultWriter
+    fills/<run>.npz      one array per fill field
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .Analytics import METRICS, compute_metrics
+from .ResultWriter import NpzResultWriter, read_equity_curve
+from .RunCache import canonical_json
+
+# Columns of a run besides its metrics
+RUN_COLUMNS: List[str] = [
+    "run_id",
+    "strategy",
+    "symbols",
+    "n_symbols",
+    "start_date",
+    "end_date",
+    "params",
+    "n_bars",
+    "n_fills",
+    "created",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    strategy TEXT NOT NULL,
+    symbols TEXT NOT NULL,
+    n_symbols INTEGER NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    params TEXT NOT NULL,
+    config TEXT,
+    n_bars INTEGER,
+    n_fills INTEGER,
+    created REAL,
+    %s
+);
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy);
+CREATE INDEX IF NOT EXISTS runs_dates ON runs (start_date, end_date);
+CREATE INDEX IF NOT EXISTS run_params_value ON run_params (name, value);
+%s
+""" % (
+    ",\n    ".join("%s REAL" % metric for metric in METRICS),
+    "\n".join(
+        "CREATE INDEX IF NOT EXISTS runs_%s ON runs (%s);" % (metric, metric)
+        for metric in ("total_return", "sharpe", "sortino", "calmar", "max_drawdown")
+    ),
+)
+
+# Fields of Portfolio.all_fills and the dtype of their arrays
+FILL_FIELDS: List[Tuple[str, str]] = [
+    ("datetime", "datetime64[ns]"),
+    ("symbol", "U"),
+    ("direction", "U"),
+    ("quantity", "float64"),
+    ("fill_cost", "float64"),
+    ("commission", "float64"),
+]
+
+
+def _iso(value: Any) -> Optional[str]:
+    """
+    Dates are stored as ISO strings of the same format, which sort chronologically.
+    """
+    return None if value is None else pd.Timestamp(value).isoformat()
+
+
+def _param_value(value: Any) -> Any:
+    # Scalars are stored as such so that they compare as numbers, the rest as JSON
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    return canonical_json(value)
+
+
+class RunArchive(object):
+    """
+    Archive of runs in a directory. Several processes may add runs to the
+    same archive (the writes of the index are serialized by SQLite).
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0) -> None:
+        """
+        Parameters:
+        path - Directory of the archive, created if missing.
+        timeout - Seconds waited for the index locked by another process.
+        """
+        self.path: str = path
+        os.makedirs(os.path.join(path, "curves"), exist_ok=True)
+        os.makedirs(os.path.join(path, "fills"), exist_ok=True)
+        self.connection = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), timeout=timeout, isolation_level=None
+        )
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self._transaction() as connection:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def __contains__(self, run_id: str) -> bool:
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def add(
+        self,
+        run_id: str,
+        strategy: str,
+        symbols: Sequence[str],
+        start_date: Any,
+        end_date: Any,
+        params: Dict[str, Any],
+        equity_curve: pd.DataFrame,
+        fills: Optional[List[Dict[str, Any]]] = None,
+        config: Optional[Dict[str, Any]] = None,
+        periods: int = 252,
+    ) -> Dict[str, float]:
+        """
+        Adds a run, replacing the run archived under the same id.
+
+        Parameters:
+        run_id - Identifier of the run (e.g. its key in the ResultCache).
+        strategy - Name of the strategy.
+        symbols - Symbols traded.
+        start_date, end_date - Period of the backtest.
+        params - Parameters of the strategy, indexed for the queries.
+        equity_curve - Portfolio.equity_curve of the run.
+        fills - Portfolio.all_fills of the run.
+        config - Full configuration of the run, stored as JSON.
+        periods - Periods per year of the bars, for the annualized metrics.
+        Returns:
+        The metrics of the run.
+        """
+        metrics = compute_metrics(equity_curve["returns"], periods=periods).iloc[0]
+        metrics = {metric: float(metrics[metric]) for metric in METRICS}
+
+        # Data files first: a run in the index always has its files
+        NpzResultWriter(os.path.join(self.path, "curves"), run_id).write(equity_curve)
+        self._write_fills(run_id, fills or [])
+
+        row = {
+            "run_id": run_id,
+            "strategy": strategy,
+            "symbols": " ".join(symbols),
+            "n_symbols": len(symbols),
+            "start_date": _iso(start_date),
+            "end_date": _iso(end_date),
+            "params": canonical_json(params),
+            "config": canonical_json(config) if config is not None else None,
+            "n_bars": len(equity_curve),
+            "n_fills": len(fills or []),
+            "created": time.time(),
+        }
+        row.update(metrics)
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            connection.execute(
+                "INSERT INTO runs (%s) VALUES (%s)"
+                % (", ".join(row), ", ".join("?" * len(row))),
+                list(row.values()),
+            )
+            connection.executemany(
+                "INSERT INTO run_params (run_id, name, value) VALUES (?, ?, ?)",
+                ((run_id, name, _param_value(value)) for name, value in params.items()),
+            )
+        return metrics
+
+    def _write_fills(self, run_id: str, fills: List[Dict[str, Any]]) -> None:
+        arrays = {}
+        for name, dtype in FILL_FIELDS:
+            values = [fill.get(name) for fill in fills]
+            if dtype == "datetime64[ns]":
+                arrays[name] = pd.DatetimeIndex(values).values.astype(dtype)
+            else:
+                arrays[name] = np.array(values, dtype=dtype)
+        path = os.path.join(self.path, "fills", "%s.npz" % run_id)
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    def query(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        strategy: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        start_date: Any = None,
+        end_date: Any = None,
+        where: Optional[str] = None,
+        where_args: Sequence[Any] = (),
+        order_by: Optional[str] = None,
+        ascending: bool = False,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns the metrics and metadata of the runs matching the filters,
+        without loading their curves.
+
+        Parameters:
+        columns - Columns returned besides run_id
+                  (RUN_COLUMNS and METRICS), all by default.
+        strategy - Only the runs of this strategy.
+        params - Only the runs with these parameter values, e.g. {"short_window": 50}.
+        start_date, end_date - Only the runs whose period lies within these dates.
+        where - Additional SQL condition on the columns, e.g.
+                "n_symbols >= 10 AND max_drawdown < 0.2".
+        where_args - Values of the ? placeholders of where.
+        order_by - Column sorting the runs, e.g. "sharpe".
+        ascending - Sort order, largest first by default.
+        limit - Maximum number of runs returned.
+        Returns:
+        A DataFrame indexed by run_id.
+        """
+        known = RUN_COLUMNS + METRICS
+        columns = [column for column in (columns or known) if column != "run_id"]
+        for column in columns + ([order_by] if order_by else []):
+            if column not in known:
+                raise ValueError("Unknown column: %s. Available: %s" % (column, known))
+
+        conditions, args = [], []
+        if strategy is not None:
+            conditions.append("strategy = ?")
+            args.append(strategy)
+        for name, value in (params or {}).items():
+            conditions.append(
+                "run_id IN (SELECT run_id FROM run_params WHERE name = ? AND value = ?)"
+            )
+            args.extend([name, _param_value(value)])
+        if start_date is not None:
+            conditions.append("start_date >= ?")
+            args.append(_iso(start_date))
+        if end_date is not None:
+            conditions.append("end_date <= ?")
+            args.append(_iso(end_date))
+        if where:
+            conditions.append("(%s)" % where)
+            args.extend(where_args)
+
+        sql = "SELECT %s FROM runs" % ", ".join(["run_id"] + columns)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            # NaN metrics (e.g. the Sharpe ratio of a
+            # flat run) are stored as NULL, sorted last.
+            # They are already last in descending order,
+            # which then reads the index of the metric
+            sql += " ORDER BY %s %s" % (
+                order_by,
+                "ASC NULLS LAST" if ascending else "DESC",
+            )
+        if limit is not None:
+            sql += " LIMIT %d" % limit
+        rows = self.connection.execute(sql, args).fetchall()
+        frame = pd.DataFrame.from_records(
+            rows, columns=["run_id"] + columns, index="run_id"
+        )
+        for column in columns:
+            if column in METRICS:
+                frame[column] = frame[column].astype(np.float64)
+        return frame
+
+    def top(
+        self,
+        metric: str = "sharpe",
+        n: int = 100,
+        ascending: bool = False,
+        **filters: Any,
+    ) -> pd.DataFrame:
+        """
+        Returns the n best runs by metric (smallest first if ascending,
+        e.g. for max_drawdown), with the filters of query().
+        """
+        return self.query(order_by=metric, ascending=ascending, limit=n, **filters)
+
+    def params(self, run_ids: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Returns the parameters of the runs as a DataFrame, one column per parameter.
+        """
+        sql = "SELECT run_id, name, value FROM run_params"
+        args: List[Any] = []
+        if run_ids is not None:
+            run_ids = list(run_ids)
+            sql += " WHERE run_id IN (%s)" % ", ".join("?" * len(run_ids))
+            args = run_ids
+        rows = self.connection.execute(sql, args).fetchall()
+        if not rows:
+            return pd.DataFrame(index=pd.Index([], name="run_id"))
+        return pd.DataFrame(rows, columns=["run_id", "name", "value"]).pivot(
+            index="run_id", columns="name", values="value"
+        )
+
+    def config(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the full configuration stored with a run.
+        """
+        row = self.connection.execute(
+            "SELECT config FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        return json.loads(row[0]) if row[0] is not None else None
+
+    def load_equity_curve(self, run_id: str) -> pd.DataFrame:
+        """
+        Returns the equity curve of a run.
+        """
+        return read_equity_curve(os.path.join(self.path, "curves", "%s.npz" % run_id))
+
+    def load_equity_curves(
+        self, run_ids: Sequence[str], column: str = "equity_curve"
+    ) -> pd.DataFrame:
+        """
+        Returns one column of the equity curves of
+        several runs, as a (time x runs) DataFrame.
+        """
+        return pd.DataFrame(
+            {run_id: self.load_equity_curve(run_id)[column] for run_id in run_ids}
+        )
+
+    def load_fills(self, run_id: str) -> pd.DataFrame:
+        """
+        Returns the fills of a run, one row per fill.
+        """
+        with np.load(os.path.join(self.path, "fills", "%s.npz" % run_id)) as data:
+            return pd.DataFrame({name: data[name] for name, _ in FILL_FIELDS})
+
+    def remove(self, run_id: str) -> None:
+        """
+        Removes a run and its files.
+        """
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        for directory in ("curves", "fills"):
+            path = os.path.join(self.path, directory, "%s.npz" % run_id)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,134 @@
+"""
+Memoization of backtest runs. A run is keyed by the hash of its
+configuration and of the content of its input data, and its results are
+stored under that key, so that a batch only executes the runs that are new
+or whose configuration or data changed.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError("Not serializable in a run key: %r" % (value,))
+
+
+def canonical_json(value: Any) -> str:
+    """
+    Returns a deterministic JSON representation (sorted keys, ISO dates).
+    """
+    return json.dumps(
+        value, sort_keys=True, separators=(",", ":"), default=_json_default
+    )
+
+
+def _write_json_atomic(path: str, value: Any) -> None:
+    # Concurrent runs may write the same key
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(value, f, indent=2, sort_keys=True, default=_json_default)
+    os.replace(tmp_path, path)
+
+
+class ResultCache(object):
+    """
+    On-disk cache of the results of the runs: one directory per run key,
+    holding the result files of the run and result.json, written last.
+    """
+
+    def __init__(self, cache_dir: str = ".backtest_cache") -> None:
+        """
+        Parameters:
+        cache_dir - Directory of the cached runs.
+        """
+        self.cache_dir: str = cache_dir
+        self._file_hashes: Optional[Dict[str, Any]] = None
+        self._new_hashes: bool = False
+
+    def run_dir(self, key: str) -> str:
+        """
+        Returns the directory of the results of a run, created if missing.
+        """
+        path = os.path.join(self.cache_dir, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the record of a finished run, None if it was never completed.
+        """
+        path = os.path.join(self.cache_dir, key, "result.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, record: Dict[str, Any]) -> None:
+        """
+        Stores the record of a finished run, marking it as completed.
+        """
+        _write_json_atomic(os.path.join(self.run_dir(key), "result.json"), record)
+
+    def file_hash(self, path: str) -> str:
+        """
+        Returns the sha256 of a file. The hashes are remembered with the size
+        and modification time of the files (saved by data_hash), unchanged
+        files are not read again.
+        """
+        if self._file_hashes is None:
+            try:
+                with open(os.path.join(self.cache_dir, "file_hashes.json")) as f:
+                    self._file_hashes = json.load(f)
+            except (OSError, ValueError):
+                self._file_hashes = {}
+        path = os.path.abspath(path)
+        status = os.stat(path)
+        signature = [status.st_size, status.st_mtime_ns]
+        known = self._file_hashes.get(path)
+        if known is not None and known[:2] == signature:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self._file_hashes[path] = signature + [digest.hexdigest()]
+        self._new_hashes = True
+        return digest.hexdigest()
+
+    def data_hash(self, paths: Iterable[str]) -> str:
+        """
+        Returns the hash of the content of the data files of a run.
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(os.path.basename(path).encode())
+            digest.update(self.file_hash(path).encode())
+        if self._new_hashes:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write_json_atomic(
+                os.path.join(self.cache_dir, "file_hashes.json"), self._file_hashes
+            )
+            self._new_hashes = False
+        return digest.hexdigest()
+
+
+def run_key(config: Dict[str, Any], data_hash: str) -> str:
+    """
+    Returns the key of a run from its configuration (only the settings that
+    change its results) and the hash of its input data.
+    """
+    digest = hashlib.sha256((canonical_json(config) + data_hash).encode())
+    return digest.hexdigest()[:20]
+
@@ -1,5 +1,9 @@
-from Strategy import Strategy
-from Events import MarketEvent, SignalEvent
+try:
+    from ..Strategy import Strategy
+    from ..Events import MarketEvent, SignalEvent
+except (ImportError, ValueError):
+    from Strategy import Strategy
+    from Events import MarketEvent, SignalEvent
 from typing import Dict, Any
 import datetime
 
@@ -1,28 +1,75 @@
 import pandas as pd
 import numpy as np
-from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis as QDA
-from Strategy import Strategy
-from Events import SignalEvent, MarketEvent
-from Strategies.Helper.CreateLaggedSeries import create_lagged_series
+try:
+    from ..Strategy import Strategy
+    from ..Events import SignalEvent, MarketEvent
+except (ImportError, ValueError):
+    from Strategy import Strategy
+    from Events import SignalEvent, MarketEvent
+from .Helper.CreateLaggedSeries import create_lagged_series, lagged_features
+from .Helper.ModelCache import DEFAULT_MODEL_CACHE, ModelCache, hash_training_data
+from .Helper.RetrainScheduler import RetrainScheduler
 from typing import Any, Optional
 from datetime import datetime
 
 
+def fit_qda(X: np.ndarray, Y: np.ndarray) -> Any:
+    """
+    Fits a QDA model, module level so that retraining can run in worker processes.
+    sklearn is only imported when a model is fitted.
+    """
+    from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis as QDA
+    return QDA().fit(X, Y)
+
+
 class ETFDailyForecastStrategy(Strategy):
     """
     S&P100 forecast strategy. It uses a Quadratic Discriminant
     Analyser to predict the returns for a subsequent time
     period and then generated long/exit signals based on the
     prediction.
+
+    The fitted model is cached (see ModelCache) and, when the data handler
+    exposes the whole data set, the predictions of every bar are computed
+    in one batch up front so that each bar is a lookup.
+
+    With retrain_cadence, the model is refitted walk-forward on the last
+    retrain_window bars every retrain_cadence bars (see RetrainScheduler),
+    the fits running in the background while the backtest goes on.
     """
 
-    def __init__(self, bars: Any, events: Any) -> None:
+    def __init__(
+        self,
+        bars: Any,
+        events: Any,
+        model_start_date: datetime = datetime(2016, 1, 1, 0, 0, 0),
+        model_end_date: datetime = datetime(2021, 1, 1, 0, 0, 0),
+        model_start_test_date: datetime = datetime(2020, 1, 1, 0, 0, 0),
+        lags: int = 5,
+        model_interval: str = '1d',
+        model_cache: Optional[ModelCache] = None,
+        retrain_cadence: Optional[int] = None,
+        retrain_window: int = 504,
+        retrain_workers: int = 1,
+        retrain_processes: bool = False,
+    ) -> None:
         """
         Initialises the buy and hold strategy.
 
         Parameters:
         bars - The DataHandler object that provides bar information
         events - The Event Queue object.
+        model_start_date, model_end_date - Range of the data the model is trained on.
+        model_start_test_date - Start of the held out test period.
+        lags - Number of lagged returns of the training series.
+        model_interval - Interval of the training data.
+        model_cache - The ModelCache of the fitted models, defaults to the shared one.
+        retrain_cadence - Number of bars between walk-forward
+                          refits, None to keep the initial model.
+        retrain_window - Number of bars each refit is trained on.
+        retrain_workers - Number of background threads (or
+                          processes) running the refits.
+        retrain_processes - Whether to refit in processes instead of threads.
         """
         self.bars: Any = bars
         self.symbol_list: list = self.bars.symbol_list
@@ -31,26 +78,45 @@ class ETFDailyForecastStrategy(Strategy):
         # FIXME --> Here the models are fit on the training dataset only, especially here with the
         # regime change in 1st quarter 2020
         self.datetime_now: datetime = datetime.utcnow()
-        self.model_start_date: datetime = datetime(2016, 1, 1, 0, 0, 0)
-        self.model_end_date: datetime = datetime(2021, 1, 1, 0, 0, 0)
-        self.model_start_test_date: datetime = datetime(2020, 1, 1, 0, 0, 0)
-        self.model_interval: str = '1d'
+        self.model_start_date: datetime = model_start_date
+        self.model_end_date: datetime = model_end_date
+        self.model_start_test_date: datetime = model_start_test_date
+        self.model_interval: str = model_interval
+        self.lags: int = lags
+        self.model_cache: ModelCache = (
+            DEFAULT_MODEL_CACHE if model_cache is None else model_cache
+        )
 
         self.long_market: bool = False
         self.short_market: bool = False
         self.bar_index: int = 0
 
-        self.model: QDA = self.create_symbol_forecast_model()
+        self.model: Any = self.create_symbol_forecast_model()
+        self.predictions: Optional[np.ndarray] = self.precompute_predictions()
+
+        # Walk-forward retraining needs the whole data set of the handler
+        self.retrainer: Optional[RetrainScheduler] = None
+        if retrain_cadence and self.predictions is not None:
+            self.retrainer = self.create_retrainer(
+                retrain_cadence, retrain_window, retrain_workers, retrain_processes
+            )
 
     """
     The model here is directly chosen, as for calculating inside the trading signals. For model choice,
     it's better to run a script outside of the backtest strategy. 
     """
 
-    def create_symbol_forecast_model(self) -> QDA:
-        # Create a lagged series of the S&P500 US stock market index
-        df_ret: pd.DataFrame = create_lagged_series(self.symbol_list[0], self.model_start_date,
-                                      self.model_end_date, self.model_interval, lags=5)
+    def create_symbol_forecast_model(self) -> Any:
+        # Create a lagged series of the S&P500 US stock market index,
+        # from the loaded bars when they cover the training range
+        df_ret: pd.DataFrame = create_lagged_series(
+            self.symbol_list[0],
+            self.model_start_date,
+            self.model_end_date,
+            self.model_interval,
+            lags=self.lags,
+            bars=self.bars,
+        )
 
         # Use the prior two days of returns as predictor
         # values, with direction as the response
@@ -71,9 +137,87 @@ class ETFDailyForecastStrategy(Strategy):
         There is requirements to test the strategy with different models, k-fold cross validation,
         and also grid searching for parameters optimization
         """
-        model: QDA = QDA()
-        model.fit(X_train, Y_train)  # TODO --> The model could be fit on the whole dataset, this is on model validation
-        return model
+        # TODO --> The model could be fit on the
+        # whole dataset, this is on model validation
+        from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis as QDA
+        key: str = hash_training_data(
+            X_train,
+            Y_train,
+            model=QDA.__name__,
+            params=sorted(QDA().get_params().items()),
+        )
+        return self.model_cache.get_or_fit(key, lambda: fit_qda(X_train, Y_train))
+
+    @staticmethod
+    def prediction_features(returns: np.ndarray) -> np.ndarray:
+        """
+        Builds the (Lag1, Lag2) predictors of every bar from the "returns"
+        bar values, the same values calculate_signals reads from the last
+        three bars: Lag1 from the previous bar, Lag2 from the current one.
+        """
+        features: np.ndarray = np.full((len(returns), 2), np.nan)
+        features[1:, 0] = returns[:-1] * 100.0
+        features[:, 1] = returns * 100.0
+        return features
+
+    def precompute_predictions(self) -> Optional[np.ndarray]:
+        """
+        Predicts the direction of every bar of the backtest with one batched
+        predict call. Returns None if the data handler does not expose the
+        whole data set, the predictions are then made bar by bar.
+        """
+        try:
+            returns: np.ndarray = np.asarray(
+                self.bars.get_history_values(self.symbol_list[0], "returns"),
+                dtype=np.float64,
+            )
+        except (AttributeError, KeyError):
+            return None
+
+        self.features: np.ndarray = self.prediction_features(returns)
+        predictions: np.ndarray = np.zeros(len(returns))
+        self.predict_rows(predictions, self.model, 0, len(returns))
+        return predictions
+
+    def predict_rows(
+        self, predictions: np.ndarray, model: Any, start: int, stop: int
+    ) -> None:
+        """
+        Fills the predictions of the bars [start, stop) with one batched predict call.
+        """
+        features: np.ndarray = self.features[start:stop]
+        valid: np.ndarray = np.all(np.isfinite(features), axis=1)
+        if valid.any():
+            predictions[start:stop][valid] = model.predict(features[valid])
+
+    def create_retrainer(
+        self, cadence: int, window: int, workers: int, processes: bool
+    ) -> RetrainScheduler:
+        """
+        Sets up the walk-forward refits on the (Lag1, Lag2) -> Direction
+        training set of the handler's data, each window ending before the
+        bar where its model is first used.
+        """
+        df_ret: pd.DataFrame = lagged_features(
+            self.bars.get_history_values(self.symbol_list[0], "adj_close"), lags=2
+        )
+        X: np.ndarray = df_ret[["Lag1", "Lag2"]].values
+        Y: np.ndarray = df_ret["Direction"].values
+        valid: np.ndarray = np.all(np.isfinite(X), axis=1) & np.isfinite(Y)
+
+        def train_data(start: int, stop: int):
+            rows = valid[start:stop]
+            return X[start:stop][rows], Y[start:stop][rows]
+
+        return RetrainScheduler(
+            fit_qda,
+            train_data,
+            cadence,
+            window,
+            n_bars=len(Y),
+            max_workers=workers,
+            use_processes=processes,
+        )
 
     def calculate_signals(self, event: MarketEvent) -> None:
         """
@@ -86,20 +230,26 @@ class ETFDailyForecastStrategy(Strategy):
             self.bar_index += 1
 
             # make sure we wait 5 days to get the latest "bar" values
-            if self.bar_index > 5:
-                lags: np.ndarray = self.bars.get_latest_bars_values(self.symbol_list[0], "returns", N=3)
+            if (self.retrainer is not None
+                    and self.retrainer.update(self.bar_index - 1)):
+                # Swap in the refitted model up to the next boundary
+                self.model = self.retrainer.model
+                self.predict_rows(self.predictions, self.model, self.bar_index - 1,
+                                  self.retrainer.boundary_after(self.bar_index - 1))
 
-                # series of lags for 2 days prior
-                pred_series: pd.Series = pd.Series(
-                    {
-                        "Lag1": lags[1] * 100.0,
-                        "Lag2": lags[2] * 100.0
-                    }
-                )
+            if self.bar_index > 5:
+                if self.predictions is not None:
+                    pred: float = self.predictions[self.bar_index - 1]
+                else:
+                    lags: np.ndarray = self.bars.get_latest_bars_values(
+                        self.symbol_list[0], "returns", N=3
+                    )
 
-                # reshape the array as it needs to be 2d
-                pred_values: np.ndarray = pred_series.values.reshape(1, -1)
-                pred: np.ndarray = self.model.predict(pred_values)
+                    # lags for 2 days prior, as a single row
+                    pred_values: np.ndarray = np.array(
+                        [[lags[1] * 100.0, lags[2] * 100.0]]
+                    )
+                    pred = self.model.predict(pred_values)[0]
 
                 # if price prediction is up and not LONG then BUY
                 if pred > 0 and not self.long_market:
@@ -112,3 +262,10 @@ class ETFDailyForecastStrategy(Strategy):
                     self.long_market = False
                     signal: SignalEvent = SignalEvent(symbol, dt, "EXIT", 1.0)
                     self.events.put(signal)
+
+    def finish(self) -> None:
+        """
+        Shuts the refit workers down at the end of the backtest.
+        """
+        if self.retrainer is not None:
+            self.retrainer.close()
@@ -1,47 +1,152 @@
-import yfinance as yf
+import hashlib
 import pandas as pd
 import numpy as np
-from typing import Union
-from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Any, Dict, Optional, Tuple, Union
+from datetime import datetime, timedelta
 
+# Memoized feature DataFrames, keyed by (symbol,
+# start, end, interval, lags, data digest)
+_LAGGED_SERIES_CACHE: Dict[Tuple, pd.DataFrame] = {}
 
-def create_lagged_series(symbol: str, start_date: datetime, end_date: datetime, 
-                        interval: str, lags: int = 5) -> pd.DataFrame:
-    """
-    This creates a Pandas DataFrame that stores the
-    percentage returns of the adjusted closing value of
-    a stock obtained from Yahoo Finance, along with a
-    number of lagged returns from the prior trading days
-    (lags defaults to 5 days). Trading volume, as well as
-    the Direction from the previous day, are also included.
+
+def lagged_returns(prices: np.ndarray, lags: int = 5) -> Tuple[np.ndarray, np.ndarray]:
     """
-    # Obtain stock information from Yahoo Finance
-    df_data: pd.DataFrame = yf.download(tickers=[symbol], start=start_date, end=end_date, interval=interval, auto_adjust=False)
+    Computes the percentage returns of prices and their lags with one strided
+    view, for a single series (time,) or many symbols at once (time x symbols).
 
-    # Create the new lagged DataFrame
-    df_lag: pd.DataFrame = pd.DataFrame(index=df_data.index)
-    df_lag["Today"] = df_data["Adj Close"]
-    df_lag["Volume"] = df_data["Volume"]
+    Returns:
+    (returns, lagged) - The returns, NaN on the first period, and the lagged
+    returns of shape returns.shape + (lags,), lagged[..., i] holding the
+    returns of i + 1 periods before (NaN before the start of the series).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    returns = np.full(prices.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = (prices[1:] / prices[:-1] - 1.0) * 100.0
+    padded = np.concatenate(
+        [np.full((lags,) + prices.shape[1:], np.nan), returns], axis=0
+    )
+    # Window t holds the returns t - lags .. t, the
+    # lags are all but the last, most recent first
+    windows = sliding_window_view(padded, lags + 1, axis=0)
+    return returns, windows[..., lags - 1::-1] if lags > 0 else windows[..., :0]
 
-    # Create the shifted lag series of prior trading period close values
-    for i in range(0, lags):
-        df_lag[f"Lag{i + 1}"] = df_data["Adj Close"].shift(i + 1)
 
-    # Create the returns DataFrame
-    df_ret: pd.DataFrame = pd.DataFrame(index=df_lag.index)
-    df_ret['Volume'] = df_lag['Volume']
-    df_ret['Today'] = df_lag['Today'].pct_change() * 100  # daily returns
+def lagged_features(
+    prices: np.ndarray,
+    volume: Optional[np.ndarray] = None,
+    lags: int = 5,
+    index: Optional[pd.Index] = None,
+) -> pd.DataFrame:
+    """
+    Builds the Volume, Today, Lag1..LagN and Direction columns of
+    create_lagged_series from arrays of adjusted closing prices and volumes.
+    """
+    returns, lagged = lagged_returns(prices, lags)
 
     # If any of the values of percentage returns equal zero, set them to
     # a small number (stops issues with QDA model in Scikit-Learn)
-    df_ret.loc[abs(df_ret['Today']) < 0.0001, 'Today'] = 0.0001
+    today = np.where(np.abs(returns) < 0.0001, 0.0001, returns)
 
-    # Create the lagged percentage returns columns
-    for i in range(0, lags):
-        df_ret[f'Lag{i + 1}'] = df_lag[f'Lag{i + 1}'].pct_change() * 100.0
+    df_ret: pd.DataFrame = pd.DataFrame(
+        lagged, index=index, columns=[f"Lag{i + 1}" for i in range(lags)]
+    )
+    df_ret.insert(0, "Today", today)
+    df_ret.insert(0, "Volume", np.nan if volume is None else np.asarray(volume))
 
     # Create the "Direction" column (+1 or -1) indicating an up/down day
-    df_ret['Direction'] = np.sign(df_ret['Today'])
-    df_ret = df_ret[df_ret.index >= start_date]
-
+    df_ret["Direction"] = np.sign(today)
     return df_ret
+
+
+def _parse_dates(index: pd.Index) -> Optional[pd.DatetimeIndex]:
+    """
+    Parses the index of a data handler frame: datetimes (Yahoo), ISO dates
+    or the dd/mm/yyyy dates of the CSV files of DataDir. None if neither.
+    """
+    if isinstance(index, pd.DatetimeIndex):
+        return index
+    for options in ({"format": "ISO8601"}, {"dayfirst": True}):
+        try:
+            return pd.DatetimeIndex(pd.to_datetime(index, **options))
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _handler_prices(
+    bars: Any, symbol: str, start_date: datetime, end_date: datetime
+) -> Optional[Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]]:
+    """
+    Returns the dates, adjusted closes and volumes of the data handler over
+    [start_date, end_date), or None if its data does not cover the range.
+    """
+    frames = getattr(bars, "symbol_frames", None)
+    if not frames or symbol not in frames:
+        return None
+    index = _parse_dates(frames[symbol].index)
+    # A week of slack for the weekends and holidays at the ends of the range
+    slack = timedelta(days=7)
+    if index is None or len(index) == 0:
+        return None
+    if index[0] > start_date + slack or index[-1] < end_date - slack:
+        return None
+    rows = (index >= start_date) & (index < end_date)
+    return (index[rows], bars.get_history_values(symbol, "adj_close")[rows],
+            bars.get_history_values(symbol, "volume")[rows])
+
+
+def create_lagged_series(symbol: str, start_date: datetime, end_date: datetime,
+                        interval: str, lags: int = 5,
+                        bars: Any = None) -> pd.DataFrame:
+    """
+    This creates a Pandas DataFrame that stores the
+    percentage returns of the adjusted closing value of
+    a stock, along with a number of lagged returns from
+    the prior trading days (lags defaults to 5 days).
+    Trading volume, as well as the Direction from the
+    previous day, are also included.
+
+    The prices are taken from the data handler bars when its data covers
+    the range, and downloaded from Yahoo Finance otherwise. Results are
+    memoized per symbol, range, lags and data.
+    """
+    loaded = (
+        _handler_prices(bars, symbol, start_date, end_date)
+        if bars is not None
+        else None
+    )
+    if loaded is not None:
+        index, prices, volume = loaded
+        digest = hashlib.sha1(
+            np.ascontiguousarray(prices, dtype=np.float64).tobytes()
+        ).hexdigest()
+    else:
+        digest = "yahoo"
+    key = (symbol, start_date, end_date, interval, lags, digest)
+    if key in _LAGGED_SERIES_CACHE:
+        return _LAGGED_SERIES_CACHE[key].copy()
+
+    if loaded is None:
+        # Obtain stock information from Yahoo Finance
+        import yfinance as yf
+        df_data: pd.DataFrame = yf.download(
+            tickers=[symbol],
+            start=start_date,
+            end=end_date,
+            interval=interval,
+            auto_adjust=False,
+        )
+        if isinstance(df_data.columns, pd.MultiIndex):
+            df_data.columns = df_data.columns.get_level_values(0)
+        index, prices, volume = (
+            df_data.index,
+            df_data["Adj Close"].values,
+            df_data["Volume"].values,
+        )
+
+    df_ret: pd.DataFrame = lagged_features(prices, volume, lags, index=index)
+    df_ret = df_ret[df_ret.index >= start_date]
+    _LAGGED_SERIES_CACHE[key] = df_ret
+    return df_ret.copy()
@@ -0,0 +1,239 @@
+"""
+Streaming hedge ratio estimators for pair trading. Each model tracks a whole
+batch of pairs at once: update() takes the latest price of the y and x leg of
+every pair as arrays and returns the hedge ratio and the z-score of the
+spread of every pair in O(1) per bar, without refitting a regression on the
+full window. A pair with a missing (non-finite) price skips the bar: its
+state is left as it is and its z-score is NaN, the other pairs are updated.
+"""
+
+from __future__ import print_function
+
+from abc import ABCMeta, abstractmethod
+from typing import Any, List, Tuple
+
+import numpy as np
+
+HEDGE_RATIO_MODES: List[str] = ["ols", "ewm", "kalman"]
+
+
+class HedgeRatioModel(object):
+    """
+    HedgeRatioModel is an abstract base class for the hedge ratio estimators
+    of a batch of pairs.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def update(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Adds the latest prices of the pairs.
+
+        Parameters:
+        x - Latest price of the x (hedge) leg of each pair, NaN if missing.
+        y - Latest price of the y leg of each pair, NaN if missing.
+        Returns:
+        (hedge_ratio, zscore) - Arrays with one value per pair, NaN until
+                                the model of the pair is warmed up.
+        """
+        raise NotImplementedError("Should implement update()")
+
+
+class RollingOLSHedgeRatio(HedgeRatioModel):
+    """
+    Rolling regression of y on x without intercept over a fixed window, the
+    z-score being the last spread y - beta * x standardised by the mean and
+    (population) standard deviation of the spread over the window.
+
+    The window sums of x, y, x^2, y^2 and xy are updated by adding the new
+    bar and subtracting the one leaving the window. The spread moments follow
+    from the same sums for the current beta:
+    sum(s) = Sy - beta * Sx, sum(s^2) = Syy - 2 beta Sxy + beta^2 Sxx.
+    The sums are recomputed from the window every resync_period bars to stop
+    the rounding errors of the running updates from accumulating.
+    """
+
+    def __init__(
+        self, n_pairs: int, window: int = 50, resync_period: int = 1000
+    ) -> None:
+        """
+        Parameters:
+        n_pairs - Number of pairs.
+        window - Number of bars of the rolling regression.
+        resync_period - Number of bars between exact recomputations of the sums.
+        """
+        if window < 2:
+            raise ValueError("window must be at least 2, got %s" % window)
+        self.window: int = window
+        self.resync_period: int = resync_period
+        self.x: np.ndarray = np.zeros((window, n_pairs))
+        self.y: np.ndarray = np.zeros((window, n_pairs))
+        # Rows of the sums: x, y, xx, yy, xy
+        self.sums: np.ndarray = np.zeros((5, n_pairs))
+        # Bars seen by each pair, its next slot in the window is count % window
+        self.counts: np.ndarray = np.zeros(n_pairs, dtype=np.int64)
+
+    def _terms(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.stack([x, y, x * x, y * y, x * y])
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        pairs = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        counts = self.counts[pairs]
+        # Slots not written yet hold zeros, which subtract nothing
+        slots = counts % self.window
+        self.sums[:, pairs] -= self._terms(self.x[slots, pairs], self.y[slots, pairs])
+        self.x[slots, pairs] = x[pairs]
+        self.y[slots, pairs] = y[pairs]
+        self.sums[:, pairs] += self._terms(x[pairs], y[pairs])
+        counts += 1
+        self.counts[pairs] = counts
+        if self.resync_period:
+            resync = pairs[counts % self.resync_period == 0]
+            if resync.size:
+                terms = self._terms(self.x[:, resync], self.y[:, resync])
+                self.sums[:, resync] = terms.sum(axis=1)
+
+        sx, sy, sxx, syy, sxy = self.sums
+        n = float(self.window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = sxy / sxx
+            mean = (sy - beta * sx) / n
+            variance = np.maximum(
+                (syy - 2.0 * beta * sxy + beta * beta * sxx) / n - mean * mean, 0.0
+            )
+            zscore = (y - beta * x - mean) / np.sqrt(variance)
+        warming = self.counts < self.window
+        beta[warming] = zscore[warming] = np.nan
+        return beta, zscore
+
+
+class EWMHedgeRatio(HedgeRatioModel):
+    """
+    Exponentially weighted regression of y on x without intercept: the same
+    moments as RollingOLSHedgeRatio, as exponentially weighted averages that
+    adapt faster to a drifting relationship.
+    """
+
+    def __init__(
+        self, n_pairs: int, halflife: float = 25.0, min_periods: int = 50
+    ) -> None:
+        """
+        Parameters:
+        n_pairs - Number of pairs.
+        halflife - Number of bars after which the weight of a bar is halved.
+        min_periods - Number of bars before the z-scores are reported.
+        """
+        self.decay: float = 0.5 ** (1.0 / halflife)
+        self.min_periods: int = min_periods
+        # Weighted averages of x, y, xx, yy, xy, normalised by the total weight
+        self.moments: np.ndarray = np.zeros((5, n_pairs))
+        self.weights: np.ndarray = np.zeros(n_pairs)
+        self.counts: np.ndarray = np.zeros(n_pairs, dtype=np.int64)
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        pairs = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        self.weights[pairs] = self.decay * self.weights[pairs] + 1.0
+        alpha = 1.0 / self.weights[pairs]
+        xp, yp = x[pairs], y[pairs]
+        terms = np.stack([xp, yp, xp * xp, yp * yp, xp * yp])
+        self.moments[:, pairs] += alpha * (terms - self.moments[:, pairs])
+        self.counts[pairs] += 1
+
+        mx, my, mxx, myy, mxy = self.moments
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = mxy / mxx
+            mean = my - beta * mx
+            variance = np.maximum(
+                myy - 2.0 * beta * mxy + beta * beta * mxx - mean * mean, 0.0
+            )
+            zscore = (y - beta * x - mean) / np.sqrt(variance)
+        warming = self.counts < self.min_periods
+        beta[warming] = zscore[warming] = np.nan
+        return beta, zscore
+
+
+class KalmanHedgeRatio(HedgeRatioModel):
+    """
+    Kalman filter of the hedge ratio and intercept of y = beta * x + alpha,
+    both following random walks. The z-score is the forecast error of y
+    standardised by its predicted standard deviation. The 2x2 filter of every
+    pair is written out elementwise so that the whole batch updates at once.
+    """
+
+    def __init__(
+        self,
+        n_pairs: int,
+        delta: float = 1e-4,
+        observation_variance: float = 1e-3,
+        min_periods: int = 50,
+    ) -> None:
+        """
+        Parameters:
+        n_pairs - Number of pairs.
+        delta - Speed of the random walk of the state, as
+                delta / (1 - delta) times the identity.
+        observation_variance - Variance of the observation noise of y.
+        min_periods - Number of bars before the z-scores are reported.
+        """
+        self.state_noise: float = delta / (1.0 - delta)
+        self.observation_variance: float = observation_variance
+        self.min_periods: int = min_periods
+        self.beta: np.ndarray = np.zeros(n_pairs)
+        self.alpha: np.ndarray = np.zeros(n_pairs)
+        # State covariance [[p_bb, p_ba], [p_ba, p_aa]]
+        self.p_bb: np.ndarray = np.zeros(n_pairs)
+        self.p_ba: np.ndarray = np.zeros(n_pairs)
+        self.p_aa: np.ndarray = np.zeros(n_pairs)
+        self.counts: np.ndarray = np.zeros(n_pairs, dtype=np.int64)
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Pairs with a missing price keep their state
+        valid = np.isfinite(x) & np.isfinite(y)
+
+        # Predict: the state covariance grows by the random walk noise
+        p_bb = self.p_bb + self.state_noise
+        p_ba = self.p_ba
+        p_aa = self.p_aa + self.state_noise
+
+        # Observation y = [x, 1] . [beta, alpha]
+        error = y - (self.beta * x + self.alpha)
+        px_b = p_bb * x + p_ba
+        px_a = p_ba * x + p_aa
+        forecast_variance = x * px_b + px_a + self.observation_variance
+        gain_b = px_b / forecast_variance
+        gain_a = px_a / forecast_variance
+
+        self.beta = np.where(valid, self.beta + gain_b * error, self.beta)
+        self.alpha = np.where(valid, self.alpha + gain_a * error, self.alpha)
+        self.p_bb = np.where(valid, p_bb - gain_b * px_b, self.p_bb)
+        self.p_ba = np.where(valid, p_ba - gain_b * px_a, self.p_ba)
+        self.p_aa = np.where(valid, p_aa - gain_a * px_a, self.p_aa)
+        self.counts += valid
+
+        beta = self.beta.copy()
+        zscore = error / np.sqrt(forecast_variance)
+        warming = self.counts < self.min_periods
+        beta[warming] = zscore[warming] = np.nan
+        return beta, zscore
+
+
+def create_hedge_ratio_model(mode: str, n_pairs: int, **params: Any) -> HedgeRatioModel:
+    """
+    Creates the hedge ratio model of a mode of HEDGE_RATIO_MODES.
+
+    Parameters:
+    mode - 'ols' (rolling window), 'ewm' (exponentially weighted) or 'kalman'.
+    n_pairs - Number of pairs.
+    params - Keyword arguments of the model.
+    """
+    models = {
+        "ols": RollingOLSHedgeRatio,
+        "ewm": EWMHedgeRatio,
+        "kalman": KalmanHedgeRatio,
+    }
+    if mode not in models:
+        raise ValueError(
+            "Unknown hedge ratio mode: %s. Available: %s" % (mode, HEDGE_RATIO_MODES)
+        )
+    return models[mode](n_pairs, **params)
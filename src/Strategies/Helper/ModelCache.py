@@ -0,0 +1,92 @@
+"""
+Cache of fitted models, so that sweeps and repeated backtests of ML
+strategies fit each model once. A model is keyed by the hash of its
+training data and hyperparameters, kept in memory for the process and
+pickled to disk for the following runs.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def hash_training_data(*arrays: Any, **hyperparams: Any) -> str:
+    """
+    Returns a hex digest of the training data (arrays, Series or DataFrames,
+    including their index) and the hyperparameters.
+    """
+    digest = hashlib.sha256()
+    for array in arrays:
+        if isinstance(array, (pd.Series, pd.DataFrame)):
+            digest.update(
+                pd.util.hash_pandas_object(array, index=True).values.tobytes()
+            )
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype, array.shape)).encode())
+        digest.update(array.tobytes())
+    digest.update(repr(sorted(hyperparams.items())).encode())
+    return digest.hexdigest()
+
+
+class ModelCache(object):
+    """
+    In-memory and on-disk cache of fitted models.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = ".model_cache") -> None:
+        """
+        Parameters:
+        cache_dir - Directory of the pickled models, None to only cache in memory.
+        """
+        self.cache_dir: Optional[str] = cache_dir
+        self.models: Dict[str, Any] = {}
+
+    def path(self, key: str) -> Optional[str]:
+        """
+        Returns the file of a cached model.
+        """
+        return (
+            None
+            if self.cache_dir is None
+            else os.path.join(self.cache_dir, "%s.pkl" % key)
+        )
+
+    def get_or_fit(self, key: str, fit: Callable[[], Any]) -> Any:
+        """
+        Returns the model cached under key, calling fit() and storing its
+        result if there is none. An unreadable cache file is refitted.
+        """
+        if key in self.models:
+            return self.models[key]
+        path = self.path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    self.models[key] = pickle.load(f)
+                return self.models[key]
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+                    ImportError):
+                pass
+
+        model = fit()
+        self.models[key] = model
+        if path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written atomically, concurrent runs may fit the same model
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        return model
+
+
+# Shared by the strategies of a process, e.g. the runs of a sweep
+DEFAULT_MODEL_CACHE: ModelCache = ModelCache()
@@ -0,0 +1,233 @@
+"""
+Offline selection of the pairs traded by OLSMRStrategy.
+
+All N(N-1)/2 pairs of a universe are screened at once: the return
+correlations and the hedge ratios come from two (symbols x symbols) matrix
+products, and the pairs passing the correlation filter get an Engle-Granger
+style ADF test on their spread. The ADF regressions of a chunk of pairs are
+solved together as a stack of small normal equations, and the chunks are
+spread over worker processes.
+"""
+
+from __future__ import print_function
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# MacKinnon (2010) response surface of the Engle-Granger critical values for
+# two variables with a constant: c(T) = b_inf + b1 / T + b2 / T^2
+ENGLE_GRANGER_CRITICAL_VALUES: List[Tuple[float, Tuple[float, float, float]]] = [
+    (0.01, (-3.89644, -10.9519, -22.527)),
+    (0.05, (-3.33613, -6.1101, -6.823)),
+    (0.10, (-3.04445, -4.2412, -2.720)),
+]
+
+# Price matrix shared with the worker processes, set once per worker
+_PRICES: Optional[np.ndarray] = None
+
+
+def price_matrix(
+    bars: Any, symbols: Optional[Sequence[str]] = None, value_type: str = "adj_close"
+) -> pd.DataFrame:
+    """
+    Builds the (time x symbols) price matrix of a data handler, from the
+    whole data set (see DataManagement.get_history_values).
+
+    Parameters:
+    bars - The DataHandler object.
+    symbols - The symbols to include, defaults to the symbol list of the handler.
+    value_type - The bar value used as price.
+    """
+    symbols = list(bars.symbol_list if symbols is None else symbols)
+    index = (
+        bars.symbol_frames[symbols[0]].index if hasattr(bars, "symbol_frames") else None
+    )
+    return pd.DataFrame(
+        {symbol: bars.get_history_values(symbol, value_type) for symbol in symbols},
+        index=index,
+    )
+
+
+def engle_granger_critical_values(n_obs: int) -> List[Tuple[float, float]]:
+    """
+    Returns the (significance level, critical value) pairs for a sample of n_obs.
+    """
+    return [
+        (level, b[0] + b[1] / n_obs + b[2] / n_obs**2)
+        for level, b in ENGLE_GRANGER_CRITICAL_VALUES
+    ]
+
+
+def _init_worker(prices: np.ndarray) -> None:
+    global _PRICES
+    _PRICES = prices
+
+
+def batch_adf(spreads: np.ndarray, lags: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Augmented Dickey-Fuller regressions with a constant of every column:
+    diff(s)_t = c + gamma * s_{t-1} + sum_k phi_k * diff(s)_{t-k} + e_t.
+
+    Parameters:
+    spreads - A (time x series) array.
+    lags - Number of lagged differences.
+    Returns:
+    (adf_stat, gamma) - The t-statistic and the estimate of gamma of each column.
+    """
+    diff = np.diff(spreads, axis=0)
+    n = diff.shape[0] - lags
+    # Regressors as (time x series) arrays, the constant first
+    columns = [None, spreads[lags:-1]] + [diff[lags - k:-k] for k in range(1, lags + 1)]
+    target = diff[lags:]
+    k = len(columns)
+
+    # Normal equations of all the series at once, from column-wise sums of products
+    xtx = np.empty((spreads.shape[1], k, k))
+    xty = np.empty((spreads.shape[1], k))
+    xtx[:, 0, 0] = n
+    xty[:, 0] = target.sum(axis=0)
+    for i in range(1, k):
+        xtx[:, 0, i] = xtx[:, i, 0] = columns[i].sum(axis=0)
+        xty[:, i] = np.einsum("tn,tn->n", columns[i], target)
+        for j in range(1, i + 1):
+            xtx[:, i, j] = xtx[:, j, i] = np.einsum("tn,tn->n", columns[i], columns[j])
+    xtx_inv = np.linalg.pinv(xtx)
+    coefficients = np.einsum("nkl,nl->nk", xtx_inv, xty)
+    ssr = np.maximum(
+        np.einsum("tn,tn->n", target, target)
+        - np.einsum("nk,nk->n", coefficients, xty),
+        0.0,
+    )
+    sigma2 = ssr / max(n - k, 1)
+    gamma = coefficients[:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        adf_stat = gamma / np.sqrt(sigma2 * xtx_inv[:, 1, 1])
+    return adf_stat, gamma
+
+
+def _scan_chunk(
+    args: Tuple[np.ndarray, np.ndarray, np.ndarray, int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ADF statistics of the spreads of a chunk of pairs, run in the worker processes.
+    """
+    y_index, x_index, hedge_ratio, lags = args
+    spreads = _PRICES[:, y_index] - hedge_ratio * _PRICES[:, x_index]
+    return batch_adf(spreads, lags)
+
+
+def scan_pairs(
+    prices: Union[pd.DataFrame, Any],
+    min_correlation: float = 0.5,
+    lags: int = 1,
+    n_jobs: int = 1,
+    chunk_size: int = 1024,
+    max_pairs: Optional[int] = None,
+    value_type: str = "adj_close",
+) -> pd.DataFrame:
+    """
+    Ranks the cointegration candidates of a universe.
+
+    The hedge ratio of each pair (y, x) is the regression of the y prices on
+    the x prices without intercept, as in OLSMRStrategy, y being the symbol
+    that comes first in the universe.
+
+    Parameters:
+    prices - A (time x symbols) DataFrame of prices, or a DataHandler.
+    min_correlation - Minimum correlation of the returns of a pair to be tested.
+    lags - Number of lagged differences of the ADF regressions.
+    n_jobs - Number of worker processes, -1 for all cores.
+    chunk_size - Number of pairs tested together.
+    max_pairs - Keep only the best max_pairs pairs.
+    value_type - The bar value used as price when a DataHandler is given.
+    Returns:
+    A DataFrame of the pairs sorted by ADF statistic (most stationary first),
+    with y, x, correlation, hedge_ratio, adf_stat, half_life and significance
+    (the smallest of 1%, 5%, 10% at which the spread is cointegrated, NaN if none).
+    """
+    if not isinstance(prices, pd.DataFrame):
+        prices = price_matrix(prices, value_type=value_type)
+    prices = prices.dropna()
+    symbols = list(prices.columns)
+    p = prices.values.astype(np.float64)
+    n_obs = p.shape[0]
+    if n_obs < lags + 3:
+        raise ValueError(
+            "Not enough observations (%d) for ADF regressions with %d lags"
+            % (n_obs, lags)
+        )
+
+    # Correlation of the returns and hedge ratios
+    # of all the pairs from two matrix products
+    returns = np.diff(p, axis=0) / p[:-1]
+    returns = returns - returns.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns /= np.sqrt((returns * returns).sum(axis=0))
+    correlation = returns.T @ returns
+    gram = p.T @ p
+
+    y_index, x_index = np.triu_indices(len(symbols), k=1)
+    pair_correlation = correlation[y_index, x_index]
+    keep = np.abs(pair_correlation) >= min_correlation
+    y_index, x_index, pair_correlation = (
+        y_index[keep],
+        x_index[keep],
+        pair_correlation[keep],
+    )
+    hedge_ratio = gram[y_index, x_index] / gram[x_index, x_index]
+
+    tasks = [(y_index[start:start + chunk_size], x_index[start:start + chunk_size],
+              hedge_ratio[start:start + chunk_size], lags)
+             for start in range(0, len(y_index), max(1, chunk_size))]
+    if n_jobs == 1:
+        _init_worker(p)
+        results = [_scan_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None,
+                                 initializer=_init_worker, initargs=(p,)) as executor:
+            results = list(executor.map(_scan_chunk, tasks))
+    adf_stat = (
+        np.concatenate([result[0] for result in results]) if results else np.empty(0)
+    )
+    gamma = (
+        np.concatenate([result[1] for result in results]) if results else np.empty(0)
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        half_life = np.where(
+            (gamma < 0) & (gamma > -1), -np.log(2.0) / np.log1p(gamma), np.nan
+        )
+    significance = np.full(len(adf_stat), np.nan)
+    for level, critical in reversed(engle_granger_critical_values(n_obs)):
+        significance[adf_stat <= critical] = level
+
+    names = np.array(symbols, dtype=object)
+    ranking = pd.DataFrame(
+        {
+            "y": names[y_index],
+            "x": names[x_index],
+            "correlation": pair_correlation,
+            "hedge_ratio": hedge_ratio,
+            "adf_stat": adf_stat,
+            "half_life": half_life,
+            "significance": significance,
+        }
+    )
+    ranking = ranking.sort_values("adf_stat", kind="mergesort").reset_index(drop=True)
+    return ranking if max_pairs is None else ranking.head(max_pairs)
+
+
+def to_pairs(
+    ranking: pd.DataFrame, significance: float = 0.05, top: Optional[int] = None
+) -> List[Tuple[str, str]]:
+    """
+    Returns the (y, x) pairs of a scan_pairs ranking that are cointegrated at
+    the given significance level, best first, for OLSMRStrategy(pairs=...).
+    """
+    selected = ranking[ranking["significance"] <= significance]
+    if top is not None:
+        selected = selected.head(top)
+    return list(zip(selected["y"], selected["x"]))
@@ -0,0 +1,147 @@
+"""
+Walk-forward retraining of the models of ML strategies.
+
+A strategy declares a cadence and a training window: at every boundary bar
+b = first_bar + k * cadence a new model, fitted on the bars [b - window, b),
+replaces the current one. The swap happens exactly at the boundary whatever
+the speed of the fits, so results are reproducible.
+
+The fits run in a background thread or process pool. Since each training
+window ends before its boundary, the fits of the next boundaries can be
+submitted ahead of time (prefetch) and run while the backtest goes on; the
+event loop only waits if a model is still not ready when its boundary is
+reached.
+"""
+
+from __future__ import print_function
+
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class RetrainScheduler(object):
+    """
+    Schedules the fits of a walk-forward retraining and swaps the fitted
+    models in at their boundary bars.
+    """
+
+    def __init__(
+        self,
+        fit: Callable[..., Any],
+        train_data: Callable[[int, int], Tuple],
+        cadence: int,
+        window: int,
+        first_bar: Optional[int] = None,
+        n_bars: Optional[int] = None,
+        prefetch: int = 2,
+        max_workers: int = 1,
+        use_processes: bool = False,
+    ) -> None:
+        """
+        Parameters:
+        fit - Fits a model, called as fit(*train_data(start, stop)). Must be
+              picklable (module level) with use_processes.
+        train_data - Returns the fit arguments for the bars [start, stop).
+        cadence - Number of bars between two retrainings.
+        window - Number of bars of each training window.
+        first_bar - First boundary, defaults to window.
+        n_bars - Number of bars of the backtest, no fit is scheduled past it.
+        prefetch - Number of boundaries fitted ahead of the current bar.
+        max_workers - Number of threads or processes running the fits.
+        use_processes - Fit in processes instead of threads (for fits holding the GIL).
+        """
+        if cadence < 1 or window < 1:
+            raise ValueError(
+                "cadence and window must be positive, got %s and %s" % (cadence, window)
+            )
+        self.fit: Callable[..., Any] = fit
+        self.train_data: Callable[[int, int], Tuple] = train_data
+        self.cadence: int = cadence
+        self.window: int = window
+        self.first_bar: int = window if first_bar is None else first_bar
+        self.n_bars: Optional[int] = n_bars
+        self.prefetch: int = max(1, prefetch)
+        self.max_workers: int = max_workers
+        self.use_processes: bool = use_processes
+
+        self.executor: Optional[Executor] = None
+        self.pending: Dict[int, Future] = {}
+        self.next_boundary: int = self.first_bar
+        self.next_submit: int = self.first_bar
+        self.model: Any = None
+        self.model_boundary: Optional[int] = None
+        self.fits: int = 0
+        self.wait_time: float = 0.0
+
+    def _submit(self, boundary: int) -> None:
+        if self.executor is None:
+            executor_cls = (
+                ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            )
+            self.executor = executor_cls(max_workers=self.max_workers)
+        args = self.train_data(max(0, boundary - self.window), boundary)
+        self.pending[boundary] = self.executor.submit(self.fit, *args)
+
+    def _fill_pipeline(self, bar: int) -> None:
+        """
+        Submits the fits of the boundaries up to prefetch cadences ahead of bar.
+        """
+        horizon = max(bar, self.next_boundary) + self.prefetch * self.cadence
+        while self.next_submit <= horizon and (
+            self.n_bars is None or self.next_submit < self.n_bars
+        ):
+            self._submit(self.next_submit)
+            self.next_submit += self.cadence
+
+    def update(self, bar: int) -> bool:
+        """
+        Advances to a bar, swapping in the model of the last boundary reached.
+        Returns whether the model changed.
+
+        Parameters:
+        bar - Index of the current bar, from 0.
+        """
+        changed = False
+        while self.next_boundary <= bar:
+            boundary = self.next_boundary
+            if boundary not in self.pending:
+                self._submit(boundary)
+            future = self.pending.pop(boundary)
+            if self.next_boundary + self.cadence <= bar:
+                # Skipped over by a jump of several
+                # boundaries, only the last one matters
+                future.cancel()
+            else:
+                started = time.perf_counter()
+                self.model = future.result()
+                self.wait_time += time.perf_counter() - started
+                self.model_boundary = boundary
+                self.fits += 1
+                changed = True
+            self.next_boundary += self.cadence
+            self.next_submit = max(self.next_submit, self.next_boundary)
+        self._fill_pipeline(bar)
+        return changed
+
+    def boundary_after(self, bar: int) -> int:
+        """
+        Returns the first boundary after bar, the
+        bar up to which the current model is used.
+        """
+        if bar < self.first_bar:
+            return self.first_bar
+        return (
+            self.first_bar + ((bar - self.first_bar) // self.cadence + 1) * self.cadence
+        )
+
+    def close(self) -> None:
+        """
+        Cancels the pending fits and shuts the workers down.
+        """
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
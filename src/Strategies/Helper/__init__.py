@@ -2,6 +2,28 @@
 Helper utilities for trading strategies.
 """
 
-from .CreateLaggedSeries import create_lagged_series
+from .CreateLaggedSeries import create_lagged_series, lagged_features, lagged_returns
+from .HedgeRatio import (
+    create_hedge_ratio_model,
+    RollingOLSHedgeRatio,
+    EWMHedgeRatio,
+    KalmanHedgeRatio,
+)
+from .PairScanner import scan_pairs, to_pairs, price_matrix
+from .ModelCache import ModelCache
+from .RetrainScheduler import RetrainScheduler
 
-__all__ = ['create_lagged_series'] 
\ No newline at end of file
+__all__ = [
+    'create_lagged_series',
+    'lagged_features',
+    'lagged_returns',
+    'create_hedge_ratio_model',
+    'RollingOLSHedgeRatio',
+    'EWMHedgeRatio',
+    'KalmanHedgeRatio',
+    'scan_pairs',
+    'to_pairs',
+    'price_matrix',
+    'ModelCache',
+    'RetrainScheduler'
+]
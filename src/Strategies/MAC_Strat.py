@@ -1,5 +1,9 @@
-from Strategy import Strategy
-from Events import MarketEvent, SignalEvent
+try:
+    from ..Strategy import Strategy
+    from ..Events import MarketEvent, SignalEvent
+except (ImportError, ValueError):
+    from Strategy import Strategy
+    from Events import MarketEvent, SignalEvent
 from typing import Dict, Any, Optional
 import datetime
 import numpy as np
@@ -54,7 +58,7 @@ class MovingAverageCrossOverStrat(Strategy):
                 bars: np.ndarray = self.bars.get_latest_bars_values(symbol, "adj_close", N=self.long_window)
                 bar_datetime: datetime.datetime = self.bars.get_latest_bar_datetime(symbol)
 
-                if bars is not None and bars != []:
+                if bars is not None and len(bars) > 0:
                     short_sma: float = np.mean(bars[-self.short_window:])
                     long_sma: float = np.mean(bars[-self.long_window:])
 
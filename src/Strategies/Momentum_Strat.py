@@ -0,0 +1,72 @@
+try:
+    from ..Strategy import CrossSectionalStrategy
+except (ImportError, ValueError):
+    from Strategy import CrossSectionalStrategy
+from typing import Any, Optional
+import numpy as np
+
+
+class CrossSectionalMomentumStrat(CrossSectionalStrategy):
+    """
+    Cross-sectional momentum: every rebalance, ranks the universe on the
+    return over the lookback period, skipping the most recent bars
+    (short-term reversal), and holds the top fraction with equal weights,
+    shorting the bottom fraction if long_short.
+    """
+
+    def __init__(
+        self,
+        bars: Any,
+        events: Any,
+        lookback: int = 126,
+        skip: int = 21,
+        top_fraction: float = 0.2,
+        long_short: bool = False,
+        rebalance_every: int = 21,
+    ) -> None:
+        """
+        Initialises the momentum strategy.
+
+        Parameters:
+        bars - The DataHandler object that provides bar information
+        events - The Event Queue object.
+        lookback - Number of bars of the momentum return.
+        skip - Number of most recent bars left out of the momentum return.
+        top_fraction - Fraction of the universe held long (and short).
+        long_short - Whether to short the bottom fraction.
+        rebalance_every - Number of bars between two rebalances.
+        """
+        if not 0 <= skip < lookback:
+            raise ValueError("skip must be in [0, lookback), got %s" % skip)
+        super(CrossSectionalMomentumStrat, self).__init__(
+            bars,
+            events,
+            lookback=lookback + 1,
+            fields=["adj_close"],
+            rebalance_every=rebalance_every,
+        )
+        self.skip: int = skip
+        self.top_fraction: float = top_fraction
+        self.long_short: bool = long_short
+
+    def calculate_cross_section(self, panel: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Returns the target weights from the (lookback + 1 x symbols x 1) prices.
+        """
+        prices = panel[:, :, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            momentum = prices[-1 - self.skip] / prices[0] - 1.0
+        valid = np.isfinite(momentum)
+        n_valid = int(valid.sum())
+        n_selected = max(1, int(self.top_fraction * n_valid))
+        if n_valid < (2 * n_selected if self.long_short else n_selected):
+            return None
+
+        # Ranks of the valid symbols, best first, in one argsort
+        order = np.flatnonzero(valid)[np.argsort(-momentum[valid], kind="mergesort")]
+        weights = np.zeros(len(momentum))
+        gross = 2.0 * n_selected if self.long_short else float(n_selected)
+        weights[order[:n_selected]] = 1.0 / gross
+        if self.long_short:
+            weights[order[-n_selected:]] = -1.0 / gross
+        return weights
@@ -1,11 +1,14 @@
 from __future__ import print_function
 
-import datetime
+import numpy as np
 
-import statsmodels.api as sm
-
-from Events import SignalEvent, MarketEvent
-from Strategy import Strategy
+try:
+    from ..Events import SignalEvent, MarketEvent
+    from ..Strategy import Strategy
+except (ImportError, ValueError):
+    from Events import SignalEvent, MarketEvent
+    from Strategy import Strategy
+from .Helper.HedgeRatio import create_hedge_ratio_model
 
 
 class OLSMRStrategy(Strategy):
@@ -17,14 +20,27 @@ class OLSMRStrategy(Strategy):
     (defaulting to [0.5, 3.0]) then a long/short signal pair are generated
     (for the high threshold) or an exit signal pair are generated (for the
     low threshold).
+
+    The regression sums are maintained incrementally (see HedgeRatio), so
+    each bar costs O(1) per pair, and any number of pairs is traded as one
+    vectorized batch. The hedge ratio can also be exponentially weighted
+    ('ewm') or estimated with a Kalman filter ('kalman').
     """
 
-    def __init__(self, bars, events, ols_window=50, zscore_low=0.5, zscore_high=3.0):
+    def __init__(self, bars, events, ols_window=50, zscore_low=0.5, zscore_high=3.0,
+                 pairs=None, hedge_ratio_mode="ols", hedge_ratio_params=None):
         """
         Initialises the stat arb strategy.
         Parameters:
         bars - The DataHandler object that provides bar information
         events - The Event Queue object.
+        ols_window - Number of bars of the rolling regression ('ols' mode).
+        zscore_low - Absolute z-score below which the positions are exited.
+        zscore_high - Absolute z-score above which the positions are entered.
+        pairs - List of (y, x) symbol tuples, defaults
+                to the two symbols of the symbol list.
+        hedge_ratio_mode - 'ols', 'ewm' or 'kalman'.
+        hedge_ratio_params - Keyword arguments of the hedge ratio model.
         """
         self.bars = bars
         self.symbol_list = self.bars.symbol_list
@@ -32,85 +48,117 @@ class OLSMRStrategy(Strategy):
         self.ols_window = ols_window
         self.zscore_low = zscore_low
         self.zscore_high = zscore_high
-        self.pair = tuple(self.symbol_list)
-        self.datetime = datetime.datetime.utcnow()
-        self.long_market = False
-        self.short_market = False
+        self.pairs = (
+            [tuple(pair) for pair in pairs]
+            if pairs is not None
+            else [tuple(self.symbol_list)]
+        )
+        self.pair = self.pairs[0]
+
+        # Each symbol is read once per bar, the pairs index into the latest prices
+        self.symbols = sorted({symbol for pair in self.pairs for symbol in pair})
+        position = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.y_index = np.array(
+            [position[pair[0]] for pair in self.pairs], dtype=np.intp
+        )
+        self.x_index = np.array(
+            [position[pair[1]] for pair in self.pairs], dtype=np.intp
+        )
+
+        params = dict(hedge_ratio_params or {})
+        if hedge_ratio_mode == "ols":
+            params.setdefault("window", ols_window)
+        self.model = create_hedge_ratio_model(
+            hedge_ratio_mode, len(self.pairs), **params
+        )
+        self.hedge_ratios = np.full(len(self.pairs), np.nan)
+        self.long_market = np.zeros(len(self.pairs), dtype=bool)
+        self.short_market = np.zeros(len(self.pairs), dtype=bool)
+
+    @property
+    def hedge_ratio(self):
+        """
+        Hedge ratio of the first pair.
+        """
+        return self.hedge_ratios[0]
 
-    def calculate_xy_signals(self, zscore_last):
+    def calculate_xy_signals(self, zscores):
         """
         Calculates the actual x, y signal pairings
         to be sent to the signal generator.
         Parameters
-        zscore_last - The current zscore to test against
+        zscores - The current zscore of each pair to test against
+        Returns:
+        A list of (y_signal, x_signal) tuples of the pairs with a new signal.
         """
-        y_signal = None
-        x_signal = None
-        p0 = self.pair[0]
-        p1 = self.pair[1]
-        dt = self.datetime
-        hr = abs(self.hedge_ratio)
-
-        # If we’re long the market and below the
+        # Action per pair: 0 none, 1 enter long, 2 exit, 3 enter short.
+        # As in the sequential rules, the last rule matching a pair wins.
+        action = np.zeros(len(zscores), dtype=np.int8)
+        near_mean = np.abs(zscores) <= self.zscore_low
+
+        # If we’re not long the market and below the
         # negative of the high zscore threshold
-        if zscore_last <= -self.zscore_high and not self.long_market:
-            self.long_market = True
-            y_signal = SignalEvent(p0, dt, 'LONG', 1.0)
-            x_signal = SignalEvent(p1, dt, 'SHORT', hr)
+        enter_long = (zscores <= -self.zscore_high) & ~self.long_market
+        self.long_market |= enter_long
+        action[enter_long] = 1
 
         # If we’re long the market and between the
         # absolute value of the low zscore threshold
-        if abs(zscore_last) <= self.zscore_low and self.long_market:
-            self.long_market = False
-            y_signal = SignalEvent(p0, dt, 'EXIT', 1.0)
-            x_signal = SignalEvent(p1, dt, 'EXIT', 1.0)
+        exit_long = near_mean & self.long_market
+        self.long_market &= ~exit_long
+        action[exit_long] = 2
 
-        # If we’re short the market and above
+        # If we’re not short the market and above
         # the high zscore threshold
-        if zscore_last >= self.zscore_high and not self.short_market:
-            self.short_market = True
-            y_signal = SignalEvent(p0, dt, 'SHORT', 1.0)
-            x_signal = SignalEvent(p1, dt, 'LONG', hr)
+        enter_short = (zscores >= self.zscore_high) & ~self.short_market
+        self.short_market |= enter_short
+        action[enter_short] = 3
 
         # If we’re short the market and between the
         # absolute value of the low zscore threshold
-        if abs(zscore_last) <= self.zscore_low and self.short_market:
-            self.short_market = False
-            y_signal = SignalEvent(p0, dt, 'EXIT', 1.0)
-            x_signal = SignalEvent(p1, dt, 'EXIT', 1.0)
-
-        return y_signal, x_signal
+        exit_short = near_mean & self.short_market
+        self.short_market &= ~exit_short
+        action[exit_short] = 2
+
+        signals = []
+        for i in np.flatnonzero(action):
+            p0, p1 = self.pairs[i]
+            dt = self.bars.get_latest_bar_datetime(p0)
+            hr = abs(self.hedge_ratios[i])
+            if action[i] == 1:
+                signals.append((SignalEvent(p0, dt, 'LONG', 1.0),
+                                SignalEvent(p1, dt, 'SHORT', hr)))
+            elif action[i] == 3:
+                signals.append((SignalEvent(p0, dt, 'SHORT', 1.0),
+                                SignalEvent(p1, dt, 'LONG', hr)))
+            else:
+                signals.append((SignalEvent(p0, dt, 'EXIT', 1.0),
+                                SignalEvent(p1, dt, 'EXIT', 1.0)))
+        return signals
 
     def calculate_signals(self, event):
         """
         Generates a new set of signals based on the mean reversion
         strategy.
-        Calculates the hedge ratio between the pair of tickers.
-        We use OLS for this, although we should ideally use CADF.
+        Updates the hedge ratio between each pair of tickers with
+        the latest bar, then tests the z-score of the spread.
         """
 
         if isinstance(event, MarketEvent):
-            # Obtain the latest window of values for each
-            # component of the pair of tickers
-            y = self.bars.get_latest_bars_values(
-                self.pair[0], "close", N=self.ols_window
+            prices = np.array(
+                [
+                    self.bars.get_latest_bar_value(symbol, "close")
+                    for symbol in self.symbols
+                ],
+                dtype=np.float64,
             )
-            x = self.bars.get_latest_bars_values(
-                self.pair[1], "close", N=self.ols_window
+            # Pairs with a missing price skip the bar, with a NaN z-score
+            self.hedge_ratios, zscores = self.model.update(
+                prices[self.x_index], prices[self.y_index]
             )
+            zscores = np.where(np.isfinite(zscores), zscores, np.nan)
 
-            if y is not None and x is not None:
-                # Check that all window periods are available
-                if len(y) >= self.ols_window and len(x) >= self.ols_window:
-                    # Calculate the current hedge ratio using OLS
-                    self.hedge_ratio = sm.OLS(y, x).fit().params[0]
-
-                    # Calculate the current z-score of the residuals
-                    spread = y - self.hedge_ratio * x
-                    zscore_last = ((spread - spread.mean()) / spread.std())[-1]
-
-                    # Calculate signals and add to events queue
-                    y_signal, x_signal = self.calculate_xy_signals(zscore_last)
-                    if y_signal is not None and x_signal is not None:
-                        self.events.put(y_signal)
-                        self.events.put(x_signal)
+            # Calculate signals and add to events queue
+            for y_signal, x_signal in self.calculate_xy_signals(zscores):
+                self.events.put(y_signal)
+                self.events.put(x_signal)
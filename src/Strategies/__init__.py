@@ -2,14 +2,32 @@
 Trading Strategies Package
 
 Contains various trading strategy implementations for the backtester.
+Each strategy module is imported on first access (PEP 562), so that the
+dependencies of one strategy (e.g. sklearn) are not paid by the others.
 """
 
-from .Buy_And_Hold_Strat import BuyAndHoldStrat
-from .MAC_Strat import MovingAverageCrossOverStrat
-from .ETF_Forecast import ETFDailyForecastStrategy
+import importlib
+from typing import Any, Dict, List
 
-__all__ = [
-    'BuyAndHoldStrat',
-    'MovingAverageCrossOverStrat', 
-    'ETFDailyForecastStrategy'
-]
\ No newline at end of file
+# Exported name -> module defining it
+_EXPORTS: Dict[str, str] = {
+    'BuyAndHoldStrat': 'Buy_And_Hold_Strat',
+    'MovingAverageCrossOverStrat': 'MAC_Strat',
+    'ETFDailyForecastStrategy': 'ETF_Forecast',
+    'CrossSectionalMomentumStrat': 'Momentum_Strat',
+    'OLSMRStrategy': 'OLS_MR_Strategy'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,5 +1,12 @@
 from abc import ABCMeta, abstractmethod
-from typing import Any
+from typing import Any, List, Optional
+
+import numpy as np
+
+try:
+    from .Events import SignalEvent, TargetWeightEvent
+except ImportError:
+    from Events import SignalEvent, TargetWeightEvent
 
 
 class Strategy(object):
@@ -17,3 +24,139 @@ class Strategy(object):
         Provides the mechanisms to calculate the list of signals.
         """
         raise NotImplementedError("Should implement calculate_signals()")
+
+    def on_forced_exit(self, symbol: str, reason: str) -> None:
+        """
+        Called when the risk manager exits a position on its own (stop
+        loss, take profit). Strategies tracking their positions override it
+        to mark the symbol flat; the default keeps the state as it is.
+
+        Parameters:
+        symbol - The symbol whose position is closed.
+        reason - "stop loss" or "take profit".
+        """
+        pass
+
+    def finish(self) -> None:
+        """
+        Called by the backtest at the end of the run, also when it fails.
+        Strategies with background workers stop them here.
+        """
+        pass
+
+
+class CrossSectionalStrategy(Strategy):
+    """
+    CrossSectionalStrategy is an abstract base class for the strategies
+    deciding on the whole universe at once (ranking, momentum, etc).
+    Instead of querying each symbol, calculate_cross_section receives the
+    last lookback bars of every symbol as one (lookback x symbols x fields)
+    array and returns one value per symbol, which is turned into events in
+    bulk: a TargetWeightEvent for output "weights", or SignalEvents for the
+    symbols whose position changed for output "signals" (1 long, -1 short,
+    0 exit). The Portfolio only enters a position from flat, so a reversal
+    is an EXIT, then the entry of the other side on the next bar once the
+    EXIT had a bar to fill.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(
+        self,
+        bars: Any,
+        events: Any,
+        lookback: int = 1,
+        fields: Optional[List[str]] = None,
+        rebalance_every: int = 1,
+        output: str = "weights",
+    ) -> None:
+        """
+        Parameters:
+        bars - The DataHandler object that provides bar information
+        events - The Event Queue object.
+        lookback - Number of bars passed to calculate_cross_section.
+        fields - Bar values passed to calculate_cross_section,
+                 defaults to ["adj_close"].
+        rebalance_every - Number of bars between two calls of calculate_cross_section.
+        output - "weights" (target weights of the equity)
+                 or "signals" (1, -1 or 0 per symbol).
+        """
+        if output not in ("weights", "signals"):
+            raise ValueError(
+                "Unknown output: %s. Available: ['weights', 'signals']" % output
+            )
+        self.bars: Any = bars
+        self.symbol_list: List[str] = self.bars.symbol_list
+        self.events: Any = events
+        self.lookback: int = lookback
+        self.fields: List[str] = ["adj_close"] if fields is None else list(fields)
+        self.rebalance_every: int = rebalance_every
+        self.output: str = output
+        self.bar_index: int = 0
+        self.positions: np.ndarray = np.zeros(len(self.symbol_list))
+        # Side of the reversals entered on the next bar, 0 for none
+        self.entries: np.ndarray = np.zeros(len(self.symbol_list))
+
+    @abstractmethod
+    def calculate_cross_section(self, panel: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Computes the target of every symbol for the bar.
+
+        Parameters:
+        panel - The last lookback bars as a read-only
+                (lookback x symbols x fields) array.
+        Returns:
+        An array with one value per symbol of symbol_list (NaN leaves a
+        symbol untouched), or None for no change.
+        """
+        raise NotImplementedError("Should implement calculate_cross_section()")
+
+    def on_forced_exit(self, symbol: str, reason: str) -> None:
+        """
+        Marks the symbol flat, the next rebalance enters it again if its
+        target is still long or short.
+        """
+        self.positions[self.symbol_list.index(symbol)] = 0.0
+
+    def calculate_signals(self, event: Any) -> None:
+        """
+        Calls calculate_cross_section on the rebalancing bars once lookback
+        bars are available, and puts the resulting events on the queue.
+        """
+        if event.type != "MARKET":
+            return
+        self.bar_index += 1
+        if self.entries.any():
+            dt = self.bars.get_latest_bar_datetime(self.symbol_list[0])
+            for i in np.flatnonzero(self.entries):
+                signal_type = "LONG" if self.entries[i] > 0 else "SHORT"
+                self.events.put(SignalEvent(self.symbol_list[i], dt, signal_type, 1.0))
+            self.positions = np.where(self.entries != 0, self.entries, self.positions)
+            self.entries[:] = 0.0
+        if (self.bar_index - self.lookback) % self.rebalance_every != 0:
+            return
+        panel = self.bars.get_latest_bars_panel(self.fields, self.lookback)
+        if panel.shape[0] < self.lookback:
+            return
+
+        values = self.calculate_cross_section(panel)
+        if values is None:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        dt = self.bars.get_latest_bar_datetime(self.symbol_list[0])
+        if self.output == "weights":
+            self.events.put(TargetWeightEvent(dt, values))
+            return
+
+        targets = np.where(np.isfinite(values), np.sign(values), self.positions)
+        for i in np.flatnonzero(targets != self.positions):
+            if self.positions[i] != 0:
+                self.events.put(SignalEvent(self.symbol_list[i], dt, "EXIT", 1.0))
+                if targets[i] != 0:
+                    # Reversal: flat until the entry of the next bar
+                    self.entries[i] = targets[i]
+                    targets[i] = 0.0
+            else:
+                signal_type = "LONG" if targets[i] > 0 else "SHORT"
+                self.events.put(SignalEvent(self.symbol_list[i], dt, signal_type, 1.0))
+        self.positions = targets
@@ -2,30 +2,66 @@
 Event-Driven Backtester Package
 
 A comprehensive backtesting framework for quantitative trading strategies.
+
+The components are imported on first access (PEP 562), so that importing the
+package, e.g. by a short lived sweep worker, only pays for the modules it uses.
 """
 
+import importlib
+from typing import Any, Dict, List
+
 __version__ = "1.0.0"
 __author__ = "Event-Driven Backtester Team"
 
-from .DataHandler import YahooDataHandler, HistoricCSVDataHandler
-from .Events import MarketEvent, SignalEvent, OrderEvent, FillEvent
-from .Strategy import Strategy
-from .Portfolio import Portfolio
-from .Execution import SimpleSimulatedExecutionHandler
-from .Performance import create_sharpe_ratio, create_drawdowns
-from .BacktesterLoop import Backtest
-
-__all__ = [
-    'YahooDataHandler',
-    'HistoricCSVDataHandler', 
-    'MarketEvent',
-    'SignalEvent',
-    'OrderEvent',
-    'FillEvent',
-    'Strategy',
-    'Portfolio',
-    'SimpleSimulatedExecutionHandler',
-    'create_sharpe_ratio',
-    'create_drawdowns',
-    'Backtest'
-] 
\ No newline at end of file
+# Exported name -> module defining it
+_EXPORTS: Dict[str, str] = {
+    'YahooDataHandler': 'DataHandler',
+    'HistoricCSVDataHandler': 'DataHandler',
+    'MarketEvent': 'Events',
+    'SignalEvent': 'Events',
+    'TargetWeightEvent': 'Events',
+    'OrderEvent': 'Events',
+    'OrderBatchEvent': 'Events',
+    'CancelOrderEvent': 'Events',
+    'FillEvent': 'Events',
+    'Strategy': 'Strategy',
+    'CrossSectionalStrategy': 'Strategy',
+    'Portfolio': 'Portfolio',
+    'SimpleSimulatedExecutionHandler': 'Execution',
+    'SimulatedExecutionHandler': 'Execution',
+    'SocketExecutionHandler': 'Broker',
+    'SimulatedBroker': 'Broker',
+    'create_sharpe_ratio': 'Performance',
+    'create_drawdowns': 'Performance',
+    'create_drawdown_arrays': 'Performance',
+    'compute_metrics': 'Analytics',
+    'compute_rolling_metrics': 'Analytics',
+    'bootstrap_confidence_intervals': 'Bootstrap',
+    'probabilistic_sharpe_ratio': 'Bootstrap',
+    'deflated_sharpe_ratio': 'Bootstrap',
+    'compute_benchmark_metrics': 'BenchmarkAnalytics',
+    'compute_rolling_benchmark_metrics': 'BenchmarkAnalytics',
+    'RiskManagement': 'RiskManagement',
+    'EWMACovariance': 'RiskManagement',
+    'StatisticalFactorModel': 'RiskManagement',
+    'ValueAtRisk': 'RiskManagement',
+    'KellySizer': 'PositionSizing',
+    'MeanVarianceSizer': 'PositionSizing',
+    'Backtest': 'BacktesterLoop',
+    'STRATEGIES': 'Registry',
+    'DATA_HANDLERS': 'Registry'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import numpy as np
+
+from src.Events import FillEvent, OrderEvent
+
+
+class FakeBars(object):
+    """
+    DataHandler stand-in holding the bars set by the tests. A bar maps each
+    symbol to a price (every field of the bar is that price) or to a dict of
+    field values, e.g. {"open": 99.0, "adj_close": 100.0}.
+    """
+
+    def __init__(self, bar, dt=datetime(2020, 1, 2)):
+        self.symbol_list = list(bar)
+        self.history = [dict(bar)]
+        self.datetime = dt
+
+    def next_bar(self, bar):
+        """
+        Adds a bar, as a dict or as values aligned with symbol_list.
+        """
+        if not isinstance(bar, dict):
+            bar = dict(zip(self.symbol_list, bar))
+        self.history.append(dict(self.history[-1], **bar))
+
+    @staticmethod
+    def _value(value, val_type):
+        return value[val_type] if isinstance(value, dict) else value
+
+    def get_latest_bar_value(self, symbol, val_type):
+        return self._value(self.history[-1][symbol], val_type)
+
+    def get_latest_bar_datetime(self, symbol):
+        return self.datetime
+
+    def get_latest_bars_panel(self, fields, n):
+        return np.array([[[self._value(bar[symbol], field) for field in fields]
+                          for symbol in self.symbol_list]
+                         for bar in self.history[-n:]], dtype=np.float64)
+
+
+class FakePortfolio(object):
+    """
+    Positions and exposures as maintained by the Portfolio.
+    """
+
+    def __init__(self, bars, equity=100000.0):
+        self.bars = bars
+        self.position_vector = np.zeros(len(bars.symbol_list))
+        self.all_holdings = [{"total": equity}]
+
+    def _prices(self):
+        return self.bars.get_latest_bars_panel(["adj_close"], 1)[-1, :, 0]
+
+    @property
+    def gross_exposure(self):
+        return float(np.abs(self.position_vector * self._prices()).sum())
+
+    @property
+    def net_exposure(self):
+        return float((self.position_vector * self._prices()).sum())
+
+    def trade(self, risk, symbol, quantity, direction, price):
+        """
+        An order accepted by the risk gate, then filled.
+        """
+        assert risk.check_order(OrderEvent(symbol, "MKT", quantity, direction))
+        i = self.bars.symbol_list.index(symbol)
+        self.position_vector[i] += quantity if direction == "BUY" else -quantity
+        fill = FillEvent(self.bars.datetime, symbol, "TEST", quantity, direction, price)
+        risk.update_fill(fill)
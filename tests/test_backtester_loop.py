@@ -0,0 +1,78 @@
+import contextlib
+import io
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.BacktesterLoop import Backtest
+from src.DataHandler import FRAME_CACHE, HistoricCSVDataHandler
+from src.Events import FillEvent
+from src.Execution import ExecutionHandler
+from src.Portfolio import Portfolio
+from src.ResultWriter import create_result_writer
+from src.RiskManagement import RiskManagement
+from src.Strategies.Buy_And_Hold_Strat import BuyAndHoldStrat
+
+
+class DeferredExecutionHandler(ExecutionHandler):
+    """
+    Holds the orders like a broker would, filling them only in finish().
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.pending = []
+        self.finished = False
+
+    def execute_order(self, event):
+        self.pending.append(event)
+
+    def finish(self):
+        for order in self.pending:
+            self.events.put(FillEvent(datetime(2016, 4, 1), order.symbol, "TEST",
+                                      order.quantity, order.direction, 10.0))
+        self.pending = []
+        self.finished = True
+
+
+def run_backtest(tmp_path, execution_handler, price=10.0, **params):
+    FRAME_CACHE.clear()
+    dates = pd.bdate_range("2016-01-04", "2016-03-31")
+    prices = np.linspace(price, 1.1 * price, len(dates))
+    pd.DataFrame({
+        "Date": dates.strftime("%d/%m/%Y"), "Open": prices, "High": prices,
+        "Low": prices, "Close": prices, "Adj Close": prices, "Volume": 1000.0
+    }).to_csv(tmp_path / "XYZ.csv", index=False)
+    backtest = Backtest(str(tmp_path), ["XYZ"], 100000.0, 0.0, datetime(2016, 1, 1),
+                        datetime(2016, 4, 1), "1d", HistoricCSVDataHandler,
+                        execution_handler, Portfolio, BuyAndHoldStrat,
+                        result_writer=create_result_writer(str(tmp_path), "run"),
+                        **params)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        backtest.simulate_trading()
+    backtest.output = output.getvalue()
+    return backtest
+
+
+# Nothing is filled before the end: the equity is flat and its Sharpe ratio undefined
+@pytest.mark.filterwarnings("ignore:invalid value encountered:RuntimeWarning")
+def test_fills_returned_by_finish_reach_the_portfolio(tmp_path):
+    backtest = run_backtest(tmp_path, DeferredExecutionHandler)
+    assert backtest.execution_handler.finished
+    assert backtest.fills == 1
+    assert backtest.portfolio.current_positions["XYZ"] == 100
+    assert len(backtest.portfolio.all_fills) == 1
+
+
+@pytest.mark.filterwarnings("ignore:invalid value encountered:RuntimeWarning")
+def test_rejected_orders_are_reported(tmp_path):
+    # 100 shares at 200.0 are 20% of the equity, over the 10% position limit
+    backtest = run_backtest(tmp_path, DeferredExecutionHandler, price=200.0,
+                            risk_manager=RiskManagement,
+                            risk_params={"risk_model": None, "var_every": 0,
+                                         "max_position_size": 0.1})
+    assert (backtest.orders, backtest.fills) == (1, 0)
+    assert "Rejected orders: 1 {'position size': 1}" in backtest.output
@@ -0,0 +1,76 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Bootstrap import (
+    EULER_GAMMA,
+    bootstrap_confidence_intervals,
+    deflated_sharpe_ratio,
+    probabilistic_sharpe_ratio,
+)
+
+
+def sweep_returns(n_bars=500, n_runs=8, seed=0):
+    rng = np.random.default_rng(seed)
+    drift = np.linspace(0.0, 0.001, n_runs)
+    returns = rng.standard_t(5, (n_bars, n_runs)) * 0.01 + drift
+    return pd.DataFrame(returns, columns=["run%d" % i for i in range(n_runs)])
+
+
+def reference_psr(r, benchmark):
+    """
+    Probabilistic Sharpe ratio of one series (Bailey & Lopez de Prado),
+    from the population moments.
+    """
+    n = len(r)
+    sharpe = r.mean() / r.std()
+    skew = ((r - r.mean()) ** 3).mean() / r.std() ** 3
+    kurtosis = ((r - r.mean()) ** 4).mean() / r.std() ** 4
+    z = (sharpe - benchmark) * math.sqrt(n - 1) / math.sqrt(
+        1.0 - skew * sharpe + (kurtosis - 1.0) / 4.0 * sharpe ** 2)
+    return NormalDist().cdf(z)
+
+
+def test_psr_matches_the_reference_for_a_run_and_a_batch():
+    returns = sweep_returns()
+    psr = probabilistic_sharpe_ratio(returns, benchmark_sharpe=0.5)
+    for column in returns.columns:
+        r = returns[column].values
+        expected = reference_psr(r, 0.5 / math.sqrt(252))
+        assert psr[column] == pytest.approx(expected, rel=1e-12)
+        # The same value whether the run is alone or in the batch
+        assert probabilistic_sharpe_ratio(r[:, np.newaxis], 0.5)[0] == psr[column]
+
+
+def test_dsr_benchmarks_the_expected_maximum_sharpe():
+    returns = sweep_returns()
+    dsr = deflated_sharpe_ratio(returns)
+    sharpes = (returns.mean() / returns.std(ddof=0)).values
+    trials = len(sharpes)
+    normal = NormalDist()
+    expected_max = np.std(sharpes, ddof=1) * (
+        (1.0 - EULER_GAMMA) * normal.inv_cdf(1.0 - 1.0 / trials)
+        + EULER_GAMMA * normal.inv_cdf(1.0 - 1.0 / (trials * math.e)))
+    for column in returns.columns:
+        expected = reference_psr(returns[column].values, expected_max)
+        assert dsr[column] == pytest.approx(expected, rel=1e-12)
+    # A single trial is not deflated
+    psr = probabilistic_sharpe_ratio(returns)
+    np.testing.assert_allclose(deflated_sharpe_ratio(returns, n_trials=1), psr)
+
+
+def test_bootstrap_intervals_are_reproducible():
+    returns = sweep_returns(300, 4)
+    intervals = bootstrap_confidence_intervals(returns, n_resamples=200, seed=7,
+                                               batch_size=50)
+    assert list(intervals.index) == list(returns.columns)
+    assert (intervals["sharpe_lower"] < intervals["sharpe"]).all()
+    assert (intervals["sharpe"] < intervals["sharpe_upper"]).all()
+    assert (intervals["max_drawdown_lower"] <= intervals["max_drawdown_upper"]).all()
+    # The resamples only depend on the seed and the batches, not on the workers
+    parallel = bootstrap_confidence_intervals(returns, n_resamples=200, seed=7,
+                                              batch_size=50, n_jobs=2)
+    pd.testing.assert_frame_equal(intervals, parallel)
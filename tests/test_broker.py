@@ -0,0 +1,53 @@
+import json
+import queue
+import socket
+import threading
+
+from src.Broker import SimulatedBroker, SocketExecutionHandler
+from src.Events import OrderEvent
+from tests.conftest import FakeBars
+
+
+def order_line(order_id):
+    return json.dumps({"msg": "order", "id": order_id, "symbol": "AAA", "quantity": 1,
+                       "direction": "BUY", "order_type": "MKT", "price": 10.0})
+
+
+def test_slow_client_does_not_hold_up_the_broker():
+    broker = SimulatedBroker(network_latency=0.0, exchange_latency=0.0)
+    thread = threading.Thread(target=broker.serve_forever, daemon=True)
+    thread.start()
+    # A client sending a burst of orders and never reading the replies
+    slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    slow.connect(("127.0.0.1", broker.port))
+    lines = [json.dumps({"msg": "hello", "client_id": "slow"})]
+    lines += [order_line(i) for i in range(50000)]
+    slow.sendall(("\n".join(lines) + "\n").encode())
+
+    events = queue.Queue()
+    handler = SocketExecutionHandler(events, FakeBars({"AAA": 10.0}), port=broker.port)
+    handler.execute_order(OrderEvent("AAA", "MKT", 10, "BUY"))
+    assert handler.wait_for_fills(timeout=5.0)
+    fill = events.get(False)
+    assert (fill.symbol, fill.quantity, fill.direction) == ("AAA", 10, "BUY")
+
+    stats = handler.finish()
+    assert stats["orders_in_flight"] == 0 and "fill_p50_ms" in stats
+    broker.running = False
+    slow.close()
+    thread.join(timeout=5.0)
+
+
+def test_finish_returns_the_latencies_of_a_local_broker():
+    events = queue.Queue()
+    handler = SocketExecutionHandler(events, FakeBars({"AAA": 10.0}),
+                                     network_latency=0.0005, exchange_latency=0.001)
+    for _ in range(5):
+        handler.execute_order(OrderEvent("AAA", "MKT", 1, "SELL"))
+    stats = handler.finish()
+    assert events.qsize() == 5
+    assert stats["orders_in_flight"] == 0 and stats["reconnections"] == 0
+    # Fills come a round trip and the exchange latency after the orders
+    assert stats["fill_mean_ms"] >= 2.0 and stats["ack_mean_ms"] >= 1.0
+    assert handler.broker_process is None
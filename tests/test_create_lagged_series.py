@@ -0,0 +1,70 @@
+import queue
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.DataHandler import FRAME_CACHE, HistoricCSVDataHandler
+from src.Strategies.Helper.CreateLaggedSeries import (
+    _handler_prices,
+    create_lagged_series,
+)
+
+
+def write_csv(directory, symbol, date_format):
+    # Business days of 2016, the first bar is Monday 2016-01-04 (1 Jan is a holiday)
+    dates = pd.bdate_range("2016-01-04", "2016-12-30")
+    returns = np.random.default_rng(0).normal(0.0, 0.01, len(dates))
+    prices = 100.0 * np.cumprod(1.0 + returns)
+    frame = pd.DataFrame({
+        "Date": dates.strftime(date_format), "Open": prices, "High": prices,
+        "Low": prices, "Close": prices, "Adj Close": prices, "Volume": 1000.0
+    })
+    frame.to_csv(directory / ("%s.csv" % symbol), index=False)
+    return dates
+
+
+@pytest.fixture
+def csv_handler(tmp_path):
+    def create(date_format):
+        FRAME_CACHE.clear()
+        dates = write_csv(tmp_path, "XYZ", date_format)
+        return HistoricCSVDataHandler(queue.Queue(), str(tmp_path), ["XYZ"]), dates
+    return create
+
+
+@pytest.mark.parametrize("date_format", ["%d/%m/%Y", "%Y-%m-%d"])
+def test_handler_prices_parses_csv_dates(csv_handler, date_format):
+    bars, dates = csv_handler(date_format)
+    # The range starts on a holiday, before the first bar
+    loaded = _handler_prices(
+        bars, "XYZ", datetime(2016, 1, 1), datetime(2017, 1, 1)
+    )
+    assert loaded is not None
+    index, prices, volume = loaded
+    assert index[0] == dates[0] and index[-1] == dates[-1]
+    assert len(prices) == len(volume) == len(dates)
+
+
+def test_handler_prices_range_not_covered(csv_handler):
+    bars, _ = csv_handler("%d/%m/%Y")
+    # A week of slack at both ends, not more
+    for symbol, start, end in (("XYZ", datetime(2015, 12, 1), datetime(2017, 1, 1)),
+                               ("XYZ", datetime(2016, 1, 1), datetime(2017, 2, 1)),
+                               ("ABC", datetime(2016, 1, 1), datetime(2017, 1, 1))):
+        assert _handler_prices(bars, symbol, start, end) is None
+
+
+def test_create_lagged_series_uses_handler_data(csv_handler, monkeypatch):
+    bars, dates = csv_handler("%d/%m/%Y")
+    # Importing yfinance fails: the series must come from the handler
+    monkeypatch.setitem(sys.modules, "yfinance", None)
+    series = create_lagged_series(
+        "XYZ", datetime(2016, 1, 1), datetime(2017, 1, 1), "1d", lags=5, bars=bars
+    )
+    assert len(series) == len(dates)
+    assert list(series.columns) == [
+        "Volume", "Today", "Lag1", "Lag2", "Lag3", "Lag4", "Lag5", "Direction"
+    ]
@@ -0,0 +1,81 @@
+import queue
+
+import pytest
+
+from src.Events import FillEvent, MarketEvent, OrderEvent
+from src.Execution import SimulatedExecutionHandler
+from src.FillModels import FixedBpsSlippage, FixedSpread, VolumeParticipationSlippage
+from src.Portfolio import Portfolio
+from tests.conftest import FakeBars
+
+
+def bar(open_, close, adj_close=None, volume=1e6):
+    return {"open": open_, "high": max(open_, close), "low": min(open_, close),
+            "close": close, "adj_close": close if adj_close is None else adj_close,
+            "volume": volume}
+
+
+def fills_of(events):
+    fills = []
+    while not events.empty():
+        fills.append(events.get(False))
+    return [(f.symbol, f.direction, f.quantity, f.fill_cost) for f in fills]
+
+
+def test_fill_at_close_pays_spread_and_slippage():
+    events = queue.Queue()
+    bars = FakeBars({"AAA": bar(99.0, 100.0), "BBB": bar(51.0, 50.0)})
+    handler = SimulatedExecutionHandler(events, bars, FixedBpsSlippage(5.0),
+                                        FixedSpread(10.0), latency_bars=0)
+    handler.execute_orders([OrderEvent("AAA", "MKT", 10, "BUY"),
+                            OrderEvent("BBB", "MKT", 20, "SELL")])
+    # Half the 10bps spread and 5bps of slippage, against the order
+    assert fills_of(events) == [("AAA", "BUY", 10, pytest.approx(100.0 * 1.001)),
+                                ("BBB", "SELL", 20, pytest.approx(50.0 * 0.999))]
+
+
+def test_fill_at_next_open_adjusted():
+    events = queue.Queue()
+    bars = FakeBars({"AAA": bar(99.0, 100.0)})
+    handler = SimulatedExecutionHandler(events, bars, spread_model=FixedSpread(0.0),
+                                        latency_bars=1)
+    handler.execute_order(OrderEvent("AAA", "MKT", 10, "BUY"))
+    assert events.empty()
+    # Next bar, with a 2:1 adjustment of the prices (adj_close / close = 0.5)
+    bars.next_bar({"AAA": bar(102.0, 104.0, adj_close=52.0)})
+    handler.on_market(MarketEvent())
+    assert fills_of(events) == [("AAA", "BUY", 10, pytest.approx(51.0))]
+
+
+def test_fills_capped_by_volume():
+    events = queue.Queue()
+    bars = FakeBars({"AAA": bar(10.0, 10.0, volume=1000.0)})
+    handler = SimulatedExecutionHandler(events, bars, VolumeParticipationSlippage(0.1),
+                                        FixedSpread(0.0), latency_bars=0,
+                                        max_volume_participation=0.1)
+    handler.execute_orders([OrderEvent("AAA", "MKT", 80, "BUY"),
+                            OrderEvent("AAA", "MKT", 50, "BUY")])
+    # 100 shares for the bar, in order of arrival; impact 0.1 * participation^2
+    assert fills_of(events) == [
+        ("AAA", "BUY", 80, pytest.approx(10.0 * (1 + 0.1 * 0.08 ** 2))),
+        ("AAA", "BUY", 20, pytest.approx(10.0 * (1 + 0.1 * 0.02 ** 2))),
+    ]
+    # The remainder fills on the next bar
+    handler.on_market(MarketEvent())
+    assert [fill[:3] for fill in fills_of(events)] == [("AAA", "BUY", 30)]
+
+
+def test_portfolio_books_fill_cost():
+    bars = FakeBars({"AAA": bar(10.0, 10.0)})
+    portfolio = Portfolio(bars, queue.Queue(), bars.datetime, 100000.0)
+
+    def fill(direction, fill_cost):
+        return FillEvent(bars.datetime, "AAA", "TEST", 100, direction, fill_cost, 1.0)
+
+    portfolio.update_fill(fill("BUY", 10.5))
+    assert portfolio.current_holdings["AAA"] == pytest.approx(1050.0)
+    assert portfolio.current_holdings["cash"] == pytest.approx(100000.0 - 1050.0 - 1.0)
+    # Without a fill price, the fill is booked at the market price
+    portfolio.update_fill(fill("SELL", float("nan")))
+    assert portfolio.current_holdings["AAA"] == pytest.approx(50.0)
+    assert portfolio.all_fills[-1]["fill_cost"] == 10.0
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from src.Strategies.Helper.HedgeRatio import HEDGE_RATIO_MODES, create_hedge_ratio_model
+
+
+def random_pairs(n_bars, n_pairs, seed=0):
+    """
+    Prices of the x legs as random walks, the y legs cointegrated with them.
+    """
+    rng = np.random.default_rng(seed)
+    x = 50.0 + np.cumsum(rng.normal(0.0, 1.0, (n_bars, n_pairs)), axis=0)
+    y = rng.uniform(0.5, 2.0, n_pairs) * x + rng.normal(0.0, 1.0, (n_bars, n_pairs))
+    return x, y
+
+
+def test_rolling_ols_matches_the_regression_of_the_window():
+    x, y = random_pairs(200, 3)
+    window = 30
+    # Resynchronised every 50 bars, the running sums in between
+    model = create_hedge_ratio_model("ols", 3, window=window, resync_period=50)
+    for t in range(len(x)):
+        beta, zscore = model.update(x[t], y[t])
+        if t < window - 1:
+            assert np.isnan(beta).all() and np.isnan(zscore).all()
+            continue
+        for j in range(3):
+            xs, ys = x[t - window + 1:t + 1, j], y[t - window + 1:t + 1, j]
+            expected = np.linalg.lstsq(xs[:, np.newaxis], ys, rcond=None)[0][0]
+            spread = ys - expected * xs
+            assert beta[j] == pytest.approx(expected, rel=1e-9)
+            assert zscore[j] == pytest.approx(
+                (spread[-1] - spread.mean()) / spread.std(), rel=1e-6, abs=1e-9)
+
+
+@pytest.mark.parametrize("mode", HEDGE_RATIO_MODES)
+def test_missing_prices_only_skip_their_pair(mode):
+    x, y = random_pairs(120, 3, seed=1)
+    missing = np.zeros(x.shape, dtype=bool)
+    missing[[40, 41, 75], 1] = True
+    x_missing = np.where(missing, np.nan, x)
+
+    params = {"window": 20} if mode == "ols" else {"min_periods": 20}
+    batch = create_hedge_ratio_model(mode, 3, **params)
+    singles = [create_hedge_ratio_model(mode, 1, **params) for _ in range(3)]
+    for t in range(len(x)):
+        beta, zscore = batch.update(x_missing[t], y[t])
+        for j, single in enumerate(singles):
+            if missing[t, j]:
+                # The bar is skipped: the state is kept, the z-score is NaN
+                assert np.isnan(zscore[j])
+                continue
+            expected_beta, expected_zscore = single.update(x[t, [j]], y[t, [j]])
+            np.testing.assert_allclose(beta[j], expected_beta[0], rtol=1e-9)
+            np.testing.assert_allclose(zscore[j], expected_zscore[0], rtol=1e-6,
+                                       atol=1e-9)
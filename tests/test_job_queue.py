@@ -0,0 +1,82 @@
+import time
+
+from src.JobQueue import JobQueue, Worker
+
+
+def make_queue(tmp_path, **params):
+    queue = JobQueue(str(tmp_path / "jobs.db"), **params)
+    queue.submit([("a", {"n": 1}), ("b", {"n": 2})])
+    return queue
+
+
+def test_expired_lease_is_leased_again(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    (job,) = queue.lease("worker-1")
+    assert (job.key, job.payload, job.attempts) == ("a", {"n": 1}, 1)
+    # The lease of worker-1 is still valid: the next job is leased
+    assert [other.key for other in queue.lease("worker-2")] == ["b"]
+
+    time.sleep(0.1)
+    (again,) = queue.lease("worker-2")
+    assert (again.id, again.attempts) == (job.id, 2)
+    assert queue.heartbeat("worker-1", [job.id]) == []
+    assert queue.fail(job.id, "worker-1", "late") is None
+    # The lease of b expired as well
+    assert queue.counts() == {"pending": 1, "running": 1, "done": 0, "failed": 0}
+
+    # The first result of a job is kept
+    assert queue.complete(job.id, "worker-1", {"sharpe": 1.0})
+    assert not queue.complete(job.id, "worker-2", {"sharpe": 2.0})
+    assert list(queue.results()) == [("a", {"n": 1}, {"sharpe": 1.0})]
+
+
+def test_heartbeats_keep_the_lease(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.1)
+    (job,) = queue.lease("worker-1")
+    for _ in range(3):
+        time.sleep(0.05)
+        assert queue.heartbeat("worker-1", [job.id]) == [job.id]
+        assert queue.requeue_expired() == 0
+    time.sleep(0.15)
+    assert queue.requeue_expired() == 1
+    assert queue.counts()["pending"] == 2
+
+
+def test_jobs_fail_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05, max_attempts=2)
+    for _ in range(2):
+        queue.lease("worker-1", count=2)
+        time.sleep(0.1)
+    assert queue.requeue_expired() == 2
+    assert queue.counts()["failed"] == 2
+    errors = [error for _, _, error in queue.failures()]
+    assert errors == ["lease expired 2 times"] * 2
+
+    # Failed jobs are submitted again, done jobs only when forced
+    assert queue.submit([("a", {"n": 3})]) == 1
+    (job,) = queue.lease("worker-1")
+    queue.complete(job.id, "worker-1", None)
+    assert queue.submit([("a", {"n": 3})]) == 0
+    assert queue.submit([("a", {"n": 3})], force=True) == 1
+
+
+def test_worker_heartbeats_a_long_job(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    JobQueue(path).submit([("slow", 0.4), ("broken", 0.0)])
+    expired_meanwhile = []
+
+    def run_job(key, seconds):
+        if key == "broken":
+            raise ValueError("no data")
+        time.sleep(seconds)
+        expired_meanwhile.append(JobQueue(path).requeue_expired())
+        return key
+
+    worker = Worker(path, run_job, "worker-1", lease_seconds=0.15, max_attempts=2)
+    assert worker.run() == 3
+    # The slow job outlived its first lease, the other job is retried once
+    assert expired_meanwhile == [0]
+    assert (worker.done, worker.failed, worker.lost) == (1, 2, 0)
+    queue = JobQueue(path)
+    assert list(queue.results()) == [("slow", 0.4, "slow")]
+    assert list(queue.failures()) == [("broken", 0.0, "ValueError: no data")]
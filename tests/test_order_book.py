@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from src.Events import OrderEvent
+from src.OrderBook import RestingOrderBook
+
+PATH_TIMES = np.linspace(0.0, 3.0, 300001)
+
+
+def bar(open_, high, low, close):
+    return {"open": open_, "high": high, "low": low, "close": close}
+
+
+def sampled_touch(prices, level, falling, start=0):
+    """
+    First sample of the path at or beyond the level, from the start sample.
+    """
+    beyond = prices[start:] <= level if falling else prices[start:] >= level
+    if not beyond.any():
+        return None
+    return start + int(np.argmax(beyond))
+
+
+def reference_match(orders, triggered, bar_, path):
+    """
+    Scans every live order along a finely sampled intrabar path.
+    Returns {order_id: (fill price, intrabar time)} and updates the
+    triggered stop-limit orders.
+    """
+    if path == "OHLC":
+        points = [bar_["open"], bar_["high"], bar_["low"], bar_["close"]]
+    else:
+        points = [bar_["open"], bar_["low"], bar_["high"], bar_["close"]]
+    prices = np.interp(PATH_TIMES, [0.0, 1.0, 2.0, 3.0], points)
+    fills = {}
+    for order in orders.values():
+        is_buy = order.direction == "BUY"
+        start = 0
+        if order.order_type != "LMT" and order.order_id not in triggered:
+            start = sampled_touch(prices, order.stop_price, falling=not is_buy)
+            if start is None:
+                continue
+            if order.order_type == "STP":
+                price = prices[0] if start == 0 else order.stop_price
+                fills[order.order_id] = (price, PATH_TIMES[start])
+                continue
+            triggered.add(order.order_id)
+        touch = sampled_touch(prices, order.limit_price, falling=is_buy, start=start)
+        if touch is not None:
+            price = prices[touch] if touch == start else order.limit_price
+            fills[order.order_id] = (price, PATH_TIMES[touch])
+    return fills
+
+
+def random_order(rng, price):
+    order_type = rng.choice(["LMT", "STP", "STP_LMT"])
+    direction = rng.choice(["BUY", "SELL"])
+    sign = 1.0 if direction == "BUY" else -1.0
+    stop_price = limit_price = None
+    if order_type == "LMT":
+        limit_price = price - sign * rng.uniform(0.0, 3.0)
+    else:
+        stop_price = price + sign * rng.uniform(0.0, 3.0)
+    if order_type == "STP_LMT":
+        limit_price = stop_price + sign * rng.uniform(-1.0, 1.0)
+    return OrderEvent("AAA", order_type, 10, direction, limit_price, stop_price)
+
+
+@pytest.mark.parametrize("path", ["OHLC", "OLHC"])
+def test_matches_a_scan_of_every_order(path):
+    rng = np.random.default_rng(0)
+    book = RestingOrderBook(path)
+    orders, triggered = {}, set()
+    price = 100.0
+    for _ in range(50):
+        for _ in range(10):
+            order = random_order(rng, price)
+            book.add(order)
+            orders[order.order_id] = order
+        open_ = price + rng.normal(0.0, 0.5)
+        close = open_ + rng.normal(0.0, 1.0)
+        high = max(open_, close) + rng.exponential(0.5)
+        low = min(open_, close) - rng.exponential(0.5)
+        bar_ = bar(open_, high, low, close)
+
+        expected = reference_match(orders, triggered, bar_, path)
+        fills = book.match("AAA", bar_)
+        assert sorted(order.order_id for order, _, _ in fills) == sorted(expected)
+        for order, fill_price, t in fills:
+            assert fill_price == pytest.approx(expected[order.order_id][0], abs=1e-3)
+            assert t == pytest.approx(expected[order.order_id][1], abs=1e-4)
+            del orders[order.order_id]
+        assert [t for _, _, t in fills] == sorted(t for _, _, t in fills)
+        price = close
+    assert set(book.live) == set(orders)
+
+
+def test_gaps_fill_at_the_open():
+    book = RestingOrderBook()
+    buy_stop = OrderEvent("AAA", "STP", 10, "BUY", stop_price=101.0)
+    sell_limit = OrderEvent("AAA", "LMT", 10, "SELL", limit_price=102.0)
+    buy_limit = OrderEvent("AAA", "LMT", 10, "BUY", limit_price=99.0)
+    for order in (buy_stop, sell_limit, buy_limit):
+        book.add(order)
+    fills = book.match("AAA", bar(103.0, 104.0, 102.5, 103.5))
+    assert {order.order_id: (price, t) for order, price, t in fills} == {
+        buy_stop.order_id: (103.0, 0.0), sell_limit.order_id: (103.0, 0.0)}
+    assert list(book.live) == [buy_limit.order_id]
+
+
+def test_intrabar_path_orders_the_fills():
+    buy_limit = OrderEvent("AAA", "LMT", 10, "BUY", limit_price=98.0)
+    sell_limit = OrderEvent("AAA", "LMT", 10, "SELL", limit_price=102.0)
+    # The high is the closest extreme to the open: visited first by 'nearest'
+    for path, first in (("OHLC", sell_limit), ("OLHC", buy_limit),
+                        ("nearest", sell_limit)):
+        book = RestingOrderBook(path)
+        book.add(buy_limit)
+        book.add(sell_limit)
+        fills = book.match("AAA", bar(101.0, 103.0, 97.0, 100.0))
+        assert fills[0][0] is first and len(fills) == 2
+
+
+def test_cancelled_and_expired_orders_do_not_fill():
+    book = RestingOrderBook()
+    cancelled = OrderEvent("AAA", "LMT", 10, "BUY", limit_price=99.0)
+    day = OrderEvent("AAA", "LMT", 10, "BUY", limit_price=98.0, time_in_force="DAY")
+    gtc = OrderEvent("AAA", "LMT", 10, "BUY", limit_price=97.0)
+    for order in (cancelled, day, gtc):
+        book.add(order)
+    assert book.cancel(cancelled.order_id)
+    assert not book.cancel(cancelled.order_id)
+
+    assert book.expire_day_orders("2020-01-02") == []
+    assert book.match("AAA", bar(100.0, 100.5, 99.5, 100.0)) == []
+    assert book.expire_day_orders("2020-01-02") == []
+    assert book.expire_day_orders("2020-01-03") == [day]
+    fills = book.match("AAA", bar(100.0, 100.0, 96.0, 96.5))
+    assert [order for order, _, _ in fills] == [gtc]
+    assert book.active_symbols() == []
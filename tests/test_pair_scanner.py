@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Strategies.Helper.PairScanner import batch_adf, scan_pairs, to_pairs
+
+
+def reference_adf(s, lags):
+    """
+    ADF regression of one series by least squares on the explicit design matrix.
+    """
+    diff = np.diff(s)
+    target = diff[lags:]
+    design = np.column_stack(
+        [np.ones(len(target)), s[lags:-1]]
+        + [diff[lags - k:len(diff) - k] for k in range(1, lags + 1)])
+    coefficients, ssr, _, _ = np.linalg.lstsq(design, target, rcond=None)
+    sigma2 = ssr[0] / (len(target) - design.shape[1])
+    variance = sigma2 * np.linalg.inv(design.T @ design)[1, 1]
+    return coefficients[1] / np.sqrt(variance), coefficients[1]
+
+
+@pytest.mark.parametrize("lags", [0, 1, 3])
+def test_batch_adf_matches_the_regression_of_each_series(lags):
+    rng = np.random.default_rng(0)
+    noise = rng.normal(0.0, 1.0, (250, 4))
+    spreads = np.empty_like(noise)
+    spreads[0] = noise[0]
+    # From a random walk to a strongly mean reverting AR(1)
+    for t in range(1, len(noise)):
+        spreads[t] = np.array([1.0, 0.95, 0.7, 0.2]) * spreads[t - 1] + noise[t]
+    spreads += 100.0
+
+    adf_stat, gamma = batch_adf(spreads, lags)
+    for j in range(spreads.shape[1]):
+        expected_stat, expected_gamma = reference_adf(spreads[:, j], lags)
+        assert adf_stat[j] == pytest.approx(expected_stat, rel=1e-6)
+        assert gamma[j] == pytest.approx(expected_gamma, rel=1e-6)
+    assert list(np.argsort(adf_stat)) == [3, 2, 1, 0]
+
+
+def test_scan_ranks_the_cointegrated_pair_first():
+    rng = np.random.default_rng(1)
+    n_obs = 500
+    common = 50.0 + np.cumsum(rng.normal(0.0, 1.0, n_obs))
+    spread = np.zeros(n_obs)
+    for t in range(1, n_obs):
+        spread[t] = 0.5 * spread[t - 1] + rng.normal(0.0, 0.5)
+    prices = pd.DataFrame({
+        "AAA": 2.0 * common + spread + 20.0,
+        "BBB": common + 10.0,
+        "CCC": 80.0 + np.cumsum(rng.normal(0.0, 1.0, n_obs)),
+        "DDD": 80.0 + np.cumsum(rng.normal(0.0, 1.0, n_obs)),
+    })
+    ranking = scan_pairs(prices, min_correlation=0.0)
+    assert len(ranking) == 6
+    best = ranking.iloc[0]
+    assert (best["y"], best["x"]) == ("AAA", "BBB")
+    assert best["significance"] == 0.01
+    y, x = prices["AAA"].values, prices["BBB"].values
+    assert best["hedge_ratio"] == pytest.approx(x @ y / (x @ x), rel=1e-12)
+    assert best["adf_stat"] == pytest.approx(
+        reference_adf(y - best["hedge_ratio"] * x, 1)[0], rel=1e-6)
+    assert to_pairs(ranking, top=1) == [("AAA", "BBB")]
+
+    # Chunks and workers do not change the result
+    parallel = scan_pairs(prices, min_correlation=0.0, chunk_size=2, n_jobs=2)
+    pd.testing.assert_frame_equal(ranking, parallel)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Performance import create_drawdowns
+
+
+def loop_drawdowns(equity_curve):
+    """
+    The bar by bar loop create_drawdowns replaced, as reference.
+    """
+    high_water_mark = [0]
+    drawdown = np.full(len(equity_curve), np.nan)
+    duration = np.full(len(equity_curve), np.nan)
+    for i in range(1, len(equity_curve)):
+        high_water_mark.append(max(high_water_mark[i - 1], equity_curve[i]))
+        drawdown[i] = high_water_mark[i] - equity_curve[i]
+        duration[i] = 0 if drawdown[i] == 0 else duration[i - 1] + 1
+    return drawdown, np.nanmax(drawdown), np.nanmax(duration)
+
+
+def random_curves(n_bars, n_curves, seed=0):
+    returns = np.random.default_rng(seed).normal(0.0005, 0.01, (n_bars, n_curves))
+    # Rounded values repeat, the drawdown is reset by equal highs too
+    equity = np.round(np.cumprod(1.0 + returns, axis=0), 2)
+    # The first bar of a Portfolio equity curve is NaN (no return yet)
+    equity[0] = np.nan
+    return pd.DataFrame(equity, index=pd.bdate_range("2016-01-04", periods=n_bars))
+
+
+def test_drawdowns_of_a_curve():
+    equity = pd.Series([np.nan, 1.0, 1.1, 1.0, 1.05, 1.1, 1.2, 1.15, 1.1])
+    drawdown, max_drawdown, max_duration = create_drawdowns(equity)
+    np.testing.assert_allclose(drawdown.values[1:], [0, 0, 0.1, 0.05, 0, 0, 0.05, 0.1],
+                               atol=1e-12)
+    assert max_drawdown == pytest.approx(0.1)
+    assert max_duration == 2
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_drawdowns_match_the_loop(seed):
+    curves = random_curves(500, 4, seed)
+    for column in curves.columns:
+        equity = curves[column]
+        drawdown, max_drawdown, max_duration = create_drawdowns(equity)
+        expected, expected_max, expected_duration = loop_drawdowns(equity.values)
+        np.testing.assert_allclose(drawdown.values[1:], expected[1:], atol=1e-12)
+        assert max_drawdown == pytest.approx(expected_max)
+        assert max_duration == expected_duration
+
+
+def test_batched_drawdowns_match_the_columns():
+    curves = random_curves(300, 5)
+    drawdown, max_drawdown, max_duration = create_drawdowns(curves)
+    assert isinstance(drawdown, pd.DataFrame) and drawdown.shape == curves.shape
+    for column in curves.columns:
+        _, expected_max, expected_duration = create_drawdowns(curves[column])
+        assert max_drawdown[column] == pytest.approx(expected_max)
+        assert max_duration[column] == expected_duration
+    # Same results for a 2-D array
+    _, array_max, array_duration = create_drawdowns(curves.values)
+    np.testing.assert_allclose(array_max, max_drawdown.values)
+    np.testing.assert_array_equal(array_duration, max_duration.values)
@@ -0,0 +1,111 @@
+import queue
+
+import numpy as np
+
+from src.Events import MarketEvent, SignalEvent
+from src.Portfolio import Portfolio
+from src.Strategy import CrossSectionalStrategy
+from tests.conftest import FakeBars
+
+
+def make_portfolio(prices, **params):
+    bars = FakeBars(prices)
+    return Portfolio(bars, queue.Queue(), bars.datetime, 100000.0, **params)
+
+
+def trades(orders):
+    return [(order.symbol, order.direction, order.quantity) for order in orders]
+
+
+def test_naive_order_enters_from_flat_only():
+    portfolio = make_portfolio({"AAA": 10.0})
+    order = portfolio.generate_naive_order(SignalEvent("AAA", None, "LONG", 1.0))
+    assert (order.direction, order.quantity) == ("BUY", 100)
+
+    portfolio.current_positions["AAA"] = -100
+    assert portfolio.generate_naive_order(SignalEvent("AAA", None, "LONG", 1.0)) is None
+    order = portfolio.generate_naive_order(SignalEvent("AAA", None, "EXIT", 1.0))
+    assert (order.direction, order.quantity) == ("BUY", 100)
+
+
+class SignStrategy(CrossSectionalStrategy):
+    def __init__(self, bars, events):
+        super(SignStrategy, self).__init__(bars, events, output="signals")
+        self.values = None
+
+    def calculate_cross_section(self, panel):
+        return self.values
+
+
+def test_cross_section_reversal_exits_then_enters():
+    bars = FakeBars({"AAA": 10.0, "BBB": 20.0})
+    events = queue.Queue()
+    strategy = SignStrategy(bars, events)
+    strategy.values = np.array([1.0, -1.0])
+    strategy.calculate_signals(MarketEvent())
+    strategy.values = np.array([-1.0, 0.0])
+    strategy.calculate_signals(MarketEvent())
+    signals = [events.get(False) for _ in range(events.qsize())]
+    assert [(s.symbol, s.signal_type) for s in signals] == [
+        ("AAA", "LONG"), ("BBB", "SHORT"), ("AAA", "EXIT"), ("BBB", "EXIT")
+    ]
+    np.testing.assert_array_equal(strategy.positions, [0.0, 0.0])
+
+    # The short entry of AAA follows on the next bar, once the EXIT is filled
+    strategy.calculate_signals(MarketEvent())
+    signals = [events.get(False) for _ in range(events.qsize())]
+    assert [(s.symbol, s.signal_type) for s in signals] == [("AAA", "SHORT")]
+    np.testing.assert_array_equal(strategy.positions, [-1.0, 0.0])
+
+
+def test_target_weight_orders_round_to_lots():
+    portfolio = make_portfolio({"AAA": 30.0, "BBB": 7.0}, lot_size=100)
+    # 25% of 100000 at 30.0 is 833.3 shares, 50% at 7.0 is 7142.9 shares
+    orders = portfolio.generate_target_weight_orders({"AAA": 0.25, "BBB": 0.5})
+    assert trades(orders) == [
+        ("AAA", "BUY", 800), ("BBB", "BUY", 7100)
+    ]
+
+
+def test_target_weight_orders_sell_first_and_truncate_towards_zero():
+    portfolio = make_portfolio({"AAA": 10.0, "BBB": 10.0}, lot_size=10)
+    portfolio.current_positions["AAA"] = 5000
+    portfolio.current_holdings["cash"] = 50000.0
+    # Equity 100000: AAA goes to 1995 shares (-3005), BBB to 6999 (+6999)
+    orders = portfolio.generate_target_weight_orders(np.array([0.1995, 0.6999]))
+    assert trades(orders) == [
+        ("AAA", "SELL", 3000), ("BBB", "BUY", 6990)
+    ]
+
+
+def test_target_weight_orders_skip_small_trades():
+    portfolio = make_portfolio({"AAA": 10.0, "BBB": 10.0}, min_trade_value=1000.0)
+    portfolio.current_positions["AAA"] = 1000
+    portfolio.current_holdings["cash"] = 90000.0
+    # AAA moves by 50 shares (500), BBB by 200 shares (2000)
+    orders = portfolio.generate_target_weight_orders({"AAA": 0.105, "BBB": 0.02})
+    assert trades(orders) == [("BBB", "BUY", 200)]
+
+
+def test_target_weight_orders_close_missing_symbols():
+    portfolio = make_portfolio({"AAA": 10.0, "BBB": 10.0}, lot_size=100)
+    portfolio.current_positions["BBB"] = 150
+    portfolio.current_holdings["cash"] = 98500.0
+    # BBB is not in the weights: it is closed in whole lots, the odd 50 shares stay
+    orders = portfolio.generate_target_weight_orders({"AAA": 0.0})
+    assert trades(orders) == [("BBB", "SELL", 100)]
+
+
+def test_cross_section_forced_exit_marks_flat():
+    bars = FakeBars({"AAA": 10.0, "BBB": 20.0})
+    events = queue.Queue()
+    strategy = SignStrategy(bars, events)
+    strategy.values = np.array([1.0, -1.0])
+    strategy.calculate_signals(MarketEvent())
+    # AAA stopped out by the risk manager: entered again, without an EXIT
+    strategy.on_forced_exit("AAA", "stop loss")
+    strategy.calculate_signals(MarketEvent())
+    signals = [events.get(False) for _ in range(events.qsize())]
+    assert [(s.symbol, s.signal_type) for s in signals] == [
+        ("AAA", "LONG"), ("BBB", "SHORT"), ("AAA", "LONG")
+    ]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from src.PositionSizing import KellySizer, MeanVarianceSizer, project_weights
+from src.RiskManagement import EWMACovariance
+
+
+def make_risk_model(n_assets, seed=0):
+    """
+    EWMA covariance of three factors and specific noise.
+    """
+    rng = np.random.default_rng(seed)
+    model = EWMACovariance(n_assets, halflife=30.0)
+    loadings = rng.normal(0.0, 1.0, (n_assets, 3))
+    returns = rng.normal(0.0, 0.01, (300, 3)) @ loadings.T
+    for r in returns + rng.normal(0.0, 0.01, (300, n_assets)):
+        model.update(r)
+    return model
+
+
+def projected_gradient(mu, cov, risk_aversion, max_weight, max_leverage, long_only):
+    """
+    Plain projected gradient with a fixed step, run long enough to converge,
+    as reference.
+    """
+    step = 1.0 / (risk_aversion * np.linalg.eigvalsh(cov).max())
+    weights = np.zeros(len(mu))
+    for _ in range(20000):
+        gradient = risk_aversion * cov @ weights - mu
+        weights, _ = project_weights(weights - step * gradient, max_weight,
+                                     max_leverage, long_only)
+    return weights
+
+
+def objective(weights, mu, cov, risk_aversion):
+    return mu @ weights - 0.5 * risk_aversion * weights @ cov @ weights
+
+
+@pytest.mark.parametrize("sizer, risk_aversion, long_only", [
+    (MeanVarianceSizer(risk_aversion=1.0), 1.0, False),
+    (MeanVarianceSizer(risk_aversion=3.0, long_only=True), 3.0, True),
+    (KellySizer(fraction=0.5), 2.0, False),
+])
+def test_sizers_match_projected_gradient(sizer, risk_aversion, long_only):
+    model = make_risk_model(50)
+    signals = np.random.default_rng(1).normal(0.0, 1.0, 50)
+    sizer.tolerance = 1e-10
+    sizer.max_iterations = 5000
+    weights = sizer.size(signals, model)
+
+    mu = sizer.alpha_scale * signals
+    expected = projected_gradient(mu, model.cov, risk_aversion, sizer.max_weight,
+                                  sizer.max_leverage, long_only)
+    np.testing.assert_allclose(weights, expected, atol=1e-6)
+    assert objective(weights, mu, model.cov, risk_aversion) == pytest.approx(
+        objective(expected, mu, model.cov, risk_aversion), rel=1e-9)
+    assert np.abs(weights).sum() <= sizer.max_leverage + 1e-9
+    assert np.abs(weights).max() <= sizer.max_weight + 1e-9
+    if long_only:
+        assert weights.min() >= 0.0
+
+
+def test_unchanged_inputs_skip_the_solve():
+    model = make_risk_model(20)
+    signals = np.random.default_rng(2).normal(0.0, 1.0, 20)
+    sizer = MeanVarianceSizer()
+    weights = sizer.size(signals, model)
+    assert weights is not None and sizer.solves == 1
+    # Still optimal on the next bar: kept without solving
+    assert sizer.size(signals, model) is None
+    assert (sizer.solves, sizer.skips) == (1, 1)
+    np.testing.assert_array_equal(sizer.weights, weights)
+
+    # A new view is solved again, warm started from the previous weights
+    iterations = sizer.iterations
+    assert sizer.size(-signals, model) is not None
+    assert (sizer.solves, sizer.skips) == (2, 1)
+    assert sizer.iterations > iterations
@@ -0,0 +1,112 @@
+import queue
+
+import numpy as np
+
+from src.Events import OrderEvent
+from src.RiskManagement import RiskManagement
+from tests.conftest import FakeBars, FakePortfolio
+
+
+def make_risk(prices=(10.0, 20.0), **limits):
+    bars = FakeBars(dict(zip(["AAA", "BBB"], prices)))
+    portfolio = FakePortfolio(bars)
+    events = queue.Queue()
+    risk = RiskManagement(bars, portfolio=portfolio, risk_model=None, var_every=0,
+                          events=events, **limits)
+    risk.update_timeindex(None)
+    return risk, portfolio, events
+
+
+def order(symbol, quantity, direction):
+    return OrderEvent(symbol, "MKT", quantity, direction)
+
+
+def test_position_size_counts_pending_orders():
+    risk, _, _ = make_risk(max_position_size=0.1)
+    # 10% of 100000 at 10.0 is 1000 shares
+    assert risk.check_order(order("AAA", 1000, "BUY"))
+    assert not risk.check_order(order("AAA", 1, "BUY"))
+    assert [reason for _, _, reason in risk.rejections] == ["position size"]
+
+
+def test_reducing_orders_are_accepted():
+    risk, portfolio, _ = make_risk(max_position_size=0.1)
+    portfolio.position_vector[0] = 5000
+    risk.update_timeindex(None)
+    assert risk.check_order(order("AAA", 1000, "SELL"))
+    # A reversal is checked on the new side: 1500 shares short is over the limit
+    assert not risk.check_order(order("AAA", 5500, "SELL"))
+
+
+def test_gross_and_net_exposure():
+    risk, _, _ = make_risk(max_position_size=None, max_gross_exposure=1.0,
+                           max_net_exposure=0.5)
+    assert risk.check_order(order("AAA", 4000, "BUY"))
+    # Net 40000 + 20000 is over 50% of the equity
+    assert not risk.check_order(order("BBB", 1000, "BUY"))
+    # A short lowers the net exposure, and the gross stays under 100%
+    assert risk.check_order(order("BBB", 2500, "SELL"))
+    assert risk.gross_exposure == 90000.0 and risk.net_exposure == -10000.0
+    assert not risk.check_order(order("BBB", 600, "SELL"))
+    reasons = [reason for _, _, reason in risk.rejections]
+    assert reasons == ["net exposure", "gross exposure"]
+
+
+def test_stop_loss_exit():
+    risk, portfolio, events = make_risk(max_position_size=None, stop_loss=0.05,
+                                        take_profit=0.15)
+    portfolio.trade(risk, "AAA", 100, "BUY", 10.0)
+    risk.bars.next_bar([9.6, 20.0])
+    risk.update_timeindex(None)
+    assert events.empty()
+
+    risk.bars.next_bar([9.4, 20.0])
+    risk.update_timeindex(None)
+    exit_order = events.get(False)
+    assert (exit_order.symbol, exit_order.quantity) == ("AAA", 100)
+    assert exit_order.direction == "SELL"
+    assert risk.forced_exits == [(risk.bars.datetime, "AAA", "stop loss")]
+    # Disarmed until the exit is filled
+    risk.bars.next_bar([9.0, 20.0])
+    risk.update_timeindex(None)
+    assert events.empty()
+
+
+def test_take_profit_exit_of_a_short():
+    risk, portfolio, events = make_risk(max_position_size=None, stop_loss=0.05,
+                                        take_profit=0.15)
+    portfolio.trade(risk, "BBB", 50, "SELL", 20.0)
+    risk.bars.next_bar([10.0, 16.9])
+    risk.update_timeindex(None)
+    exit_order = events.get(False)
+    assert (exit_order.symbol, exit_order.quantity) == ("BBB", 50)
+    assert exit_order.direction == "BUY"
+    assert risk.forced_exits == [(risk.bars.datetime, "BBB", "take profit")]
+
+
+def test_no_triggers_by_default():
+    risk, portfolio, events = make_risk(max_position_size=None)
+    portfolio.trade(risk, "AAA", 100, "BUY", 10.0)
+    risk.bars.next_bar([1.0, 20.0])
+    risk.update_timeindex(None)
+    assert events.empty() and risk.forced_exits == []
+
+
+def test_only_armed_positions_are_checked():
+    risk, portfolio, events = make_risk(max_position_size=None, stop_loss=0.05)
+    assert risk.armed.size == 0
+    portfolio.trade(risk, "BBB", 50, "BUY", 20.0)
+    assert list(risk.armed) == [1]
+    # AAA has no position: its fall is not a stop
+    risk.bars.next_bar([1.0, 19.5])
+    risk.update_timeindex(None)
+    assert events.empty()
+
+    risk.bars.next_bar([1.0, 18.9])
+    risk.update_timeindex(None)
+    exit_order = events.get(False)
+    assert (exit_order.symbol, exit_order.direction) == ("BBB", "SELL")
+    assert risk.armed.size == 0
+    # Flat after the exit fill: nothing left to check
+    portfolio.trade(risk, "BBB", 50, "SELL", 18.9)
+    assert risk.armed.size == 0 and np.isnan(risk.stop_prices[1])
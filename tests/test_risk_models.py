@@ -0,0 +1,111 @@
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from src.RiskManagement import EWMACovariance, StatisticalFactorModel, ValueAtRisk
+
+
+def factor_returns(n_bars, n_assets, n_factors=3, noise=0.002, seed=0):
+    """
+    Returns of a few factors with decreasing volatility and specific noise.
+    """
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0.0, 1.0, (n_assets, n_factors))
+    volatility = 0.01 / np.arange(1, n_factors + 1)
+    factors = rng.normal(0.0, 1.0, (n_bars, n_factors)) * volatility
+    return factors @ loadings.T + rng.normal(0.0, noise, (n_bars, n_assets))
+
+
+def weighted_second_moments(returns, halflife):
+    """
+    Exponentially weighted mean of r r' over all the bars, normalised by
+    the total weight.
+    """
+    decay = 0.5 ** (1.0 / halflife)
+    weights = decay ** np.arange(len(returns) - 1, -1, -1)
+    return (returns * (weights / weights.sum())[:, np.newaxis]).T @ returns
+
+
+def test_ewma_matches_the_weighted_covariance():
+    returns = factor_returns(300, 8)
+    returns[50, 2] = np.nan
+    model = EWMACovariance(8, halflife=20.0, min_periods=30)
+    for t, r in enumerate(returns):
+        model.update(r)
+        assert model.ready == (t >= 29)
+    expected = weighted_second_moments(np.nan_to_num(returns), 20.0)
+    np.testing.assert_allclose(model.covariance(), expected, rtol=1e-10, atol=1e-18)
+    np.testing.assert_allclose(model.variances(), np.diag(expected), rtol=1e-10)
+
+
+def test_factor_model_with_all_factors_is_the_covariance():
+    returns = factor_returns(400, 6)
+    model = StatisticalFactorModel(6, n_factors=6, halflife=50.0,
+                                   reorthogonalize_period=100,
+                                   min_specific_variance=0.0)
+    for r in returns:
+        model.update(r)
+    expected = weighted_second_moments(returns, 50.0)
+    np.testing.assert_allclose(model.covariance(), expected, rtol=1e-8, atol=1e-14)
+    np.testing.assert_allclose(model.exposures.T @ model.exposures, np.eye(6),
+                               atol=1e-10)
+
+
+def test_factor_model_finds_the_top_factors():
+    returns = factor_returns(1000, 40, noise=0.0005, seed=1)
+    model = StatisticalFactorModel(40, n_factors=3, halflife=100.0)
+    for r in returns:
+        model.update(r)
+    expected = weighted_second_moments(returns, 100.0)
+    values, vectors = np.linalg.eigh(expected)
+    np.testing.assert_allclose(model.factor_variances, values[::-1][:3], rtol=0.02)
+    # Same subspace as the top eigenvectors of the full matrix
+    overlap = np.linalg.svd(vectors[:, -3:].T @ model.exposures, compute_uv=False)
+    assert overlap.min() > 0.999
+    np.testing.assert_allclose(model.variances(), np.diag(expected), rtol=1e-8)
+
+    # The O(N F) products agree with the dense covariance
+    weights = np.random.default_rng(2).normal(0.0, 1.0, 40)
+    covariance = model.covariance()
+    np.testing.assert_allclose(model.covariance_matvec(weights), covariance @ weights,
+                               rtol=1e-10, atol=1e-16)
+    assert model.portfolio_variance(weights) == pytest.approx(
+        weights @ covariance @ weights, rel=1e-10)
+
+
+def test_var_of_the_last_window():
+    returns = factor_returns(400, 5, seed=3)
+    exposures = np.array([1000.0, -500.0, 2000.0, 0.0, 750.0])
+    var = ValueAtRisk(5, window=250, confidence=0.99)
+    for r in returns:
+        var.update(r)
+    result = var.compute(exposures)
+
+    pnl = np.sort(returns[-250:] @ exposures)
+    # The 2.5 worst outcomes of 250 rounded down
+    assert result["historical_var"] == pytest.approx(-pnl[1], rel=1e-12)
+    assert result["historical_cvar"] == pytest.approx(-pnl[:2].mean(), rel=1e-12)
+
+    mean, std = pnl.mean(), pnl.std()
+    normal = NormalDist()
+    z = normal.inv_cdf(0.01)
+    assert result["parametric_var"] == pytest.approx(-(mean + z * std), rel=1e-10)
+    assert result["parametric_cvar"] == pytest.approx(
+        -(mean - std * normal.pdf(z) / 0.01), rel=1e-10)
+
+    skew = ((pnl - mean) ** 3).mean() / std ** 3
+    kurtosis = ((pnl - mean) ** 4).mean() / std ** 4 - 3.0
+    cornish_fisher = (z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurtosis / 24
+                      - (2 * z ** 3 - 5 * z) * skew ** 2 / 36)
+    assert result["cornish_fisher_var"] == pytest.approx(
+        -(mean + cornish_fisher * std), rel=1e-10)
+    assert result["cornish_fisher_var"] < result["cornish_fisher_cvar"]
+
+
+def test_var_needs_two_bars():
+    var = ValueAtRisk(2, methods=["historical"])
+    var.update(np.array([0.01, -0.02]))
+    assert np.isnan(var.compute(np.ones(2))["historical_var"])
+    with pytest.raises(ValueError):
+        ValueAtRisk(2, methods=["monte_carlo"])